@@ -1,52 +1,44 @@
 # tensorflow tutorial
 # https://medium.com/tensorflow/deep-reinforcement-learning-playing-cartpole-through-asynchronous-advantage-actor-critic-a3c-7eab2eea5296
 
-import os
+"""
+A2C / A3C on processes
 
-os.environ["CUDA_VISIBLE_DEVICES"] = ""
+- A2C: synchronous version, the workers are the envs of SubprocVectorEnv. The observations of all the workers are
+       stacked into one forward pass and the gradients are computed once per n-step batch of all the workers.
+- A3C: asynchronous version, each worker process has its own env and local model, and sends the gradients of
+       its n-step rollout to the master which applies them to the global model and broadcasts the weights
+       via shared memory(see tf_rl.common.actor_learner.SharedWeights)
 
-import threading
-import gym
+Unlike the threads, the processes don't fight for the GIL, so that the throughput scales with the number of the cores.
+Both report the env-steps/sec per core(i.e., per worker) to compare the scaling.
+
+Usage:
+    python -m tf_rl.agents.A3C --algorithm a2c --num-workers 8 --train
+"""
+
+import os
+import time
+import argparse
 import multiprocessing
+import queue
+import gym
 import numpy as np
-from queue import Queue
-import argparse
-import matplotlib.pyplot as plt
-
 import tensorflow as tf
-from tensorflow.python import keras
-from tensorflow.python.keras import layers
-
-tf.enable_eager_execution()
-
-parser = argparse.ArgumentParser(description='Run A3C algorithm on the game '
-                                             'Cartpole.')
-parser.add_argument('--algorithm', default='a3c', type=str,
-                    help='Choose between \'a3c\' and \'random\'.')
-parser.add_argument('--train', dest='train', action='store_true',
-                    help='Train our model.')
-parser.add_argument('--lr', default=0.001,
-                    help='Learning rate for the shared optimizer.')
-parser.add_argument('--update-freq', default=20, type=int,
-                    help='How often to update the global model.')
-parser.add_argument('--max-eps', default=1000, type=int,
-                    help='Global maximum number of episodes to run.')
-parser.add_argument('--gamma', default=0.99,
-                    help='Discount factor of rewards.')
-parser.add_argument('--save-dir', default='../../logs/models/', type=str,
-                    help='Directory in which you desire to save the model.')
-args = parser.parse_args()
-
-
-class ActorCriticModel(keras.Model):
+from tf_rl.common.vec_env import SubprocVectorEnv, CloudpickleWrapper
+from tf_rl.common.actor_learner import SharedWeights
+from tf_rl.common.advantage import compute_gae
+
+
+class ActorCriticModel(tf.keras.Model):
     def __init__(self, state_size, action_size):
         super(ActorCriticModel, self).__init__()
         self.state_size = state_size
         self.action_size = action_size
-        self.dense1 = layers.Dense(100, activation='relu')
-        self.policy_logits = layers.Dense(action_size)
-        self.dense2 = layers.Dense(100, activation='relu')
-        self.values = layers.Dense(1)
+        self.dense1 = tf.keras.layers.Dense(100, activation='relu')
+        self.policy_logits = tf.keras.layers.Dense(action_size)
+        self.dense2 = tf.keras.layers.Dense(100, activation='relu')
+        self.values = tf.keras.layers.Dense(1)
 
     def call(self, inputs):
         # Forward pass
@@ -61,19 +53,19 @@ def record(episode,
            episode_reward,
            worker_idx,
            global_ep_reward,
-           result_queue,
            total_loss,
-           num_steps):
-    """Helper function to store score and print statistics.
+           steps_per_sec_per_core):
+    """Helper function to print statistics.
 
     Arguments:
       episode: Current episode
       episode_reward: Reward accumulated over the current episode
-      worker_idx: Which thread (worker)
+      worker_idx: Which process (worker)
       global_ep_reward: The moving average of the global reward
-      result_queue: Queue storing the moving average of the scores
-      total_loss: The total loss accumualted over the current episode
-      num_steps: The number of steps the episode took to complete
+      total_loss: The latest loss
+      steps_per_sec_per_core: The env-steps/sec of all the workers divided by the number of the workers
+    Returns:
+      The new moving average of the global reward
     """
     if global_ep_reward == 0:
         global_ep_reward = episode_reward
@@ -83,11 +75,10 @@ def record(episode,
         f"Episode: {episode} | "
         f"Moving Average Reward: {int(global_ep_reward)} | "
         f"Episode Reward: {int(episode_reward)} | "
-        f"Loss: {int(total_loss / float(num_steps) * 1000) / 1000} | "
-        f"Steps: {num_steps} | "
+        f"Loss: {int(total_loss * 1000) / 1000} | "
+        f"Steps/sec/core: {int(steps_per_sec_per_core)} | "
         f"Worker: {worker_idx}"
     )
-    result_queue.put(global_ep_reward)
     return global_ep_reward
 
 
@@ -103,26 +94,27 @@ class RandomAgent:
         self.env = gym.make(env_name)
         self.max_episodes = max_eps
         self.global_moving_average_reward = 0
-        self.res_queue = Queue()
 
     def run(self):
         reward_avg = 0
+        start = time.time()
+        total_steps = 0
         for episode in range(self.max_episodes):
             done = False
             self.env.reset()
             reward_sum = 0.0
-            steps = 0
             while not done:
                 # Sample randomly from the action space and step
                 _, reward, done, _ = self.env.step(self.env.action_space.sample())
-                steps += 1
+                total_steps += 1
                 reward_sum += reward
             # Record statistics
             self.global_moving_average_reward = record(episode,
                                                        reward_sum,
                                                        0,
                                                        self.global_moving_average_reward,
-                                                       self.res_queue, 0, steps)
+                                                       0,
+                                                       total_steps / (time.time() - start))
 
             reward_avg += reward_sum
         final_avg = reward_avg / float(self.max_episodes)
@@ -130,65 +122,78 @@ class RandomAgent:
         return final_avg
 
 
-class MasterAgent():
-    def __init__(self):
-        self.game_name = 'CartPole-v0'
-        save_dir = args.save_dir
-        self.save_dir = save_dir
-        if not os.path.exists(save_dir):
-            os.makedirs(save_dir)
-
-        env = gym.make(self.game_name)
-        self.state_size = env.observation_space.shape[0]
-        self.action_size = env.action_space.n
-        self.opt = tf.train.AdamOptimizer(args.lr, use_locking=True)
-        print(self.state_size, self.action_size)
-
-        self.global_model = ActorCriticModel(self.state_size, self.action_size)  # global network
-        self.global_model(tf.convert_to_tensor(np.random.random((1, self.state_size)), dtype=tf.float32))
-
-    def train(self):
-        if args.algorithm == 'random':
-            random_agent = RandomAgent(self.game_name, args.max_eps)
-            random_agent.run()
-            return
-
-        res_queue = Queue()
-
-        workers = [Worker(self.state_size,
-                          self.action_size,
-                          self.global_model,
-                          self.opt, res_queue,
-                          i, game_name=self.game_name,
-                          save_dir=self.save_dir) for i in range(multiprocessing.cpu_count())]
-
-        for i, worker in enumerate(workers):
-            print("Starting worker {}".format(i))
-            worker.start()
-
-        moving_average_rewards = []  # record episode reward to plot
-        while True:
-            reward = res_queue.get()
-            if reward is not None:
-                moving_average_rewards.append(reward)
-            else:
-                break
-        [w.join() for w in workers]
-
-        plt.plot(moving_average_rewards)
-        plt.ylabel('Moving average ep reward')
-        plt.xlabel('Step')
-        plt.savefig(os.path.join(self.save_dir,
-                                 '{} Moving Average.png'.format(self.game_name)))
-        plt.show()
-
-    def play(self):
-        env = gym.make(self.game_name).unwrapped
+class ActorCritic(object):
+    """
+    boiler plate of A2C and A3C, it holds the model and compiles its loss
+
+    :param state_size: dim of an observation
+    :param action_size: the number of the actions
+    :param lr: learning rate of Adam
+    :param gamma: discount factor
+    :param entropy_coef: coefficient of the entropy bonus
+    """
+
+    def __init__(self, state_size, action_size, lr=0.001, gamma=0.99, entropy_coef=0.01):
+        self.state_size = state_size
+        self.action_size = action_size
+        self.gamma = gamma
+        self.entropy_coef = entropy_coef
+        self.model = ActorCriticModel(state_size, action_size)
+        self.model(tf.zeros((1, state_size)))
+        self.optimizer = tf.keras.optimizers.Adam(lr)
+        self.steps_per_sec_per_core = 0
+
+    @tf.function
+    def _select_actions(self, states):
+        logits, values = self.model(states)
+        actions = tf.squeeze(tf.random.categorical(logits, num_samples=1), axis=-1)
+        return actions, tf.squeeze(values, axis=-1)
+
+    def select_actions(self, states):
+        """ Returns: the sampled actions and the values of a batch of states """
+        actions, values = self._select_actions(tf.constant(np.asarray(states, dtype=np.float32)))
+        return actions.numpy(), values.numpy()
+
+    def compute_loss(self, states, actions, returns):
+        logits, values = self.model(states)
+        # Get our advantages
+        advantage = returns - tf.squeeze(values, axis=-1)
+        # Value loss
+        value_loss = advantage ** 2
+
+        # Calculate our policy loss
+        policy = tf.nn.softmax(logits)
+        entropy = tf.nn.softmax_cross_entropy_with_logits(labels=policy, logits=logits)
+
+        policy_loss = tf.nn.sparse_softmax_cross_entropy_with_logits(labels=actions, logits=logits)
+        policy_loss *= tf.stop_gradient(advantage)
+        policy_loss -= self.entropy_coef * entropy
+        return tf.reduce_mean(0.5 * value_loss + policy_loss)
+
+    @tf.function
+    def _compute_gradients(self, states, actions, returns):
+        with tf.GradientTape() as tape:
+            total_loss = self.compute_loss(states, actions, returns)
+        return tape.gradient(total_loss, self.model.trainable_variables), total_loss
+
+    def compute_gradients(self, states, actions, returns):
+        grads, total_loss = self._compute_gradients(tf.constant(np.asarray(states, dtype=np.float32)),
+                                                    tf.constant(np.asarray(actions, dtype=np.int64)),
+                                                    tf.constant(np.asarray(returns, dtype=np.float32)))
+        return [grad.numpy() for grad in grads], total_loss.numpy()
+
+    def train(self, env_fn, num_workers, num_frames, n_steps=20, seed=123):
+        raise NotImplementedError
+
+    def save(self, save_dir, game_name):
+        self.model.save_weights(os.path.join(save_dir, 'model_{}.h5'.format(game_name)))
+
+    def play(self, game_name, save_dir):
+        env = gym.make(game_name).unwrapped
         state = env.reset()
-        model = self.global_model
-        model_path = os.path.join(self.save_dir, 'model_{}.h5'.format(self.game_name))
+        model_path = os.path.join(save_dir, 'model_{}.h5'.format(game_name))
         print('Loading model from: {}'.format(model_path))
-        model.load_weights(model_path)
+        self.model.load_weights(model_path)
         done = False
         step_counter = 0
         reward_sum = 0
@@ -196,8 +201,7 @@ class MasterAgent():
         try:
             while not done:
                 env.render(mode='rgb_array')
-                policy, value = model(tf.convert_to_tensor(state[None, :], dtype=tf.float32))
-                policy = tf.nn.softmax(policy)
+                policy, value = self.model(tf.convert_to_tensor(state[None, :], dtype=tf.float32))
                 action = np.argmax(policy)
                 state, reward, done, _ = env.step(action)
                 reward_sum += reward
@@ -209,165 +213,227 @@ class MasterAgent():
             env.close()
 
 
-class Memory:
-    def __init__(self):
-        self.states = []
-        self.actions = []
-        self.rewards = []
-
-    def store(self, state, action, reward):
-        self.states.append(state)
-        self.actions.append(action)
-        self.rewards.append(reward)
-
-    def clear(self):
-        self.states = []
-        self.actions = []
-        self.rewards = []
-
-
-class Worker(threading.Thread):
-    # Set up global variables across different threads
-    global_episode = 0
-    # Moving average reward
-    global_moving_average_reward = 0
-    best_score = 0
-    save_lock = threading.Lock()
-
-    def __init__(self,
-                 state_size,
-                 action_size,
-                 global_model,
-                 opt,
-                 result_queue,
-                 idx,
-                 game_name='CartPole-v0',
-                 save_dir='/tmp'):
-        super(Worker, self).__init__()
-        self.state_size = state_size
-        self.action_size = action_size
-        self.result_queue = result_queue
-        self.global_model = global_model
-        self.opt = opt
-        self.local_model = ActorCriticModel(self.state_size, self.action_size)
-        self.worker_idx = idx
-        self.game_name = game_name
-        self.env = gym.make(self.game_name).unwrapped
-        self.save_dir = save_dir
-        self.ep_loss = 0.0
+class A2C(ActorCritic):
+    """ Synchronous Advantage Actor Critic """
 
-    def run(self):
-        total_step = 1
-        mem = Memory()
-        while Worker.global_episode < args.max_eps:
-            current_state = self.env.reset()
-            mem.clear()
-            ep_reward = 0.
-            ep_steps = 0
-            self.ep_loss = 0
-
-            time_count = 0
-            done = False
-            while not done:
-                logits, _ = self.local_model(
-                    tf.convert_to_tensor(current_state[None, :],
-                                         dtype=tf.float32))
-                probs = tf.nn.softmax(logits)
+    @tf.function
+    def _train_step(self, states, actions, returns):
+        with tf.GradientTape() as tape:
+            total_loss = self.compute_loss(states, actions, returns)
+        grads = tape.gradient(total_loss, self.model.trainable_variables)
+        self.optimizer.apply_gradients(zip(grads, self.model.trainable_variables))
+        return total_loss
 
-                action = np.random.choice(self.action_size, p=probs.numpy()[0])
-                new_state, reward, done, _ = self.env.step(action)
+    def train(self, env_fn, num_workers, num_frames, n_steps=20, seed=123):
+        """
+        :param env_fn: function creating an env
+        :param num_workers: the number of the env processes
+        :param num_frames: the number of the env-steps of all the workers
+        :param n_steps: length of the rollout of each worker per update
+        :return: list of the moving average rewards
+        """
+        env = SubprocVectorEnv([env_fn for _ in range(num_workers)])
+        env.seed(seed)
+        states = env.reset()
+        episode_rewards = np.zeros(num_workers)
+        moving_average_rewards, global_moving_average_reward = list(), 0
+        num_episodes, frames, total_loss = 0, 0, 0
+        start = time.time()
+        while frames < num_frames:
+            mb_states, mb_actions, mb_rewards, mb_dones = list(), list(), list(), list()
+            for _ in range(n_steps):
+                # one forward pass for all the workers
+                actions, _ = self.select_actions(states)
+                next_states, rewards, dones, _ = env.step(actions)
+                mb_states.append(states)
+                mb_actions.append(actions)
+                mb_rewards.append(rewards)
+                mb_dones.append(dones)
+                states = next_states
+
+                episode_rewards += rewards
+                for i in np.where(dones)[0]:
+                    global_moving_average_reward = record(num_episodes, episode_rewards[i], i,
+                                                          global_moving_average_reward, total_loss,
+                                                          self.steps_per_sec_per_core)
+                    moving_average_rewards.append(global_moving_average_reward)
+                    episode_rewards[i] = 0
+                    num_episodes += 1
+
+            # the states are already reset at the end of an episode, but the returns are not bootstrapped there
+            _, last_values = self.select_actions(states)
+            # with lam=1 the returns of GAE are the n-step returns, the values only affect the advantages
+            mb_rewards = np.array(mb_rewards, dtype=np.float32).T
+            _, returns = compute_gae(mb_rewards, np.zeros_like(mb_rewards), np.array(mb_dones).T, last_values,
+                                     gamma=self.gamma, lam=1.0)
+
+            # the gradients are computed once on the rollouts of all the workers
+            total_loss = self._train_step(tf.constant(np.concatenate(mb_states).astype(np.float32)),
+                                          tf.constant(np.concatenate(mb_actions).astype(np.int64)),
+                                          tf.constant(returns.T.reshape(-1))).numpy()
+            frames += n_steps * num_workers
+            self.steps_per_sec_per_core = frames / (time.time() - start) / num_workers
+        env.close()
+        print("Steps/sec/core: {:.1f} with {} workers".format(self.steps_per_sec_per_core, num_workers))
+        return moving_average_rewards
+
+
+def _a3c_worker(index, env_fn_wrapper, model_args, shared_weights, grad_queue, stop_event, n_steps, seed):
+    """ main loop of an A3C worker, it sends the gradients of its rollouts until the master sets the stop event """
+    # the master doesn't consume the last gradients, so that the process should not wait for them to be flushed
+    grad_queue.cancel_join_thread()
+    # a worker uses a single core
+    tf.config.threading.set_intra_op_parallelism_threads(1)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+    env = env_fn_wrapper.x()
+    env.seed(seed + index)
+    local = ActorCritic(**model_args)
+    state = env.reset()
+    version, episode_reward, episode_rewards = 0, 0, list()
+    try:
+        while not stop_event.is_set():
+            # Update local model with new weights
+            if shared_weights.version != version:
+                version, weights = shared_weights.read()
+                local.model.set_weights(weights)
+
+            states, actions, rewards, dones = list(), list(), list(), list()
+            for _ in range(n_steps):
+                action, _ = local.select_actions(state[None])
+                next_state, reward, done, _ = env.step(action[0])
+                states.append(state)
+                actions.append(action[0])
+                rewards.append(reward)
+                dones.append(done)
+                episode_reward += reward
+                state = next_state
                 if done:
-                    reward = -1
-                ep_reward += reward
-                mem.store(current_state, action, reward)
-
-                if time_count == args.update_freq or done:
-                    # Calculate gradient wrt to local model. We do so by tracking the
-                    # variables involved in computing the loss by using tf.GradientTape
-                    with tf.GradientTape() as tape:
-                        total_loss = self.compute_loss(done,
-                                                       new_state,
-                                                       mem,
-                                                       args.gamma)
-                    self.ep_loss += total_loss
-                    # Calculate local gradients
-                    grads = tape.gradient(total_loss, self.local_model.trainable_weights)
-                    # Push local gradients to global model
-                    self.opt.apply_gradients(zip(grads,
-                                                 self.global_model.trainable_weights))
-                    # Update local model with new weights
-                    self.local_model.set_weights(self.global_model.get_weights())
-
-                    mem.clear()
-                    time_count = 0
-
-                    if done:  # done and print information
-                        Worker.global_moving_average_reward = \
-                            record(Worker.global_episode, ep_reward, self.worker_idx,
-                                   Worker.global_moving_average_reward, self.result_queue,
-                                   self.ep_loss, ep_steps)
-                        # We must use a lock to save our model and to print to prevent data races.
-                        if ep_reward > Worker.best_score:
-                            with Worker.save_lock:
-                                print("Saving best model to {}, "
-                                      "episode score: {}".format(self.save_dir, ep_reward))
-                                self.global_model.save_weights(
-                                    os.path.join(self.save_dir,
-                                                 'model_{}.h5'.format(self.game_name))
-                                )
-                                Worker.best_score = ep_reward
-                        Worker.global_episode += 1
-                ep_steps += 1
-
-                time_count += 1
-                current_state = new_state
-                total_step += 1
-        self.result_queue.put(None)
-
-    def compute_loss(self,
-                     done,
-                     new_state,
-                     memory,
-                     gamma=0.99):
-        if done:
-            reward_sum = 0.  # terminal
-        else:
-            reward_sum = self.local_model(
-                tf.convert_to_tensor(new_state[None, :],
-                                     dtype=tf.float32))[-1].numpy()[0]
-
-        # Get discounted rewards
-        discounted_rewards = []
-        for reward in memory.rewards[::-1]:  # reverse buffer r
-            reward_sum = reward + gamma * reward_sum
-            discounted_rewards.append(reward_sum)
-        discounted_rewards.reverse()
-
-        logits, values = self.local_model(
-            tf.convert_to_tensor(np.vstack(memory.states),
-                                 dtype=tf.float32))
-        # Get our advantages
-        advantage = tf.convert_to_tensor(np.array(discounted_rewards)[:, None],
-                                         dtype=tf.float32) - values
-        # Value loss
-        value_loss = advantage ** 2
-
-        # Calculate our policy loss
-        policy = tf.nn.softmax(logits)
-        entropy = tf.nn.softmax_cross_entropy_with_logits_v2(labels=policy, logits=logits)
-
-        policy_loss = tf.nn.sparse_softmax_cross_entropy_with_logits(labels=memory.actions,
-                                                                     logits=logits)
-        policy_loss *= tf.stop_gradient(advantage)
-        policy_loss -= 0.01 * entropy
-        total_loss = tf.reduce_mean((0.5 * value_loss + policy_loss))
-        return total_loss
+                    episode_rewards.append(episode_reward)
+                    episode_reward = 0
+                    state = env.reset()
+                    break
+
+            last_value = 0. if dones[-1] else local.select_actions(state[None])[1][0]
+            _, returns = compute_gae(np.array(rewards)[None], np.zeros((1, len(rewards))), np.array(dones)[None],
+                                     np.array([last_value]), gamma=local.gamma, lam=1.0)
+            returns = returns[0]
+            grads, total_loss = local.compute_gradients(np.array(states), np.array(actions), returns)
+
+            # we check the stop event periodically while the queue is full
+            while not stop_event.is_set():
+                try:
+                    grad_queue.put((index, grads, total_loss, len(rewards), episode_rewards), timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            episode_rewards = list()
+    except KeyboardInterrupt:
+        print("A3C worker {}: got KeyboardInterrupt".format(index))
+    finally:
+        env.close()
+
+
+class A3C(ActorCritic):
+    """ Asynchronous Advantage Actor Critic """
+
+    def train(self, env_fn, num_workers, num_frames, n_steps=20, seed=123, context="spawn"):
+        """
+        :param env_fn: function creating an env
+        :param num_workers: the number of the worker processes
+        :param num_frames: the number of the env-steps of all the workers
+        :param n_steps: the maximum length of the rollout of a worker per gradient
+        :param context: start method of multiprocessing, "spawn" by default since TF doesn't survive fork
+        :return: list of the moving average rewards
+        """
+        ctx = multiprocessing.get_context(context)
+        shared_weights = SharedWeights(self.model.get_weights(), ctx)
+        grad_queue = ctx.Queue(maxsize=num_workers * 2)
+        stop_event = ctx.Event()
+        model_args = dict(state_size=self.state_size, action_size=self.action_size, gamma=self.gamma,
+                          entropy_coef=self.entropy_coef)
+        processes = [ctx.Process(target=_a3c_worker,
+                                 args=(index, CloudpickleWrapper(env_fn), model_args, shared_weights, grad_queue,
+                                       stop_event, n_steps, seed))
+                     for index in range(num_workers)]
+        for process in processes:
+            # if the main process crashes, we should not cause things to hang
+            process.daemon = True
+            process.start()
+
+        moving_average_rewards, global_moving_average_reward = list(), 0
+        num_episodes, frames = 0, 0
+        start = time.time()
+        try:
+            while frames < num_frames:
+                index, grads, total_loss, num_steps, episode_rewards = grad_queue.get()
+                # Push local gradients to global model
+                self.optimizer.apply_gradients(zip(grads, self.model.trainable_variables))
+                shared_weights.write(self.model.get_weights())
+                frames += num_steps
+                self.steps_per_sec_per_core = frames / (time.time() - start) / num_workers
+
+                for episode_reward in episode_rewards:
+                    global_moving_average_reward = record(num_episodes, episode_reward, index,
+                                                          global_moving_average_reward, total_loss,
+                                                          self.steps_per_sec_per_core)
+                    moving_average_rewards.append(global_moving_average_reward)
+                    num_episodes += 1
+        finally:
+            stop_event.set()
+            for process in processes:
+                process.join()
+        print("Steps/sec/core: {:.1f} with {} workers".format(self.steps_per_sec_per_core, num_workers))
+        return moving_average_rewards
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run A3C algorithm on the game '
+                                                 'Cartpole.')
+    parser.add_argument('--algorithm', default='a3c', type=str,
+                        help='Choose between \'a3c\', \'a2c\' and \'random\'.')
+    parser.add_argument('--train', dest='train', action='store_true',
+                        help='Train our model.')
+    parser.add_argument('--lr', default=0.001, type=float,
+                        help='Learning rate for the shared optimizer.')
+    parser.add_argument('--update-freq', default=20, type=int,
+                        help='How often to update the global model.')
+    parser.add_argument('--num-workers', default=multiprocessing.cpu_count(), type=int,
+                        help='Number of the worker processes.')
+    parser.add_argument('--max-frames', default=200000, type=int,
+                        help='Global maximum number of env-steps to run.')
+    parser.add_argument('--max-eps', default=1000, type=int,
+                        help='Maximum number of episodes of the random agent.')
+    parser.add_argument('--gamma', default=0.99, type=float,
+                        help='Discount factor of rewards.')
+    parser.add_argument('--save-dir', default='../../logs/models/', type=str,
+                        help='Directory in which you desire to save the model.')
+    args = parser.parse_args()
     print(args)
-    master = MasterAgent()
-    if args.train:
-        master.train()
+
+    game_name = 'CartPole-v0'
+    if not os.path.exists(args.save_dir):
+        os.makedirs(args.save_dir)
+
+    if args.algorithm == 'random':
+        RandomAgent(game_name, args.max_eps).run()
     else:
-        master.play()
+        env = gym.make(game_name)
+        agent = (A2C if args.algorithm == 'a2c' else A3C)(state_size=env.observation_space.shape[0],
+                                                          action_size=env.action_space.n,
+                                                          lr=args.lr,
+                                                          gamma=args.gamma)
+        if args.train:
+            import matplotlib.pyplot as plt
+
+            moving_average_rewards = agent.train(env_fn=lambda: gym.make(game_name),
+                                                 num_workers=args.num_workers,
+                                                 num_frames=args.max_frames,
+                                                 n_steps=args.update_freq)
+            agent.save(args.save_dir, game_name)
+            plt.plot(moving_average_rewards)
+            plt.ylabel('Moving average ep reward')
+            plt.xlabel('Step')
+            plt.savefig(os.path.join(args.save_dir, '{} Moving Average.png'.format(game_name)))
+            plt.show()
+        else:
+            agent.play(game_name, args.save_dir)
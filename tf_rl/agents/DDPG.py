@@ -40,17 +40,16 @@ class DDPG(Agent):
     def _select_action(self, state):
         return self.actor(state)
 
+    def target_model_pairs(self):
+        return [(self.target_actor, self.actor), (self.target_critic, self.critic)]
+
     def update(self, states, actions, rewards, next_states, dones):
         """
         Update methods for Actor and Critic
         please refer to https://arxiv.org/pdf/1509.02971.pdf about the details
 
         """
-        states = np.array(states, dtype=np.float32)
-        next_states = np.array(next_states, dtype=np.float32)
-        actions = np.array(actions, dtype=np.float32)
-        rewards = np.array(rewards, dtype=np.float32)
-        dones = np.array(dones, dtype=np.float32)
+        states, actions, rewards, next_states, dones = self.convert_batch(states, actions, rewards, next_states, dones)
         return self._inner_update(states, actions, rewards, next_states, dones)
 
     @tf.contrib.eager.defun(autograph=False)
@@ -85,7 +84,7 @@ class DDPG(Agent):
 
         # apply processed gradients to the network
         self.actor_optimizer.apply_gradients(zip(actor_grads, self.actor.trainable_variables))
-        return np.sum(critic_loss + actor_loss)
+        return tf.math.reduce_sum(critic_loss + actor_loss)
 
 
 class DDPG_debug(Agent):
@@ -123,17 +122,16 @@ class DDPG_debug(Agent):
     def _select_action(self, state):
         return self.actor(state)
 
+    def target_model_pairs(self):
+        return [(self.target_actor, self.actor), (self.target_critic, self.critic)]
+
     def update(self, states, actions, rewards, next_states, dones):
         """
         Update methods for Actor and Critic
         please refer to https://arxiv.org/pdf/1509.02971.pdf about the details
 
         """
-        states = np.array(states, dtype=np.float32)
-        next_states = np.array(next_states, dtype=np.float32)
-        actions = np.array(actions, dtype=np.float32)
-        rewards = np.array(rewards, dtype=np.float32)
-        dones = np.array(dones, dtype=np.float32)
+        states, actions, rewards, next_states, dones = self.convert_batch(states, actions, rewards, next_states, dones)
         return self._inner_update(states, actions, rewards, next_states, dones)
 
     @tf.contrib.eager.defun(autograph=False)
@@ -182,7 +180,7 @@ class DDPG_debug(Agent):
         tf.contrib.summary.scalar("mean_q_value", tf.math.reduce_mean(q_values), step=self.index_timestep)
         tf.contrib.summary.scalar("max_q_value", tf.math.reduce_max(q_values), step=self.index_timestep)
 
-        return np.sum(critic_loss + actor_loss)
+        return tf.math.reduce_sum(critic_loss + actor_loss)
 
 
 class self_rewarding_DDPG(Agent):
@@ -220,17 +218,16 @@ class self_rewarding_DDPG(Agent):
     def _select_action(self, state):
         return self.actor(state)
 
+    def target_model_pairs(self):
+        return [(self.target_actor, self.actor), (self.target_critic, self.critic)]
+
     def update(self, states, actions, rewards, next_states, dones):
         """
         Update methods for Actor and Critic
         please refer to https://arxiv.org/pdf/1509.02971.pdf about the details
 
         """
-        states = np.array(states, dtype=np.float32)
-        next_states = np.array(next_states, dtype=np.float32)
-        actions = np.array(actions, dtype=np.float32)
-        rewards = np.array(rewards, dtype=np.float32)
-        dones = np.array(dones, dtype=np.float32)
+        states, actions, rewards, next_states, dones = self.convert_batch(states, actions, rewards, next_states, dones)
         return self._inner_update(states, actions, rewards, next_states, dones)
 
     @tf.contrib.eager.defun(autograph=False)
@@ -267,7 +264,7 @@ class self_rewarding_DDPG(Agent):
 
         # apply processed gradients to the network
         self.actor_optimizer.apply_gradients(zip(actor_grads, self.actor.trainable_variables))
-        return np.sum(critic_loss + actor_loss)
+        return tf.math.reduce_sum(critic_loss + actor_loss)
 
 
 class Graph_DDPG(Agent):
@@ -304,17 +301,16 @@ class Graph_DDPG(Agent):
     def _select_action(self, state):
         return self.actor(state)
 
+    def target_model_pairs(self):
+        return [(self.target_actor, self.actor), (self.target_critic, self.critic)]
+
     def update(self, states, actions, rewards, next_states, dones):
         """
         Update methods for Actor and Critic
         please refer to https://arxiv.org/pdf/1509.02971.pdf about the details
 
         """
-        states = np.array(states, dtype=np.float32)
-        next_states = np.array(next_states, dtype=np.float32)
-        actions = np.array(actions, dtype=np.float32)
-        rewards = np.array(rewards, dtype=np.float32)
-        dones = np.array(dones, dtype=np.float32)
+        states, actions, rewards, next_states, dones = self.convert_batch(states, actions, rewards, next_states, dones)
         return self._inner_update(states, actions, rewards, next_states, dones)
 
     @tf.contrib.eager.defun(autograph=False)
@@ -349,4 +345,4 @@ class Graph_DDPG(Agent):
 
         # apply processed gradients to the network
         self.actor_optimizer.apply_gradients(zip(actor_grads, self.actor.model.trainable_variables))
-        return np.sum(critic_loss + actor_loss)
+        return tf.math.reduce_sum(critic_loss + actor_loss)
@@ -53,7 +53,7 @@ class DQfD_atari(Agent_atari):
         # ===== make sure to fit all process to compute gradients within this Tape context!! =====
         with tf.GradientTape() as tape:
             one_step_loss = self._one_step_loss(s, a_e, r, ns, d)
-            n_step_loss = self._n_step_loss(s, s_n, a_e_n, r_n, d)
+            n_step_loss = self._n_step_loss(s, s_n, a_e_n, r_n, d_n)
             large_margin_clf_loss = self._large_margin_clf_loss(a_e, a_l)
             l2_loss = tf.add_n(self.main_model.losses) * self.params.L2_reg
 
@@ -110,12 +110,10 @@ class DQfD_atari(Agent_atari):
         # using tf.gather, associate Q-values with the executed actions
         action_probs = tf.gather(tf.reshape(n_step_Q, [-1]), idx_flattened)
 
-        # n-step discounted reward
-        # TODO: check if this is correct
-        G = tf.math.reduce_sum([self.params.gamma ** i * rewards_n for i in range(self.params.n_step)])
+        # n-step discounted reward: it is already computed in the replay buffer
+        G = rewards_n
 
-        # TD-target
-        # TODO: think how to take `dones` into account in TD-target
+        # TD-target: `dones` tells if the episode terminated within the n-step window
         Y = G + self.params.gamma ** self.params.n_step * action_probs * (1. - dones)
 
         # get the q-values which is associated with actually taken actions in a game
@@ -186,7 +184,7 @@ class DQfD_cartpole(Agent_cartpole):
         # ===== make sure to fit all process to compute gradients within this Tape context!! =====
         with tf.GradientTape() as tape:
             one_step_loss = self._one_step_loss(s, a_e, r, ns, d)
-            n_step_loss = self._n_step_loss(s, s_n, a_e_n, r_n, d)
+            n_step_loss = self._n_step_loss(s, s_n, a_e_n, r_n, d_n)
             large_margin_clf_loss = self._large_margin_clf_loss(a_e, a_l)
             l2_loss = tf.add_n(self.main_model.losses) * self.params.L2_reg
 
@@ -243,12 +241,10 @@ class DQfD_cartpole(Agent_cartpole):
         # using tf.gather, associate Q-values with the executed actions
         action_probs = tf.gather(tf.reshape(n_step_Q, [-1]), idx_flattened)
 
-        # n-step discounted reward
-        # TODO: check if this is correct
-        G = tf.math.reduce_sum([self.params.gamma ** i * rewards_n for i in range(self.params.n_step)])
+        # n-step discounted reward: it is already computed in the replay buffer
+        G = rewards_n
 
-        # TD-target
-        # TODO: think how to take `dones` into account in TD-target
+        # TD-target: `dones` tells if the episode terminated within the n-step window
         Y = G + self.params.gamma ** self.params.n_step * action_probs * (1. - dones)
 
         # get the q-values which is associated with actually taken actions in a game
@@ -1,6 +1,27 @@
 import numpy as np
 import tensorflow as tf
 from copy import deepcopy
+from tf_rl.common.utils import soft_target_model_update_graph
+
+
+def _preprocess_transitions(transitions, o_norm, g_norm):
+    """
+    normalises the obs and the goals and concatenates them into the states fed into the networks
+
+    :param transitions: a batch from HER_replay_buffer.sample, or k batches stacked by `sample_many`
+    :return: states, actions, rewards, next_states in float32, the rewards lose the last axis of size 1
+    """
+    obs = o_norm.normalise(transitions['obs'])
+    g = g_norm.normalise(transitions['g'])
+    states = np.concatenate([obs, g], axis=-1)
+    next_obs = o_norm.normalise(transitions['obs_next'])
+    next_states = np.concatenate([next_obs, g], axis=-1)
+
+    states = np.array(states, dtype=np.float32)
+    next_states = np.array(next_states, dtype=np.float32)
+    actions = np.array(transitions['actions'], dtype=np.float32)
+    rewards = np.array(transitions['r'][..., 0], dtype=np.float32)
+    return states, actions, rewards, next_states
 
 
 class HER_DDPG:
@@ -39,21 +60,39 @@ class HER_DDPG:
     def _select_action(self, state):
         return self.actor(state)
 
+    def update_target_models(self, tau):
+        """ soft update of the target actor and critic in a single compiled call """
+        return self._update_target_models(tf.constant(tau, dtype=tf.float32))
+
+    @tf.function
+    def _update_target_models(self, tau):
+        return tf.group(soft_target_model_update_graph(self.target_actor, self.actor, tau=tau),
+                        soft_target_model_update_graph(self.target_critic, self.critic, tau=tau))
+
     def update(self, transitions):
-        obs = self.o_norm.normalise(transitions['obs'])
-        g = self.g_norm.normalise(transitions['g'])
-        states = np.concatenate([obs, g], axis=-1)
-        next_obs = self.o_norm.normalise(transitions['obs_next'])
-        next_states = np.concatenate([next_obs, g], axis=-1)
-        actions = transitions['actions']
-        rewards = transitions['r'].flatten()
-
-        states = np.array(states, dtype=np.float32)
-        next_states = np.array(next_states, dtype=np.float32)
-        actions = np.array(actions, dtype=np.float32)
-        rewards = np.array(rewards, dtype=np.float32)
+        states, actions, rewards, next_states = _preprocess_transitions(transitions, self.o_norm, self.g_norm)
         return self._inner_update(states, actions, rewards, next_states)
 
+    def update_many(self, transitions):
+        """
+        k sequential updates in a single compiled call, which saves the Python dispatch of each update
+
+        :param transitions: k batches of transitions stacked in the shape of (k, batch_size, ...),
+                            e.g., by HER_replay_buffer.sample_many
+        """
+        states, actions, rewards, next_states = _preprocess_transitions(transitions, self.o_norm, self.g_norm)
+        return self._update_many(states, actions, rewards, next_states)
+
+    @tf.function
+    def _update_many(self, states, actions, rewards, next_states):
+        # the first update is taken out of the loop to get the loss to carry
+        loss = self._inner_update(states[0], actions[0], rewards[0], next_states[0])
+        _, loss = tf.while_loop(cond=lambda i, _: i < tf.shape(states)[0],
+                                body=lambda i, _: (i + 1, self._inner_update(states[i], actions[i],
+                                                                             rewards[i], next_states[i])),
+                                loop_vars=(tf.constant(1), loss))
+        return loss
+
     @tf.contrib.eager.defun(autograph=False)
     def _inner_update(self, states, actions, rewards, next_states):
         self.index_timestep = tf.train.get_global_step()
@@ -89,7 +128,7 @@ class HER_DDPG:
 
         # apply processed gradients to the network
         self.actor_optimizer.apply_gradients(zip(actor_grads, self.actor.trainable_variables))
-        return np.sum(critic_loss + actor_loss)
+        return tf.math.reduce_sum(critic_loss + actor_loss)
 
 
 class HER_DDPG_debug:
@@ -128,14 +167,17 @@ class HER_DDPG_debug:
     def _select_action(self, state):
         return self.actor(state)
 
+    def update_target_models(self, tau):
+        """ soft update of the target actor and critic in a single compiled call """
+        return self._update_target_models(tf.constant(tau, dtype=tf.float32))
+
+    @tf.function
+    def _update_target_models(self, tau):
+        return tf.group(soft_target_model_update_graph(self.target_actor, self.actor, tau=tau),
+                        soft_target_model_update_graph(self.target_critic, self.critic, tau=tau))
+
     def update(self, transitions):
-        obs = self.o_norm.normalise(transitions['obs'])
-        g = self.g_norm.normalise(transitions['g'])
-        states = np.concatenate([obs, g], axis=-1)
-        next_obs = self.o_norm.normalise(transitions['obs_next'])
-        next_states = np.concatenate([next_obs, g], axis=-1)
-        actions = transitions['actions']
-        rewards = transitions['r'].flatten()
+        states, actions, rewards, next_states = _preprocess_transitions(transitions, self.o_norm, self.g_norm)
 
         """
         If the learning didn't go well, open this part and compare to the baselines or other repos
@@ -146,13 +188,28 @@ class HER_DDPG_debug:
         # print(self.o_norm._sum, self.o_norm._count)
         # print(self.o_norm.mean, self.o_norm.std, self.g_norm.mean, self.g_norm.std)
         # print(np.mean(states), np.mean(next_states), np.mean(actions), np.mean(rewards))
-
-        states = np.array(states, dtype=np.float32)
-        next_states = np.array(next_states, dtype=np.float32)
-        actions = np.array(actions, dtype=np.float32)
-        rewards = np.array(rewards, dtype=np.float32)
         return self._inner_update(states, actions, rewards, next_states)
 
+    def update_many(self, transitions):
+        """
+        k sequential updates in a single compiled call, which saves the Python dispatch of each update
+
+        :param transitions: k batches of transitions stacked in the shape of (k, batch_size, ...),
+                            e.g., by HER_replay_buffer.sample_many
+        """
+        states, actions, rewards, next_states = _preprocess_transitions(transitions, self.o_norm, self.g_norm)
+        return self._update_many(states, actions, rewards, next_states)
+
+    @tf.function
+    def _update_many(self, states, actions, rewards, next_states):
+        # the first update is taken out of the loop to get the loss to carry
+        loss = self._inner_update(states[0], actions[0], rewards[0], next_states[0])
+        _, loss = tf.while_loop(cond=lambda i, _: i < tf.shape(states)[0],
+                                body=lambda i, _: (i + 1, self._inner_update(states[i], actions[i],
+                                                                             rewards[i], next_states[i])),
+                                loop_vars=(tf.constant(1), loss))
+        return loss
+
     # @tf.contrib.eager.defun(autograph=False)
     def _inner_update(self, states, actions, rewards, next_states):
         self.index_timestep = tf.train.get_global_step()
@@ -196,4 +253,4 @@ class HER_DDPG_debug:
         tf.contrib.summary.scalar("mean_q_value", tf.math.reduce_mean(q_values), step=self.index_timestep)
         tf.contrib.summary.scalar("max_q_value", tf.math.reduce_max(q_values), step=self.index_timestep)
         # print(critic_loss.numpy(), actor_loss.numpy())
-        return np.sum(critic_loss + actor_loss)
+        return tf.math.reduce_sum(critic_loss + actor_loss)
@@ -43,6 +43,10 @@ class SAC(Agent):
     def _select_action(self, state):
         return self.actor(state)
 
+    def target_model_pairs(self):
+        # the actor has no target model in SAC
+        return [(self.target_critic, self.critic)]
+
     @tf.contrib.eager.defun(autograph=False)
     def _inner_update(self, states, actions, rewards, next_states, dones):
         self.index_timestep = tf.train.get_global_step()
@@ -117,6 +121,10 @@ class SAC_debug(Agent):
     def _select_action(self, state):
         return self.actor(state)
 
+    def target_model_pairs(self):
+        # the actor has no target model in SAC
+        return [(self.target_critic, self.critic)]
+
     @tf.contrib.eager.defun(autograph=False)
     def _inner_update(self, states, actions, rewards, next_states, dones):
         self.index_timestep = tf.train.get_global_step()
@@ -1,21 +1,35 @@
 import numpy as np
 import tensorflow as tf
-from scipy import signal
+import tensorflow_probability as tfp
+from tf_rl.common.advantage import compute_gae, compute_gae_tf
+
+tfd = tfp.distributions
 
 
 class TRPO:
+    """
+    PPO with the adaptive KL penalty(p.4 in https://arxiv.org/pdf/1707.06347.pdf)
+
+    A policy-improvement phase is one compiled call: the rollout is shuffled into minibatches of `params.batch_size`
+    every epoch, and the epochs run in a tf.while_loop which stops early once the KL divergence exceeds
+    4 * kl_target. The KL divergence and the adaptive beta stay in the graph, so that the host doesn't wait
+    for them between the epochs and the memory is bounded by the minibatch regardless of the length of the rollout.
+
+    :param params: num_updates(the max number of the epochs), batch_size, kl_target, L2_reg, gamma, gae_discount
+    """
+
     def __init__(self, actor, critic, num_action, params):
         self.params = params
         self.num_action = num_action
-        self.beta = 1
+        self.beta = tf.Variable(1., trainable=False, name="beta")
         self.beta_min = 1. / 20.
         self.beta_max = 20
         self.ksi = 10
         self.index_timestep = 0
         self.actor = actor(num_action)
         self.critic = critic(1)
-        self.actor_optimizer = tf.train.AdamOptimizer(learning_rate=1e-4)  # used as in paper
-        self.critic_optimizer = tf.train.AdamOptimizer(learning_rate=1.5 * 1e-3)  # used as in paper
+        self.actor_optimizer = tf.keras.optimizers.Adam(learning_rate=1e-4)  # used as in paper
+        self.critic_optimizer = tf.keras.optimizers.Adam(learning_rate=1.5 * 1e-3)  # used as in paper
 
     #  TODO: implement the checkpoints for model
 
@@ -24,42 +38,106 @@ class TRPO:
         action = self._select_action(tf.constant(state))
         return action.numpy()[0]
 
-    @tf.contrib.eager.defun(autograph=False)
+    @tf.function
     def _select_action(self, state):
         mean, std = self.actor(state)
-        return tf.squeeze(mean + std * tf.random_normal(shape=tf.shape(mean)))
-
-    def update(self, states, actions, returns, advantages, old_policy):
-        states = np.array(states, dtype=np.float32)
-        actions = np.array(actions, dtype=np.float32).reshape(-1, 1)
-        returns = np.array(returns, dtype=np.float32)
-        advantages = np.array(advantages, dtype=np.float32).reshape(-1, 1)
-
-        for _ in range(self.params.num_updates):
-            loss, kl_divergence = self._inner_update(states, actions, returns, advantages, old_policy)
-
-            if kl_divergence.numpy() > 4 * self.params.kl_target:
-                break
+        return tf.squeeze(mean + std * tf.random.normal(shape=tf.shape(mean)))
+
+    def compute_advantages(self, states, rewards, dones):
+        """
+        The normalised GAE advantages and the returns of the rollout, in the same order as `compute_gae`
+
+        :param states: [T, obs_dim], the rollouts of the episodes are concatenated
+        :param rewards: [T]
+        :param dones: [T], 1 at the last step of an episode
+        """
+        advantages, returns = self._compute_advantages(tf.constant(np.array(states, dtype=np.float32)),
+                                                       tf.constant(np.array(rewards, dtype=np.float32)),
+                                                       tf.constant(np.array(dones, dtype=np.float32)))
+        return advantages.numpy(), returns.numpy()
+
+    # the length of the rollout varies, so that the signatures avoid retracing every update
+    @tf.function(input_signature=[tf.TensorSpec([None, None]), tf.TensorSpec([None]), tf.TensorSpec([None])])
+    def _compute_advantages(self, states, rewards, dones):
+        state_values = tf.reshape(self.critic(states), [1, -1])
+        advantages, returns = compute_gae_tf(rewards[None], state_values, dones[None], tf.zeros([1]),
+                                             gamma=self.params.gamma, lam=self.params.gae_discount)
+        advantages, returns = advantages[0], returns[0]
+        mean, variance = tf.nn.moments(advantages, axes=[0])
+        return (advantages - mean) / (tf.math.sqrt(variance) + 1e-6), returns  # normalise advantages
+
+    def update(self, states, actions, rewards, dones):
+        """
+        One policy-improvement phase on a rollout
+
+        :param states: [T, obs_dim], the rollouts of the episodes are concatenated
+        :param actions: [T, num_action]
+        :param rewards: [T]
+        :param dones: [T], 1 at the last step of an episode
+        :return: the mean loss of the last epoch
+        """
+        self.index_timestep = tf.compat.v1.train.get_global_step()
+        states = tf.constant(np.array(states, dtype=np.float32))
+        actions = tf.constant(np.array(actions, dtype=np.float32).reshape(-1, self.num_action))
+        advantages, returns = self._compute_advantages(states,
+                                                       tf.constant(np.array(rewards, dtype=np.float32)),
+                                                       tf.constant(np.array(dones, dtype=np.float32)))
+        loss, kl_divergence, num_epochs = self._update(states, actions, returns, advantages[:, None])
+        return loss.numpy()
+
+    @tf.function(input_signature=[tf.TensorSpec([None, None]), tf.TensorSpec([None, None]), tf.TensorSpec([None]),
+                                  tf.TensorSpec([None, 1])])
+    def _update(self, states, actions, returns, advantages):
+        # the policy before the update, the log-probs are kept instead of the distribution to gather minibatches
+        old_mean, old_std = self.actor(states)
+        old_mean, old_std = tf.stop_gradient(old_mean), tf.stop_gradient(old_std)
+        old_log_probs = tfd.Normal(old_mean, old_std).log_prob(actions)
+
+        num_samples = tf.shape(states)[0]
+        batch_size = tf.minimum(self.params.batch_size, num_samples)
+        num_batches = num_samples // batch_size
+
+        def _epoch(epoch, loss, kl_divergence):
+            indices = tf.random.shuffle(tf.range(num_samples))
+
+            def _minibatch(i, loss_sum, kl_sum):
+                idx = indices[i * batch_size: (i + 1) * batch_size]
+                loss, kl_divergence = self._inner_update(tf.gather(states, idx),
+                                                         tf.gather(actions, idx),
+                                                         tf.gather(returns, idx),
+                                                         tf.gather(advantages, idx),
+                                                         tf.gather(old_mean, idx),
+                                                         tf.gather(old_std, idx),
+                                                         tf.gather(old_log_probs, idx))
+                return i + 1, loss_sum + loss, kl_sum + kl_divergence
+
+            _, loss_sum, kl_sum = tf.while_loop(cond=lambda i, *_: i < num_batches,
+                                                body=_minibatch,
+                                                loop_vars=(tf.constant(0), tf.constant(0.), tf.constant(0.)))
+            num_batches_f = tf.cast(num_batches, tf.float32)
+            return epoch + 1, loss_sum / num_batches_f, kl_sum / num_batches_f
+
+        # early stop once the KL divergence gets too large
+        num_epochs, loss, kl_divergence = tf.while_loop(
+            cond=lambda epoch, loss, kl: tf.logical_and(epoch < self.params.num_updates,
+                                                        kl <= 4 * self.params.kl_target),
+            body=_epoch,
+            loop_vars=(tf.constant(0), tf.constant(0.), tf.constant(0.)))
 
         ''' p.4 in https://arxiv.org/pdf/1707.06347.pdf '''
-        if kl_divergence.numpy() < self.params.kl_target / 1.5:
-            self.beta /= 2
-        elif kl_divergence.numpy() > self.params.kl_target * 1.5:
-            self.beta *= 2
-        self.beta = np.clip(self.beta, self.beta_min, self.beta_max)
-
-        return loss
+        beta = tf.where(kl_divergence < self.params.kl_target / 1.5, self.beta / 2,
+                        tf.where(kl_divergence > self.params.kl_target * 1.5, self.beta * 2, self.beta))
+        self.beta.assign(tf.clip_by_value(beta, self.beta_min, self.beta_max))
+        return loss, kl_divergence, num_epochs
 
-    @tf.contrib.eager.defun(autograph=False)
-    def _inner_update(self, states, actions, returns, advantages, old_policy):
-        self.index_timestep = tf.train.get_global_step()
+    def _inner_update(self, states, actions, returns, advantages, old_mean, old_std, old_log_probs):
         # Update Critic
         with tf.GradientTape() as tape:
             state_values = self.critic(states)
 
             # Compute critic loss
             L2 = tf.add_n(self.critic.losses) * self.params.L2_reg
-            critic_loss = tf.losses.mean_squared_error(returns, tf.reshape(state_values, [-1])) + L2
+            critic_loss = tf.math.reduce_mean(tf.math.square(returns - tf.reshape(state_values, [-1]))) + L2
 
         critic_grads = tape.gradient(critic_loss, self.critic.trainable_variables)
         self.critic_optimizer.apply_gradients(zip(critic_grads, self.critic.trainable_variables))
@@ -67,10 +145,9 @@ class TRPO:
         # Update Actor
         with tf.GradientTape() as tape:
             mean, std = self.actor(states)
-            new_policy = tf.contrib.distributions.Normal(mean, std)
-            kl_divergence = tf.contrib.distributions.kl_divergence(new_policy, old_policy)
-            actor_loss = -tf.math.reduce_mean(
-                advantages * tf.math.exp(new_policy.log_prob(actions) - old_policy.log_prob(actions)))
+            new_policy = tfd.Normal(mean, std)
+            kl_divergence = tfd.kl_divergence(new_policy, tfd.Normal(old_mean, old_std))
+            actor_loss = -tf.math.reduce_mean(advantages * tf.math.exp(new_policy.log_prob(actions) - old_log_probs))
             actor_loss += tf.math.reduce_mean(self.beta * kl_divergence)
             actor_loss += tf.math.reduce_mean(
                 self.ksi * tf.math.square(tf.math.maximum(0.0, kl_divergence - 2 * self.params.kl_target)))
@@ -81,7 +158,7 @@ class TRPO:
         # apply processed gradients to the network
         self.actor_optimizer.apply_gradients(zip(actor_grads, self.actor.trainable_variables))
 
-        return tf.math.reduce_sum(critic_loss + actor_loss), tf.math.reduce_sum(kl_divergence)
+        return critic_loss + actor_loss, tf.math.reduce_mean(kl_divergence)
 
 
 class TRPO_debug:
@@ -110,22 +187,20 @@ class TRPO_debug:
         mean, std = self.policy(state)
         return tf.squeeze(mean + std * tf.random_normal(shape=tf.shape(mean)))
 
-    def update(self, states, actions, rewards):
+    def update(self, states, actions, rewards, dones):
         self.index_timestep = tf.train.get_global_step()
 
-        # calculate discounted returns
-        returns = signal.lfilter([1.0], [1.0, -self.params.gamma], rewards[::-1])[::-1]
-
-        # calculate Advantages
+        # calculate discounted returns and Advantages, they are not bootstrapped across the episodes
         states = np.array(states).astype(np.float32)
         state_values = self.value(states).numpy().flatten()
-        td_error = np.array(rewards) - state_values + np.append(state_values[1:] * self.params.gamma, 0)
-        advantages = signal.lfilter([1.0], [1.0, -self.params.gae_discount * self.params.gamma], td_error[::-1])[::-1]
+        advantages, returns = compute_gae(np.array(rewards)[None], state_values[None], np.array(dones)[None],
+                                          gamma=self.params.gamma, lam=self.params.gae_discount)
+        advantages, returns = advantages[0], returns[0]
         advantages = (advantages - np.mean(advantages)) / (np.std(advantages) + 1e-6)  # normalise advantages
 
         # construct the old policy
         old_mu, old_std = self.policy(states)
-        old_policy = tf.contrib.distributions.Normal(old_mu, old_std)
+        old_policy = tfd.Normal(old_mu, old_std)
 
         # prepare to feed data to the graph computation
         states = np.array(states, dtype=np.float32)
@@ -158,8 +233,8 @@ class TRPO_debug:
         # Update policy
         with tf.GradientTape() as tape:
             mean, std = self.policy(states)
-            new_policy = tf.contrib.distributions.Normal(mean, std)
-            kl_divergence = tf.contrib.distributions.kl_divergence(new_policy, old_policy)
+            new_policy = tfd.Normal(mean, std)
+            kl_divergence = tfd.kl_divergence(new_policy, old_policy)
             actor_loss = -tf.math.reduce_mean(
                 advantages * tf.math.exp(new_policy.log_prob(actions) - old_policy.log_prob(actions)))
             actor_loss += tf.math.reduce_mean(self.beta * kl_divergence)
@@ -1,5 +1,6 @@
 import numpy as np
 import tensorflow as tf
+from tf_rl.common.utils import soft_target_model_update_graph
 
 
 class Agent:
@@ -17,14 +18,89 @@ class Agent:
     def _select_action(self, state):
         raise NotImplementedError
 
+    # dtypes of (states, actions, rewards, next_states, dones) fed into `_inner_update`
+    batch_dtypes = (np.float32, np.float32, np.float32, np.float32, np.float32)
+
+    def convert_batch(self, *batch):
+        """
+        converts a batch into `batch_dtypes`
+        tf.Tensors are assumed to be already converted, e.g., by tf_rl.common.prefetcher.BatchPrefetcher
+        """
+        return [data if tf.is_tensor(data) else np.array(data, dtype=dtype)
+                for data, dtype in zip(batch, self.batch_dtypes)]
+
     def update(self, states, actions, rewards, next_states, dones):
-        states = np.array(states, dtype=np.float32)
-        next_states = np.array(next_states, dtype=np.float32)
-        actions = np.array(actions, dtype=np.float32)
-        rewards = np.array(rewards, dtype=np.float32)
-        dones = np.array(dones, dtype=np.float32)
+        states, actions, rewards, next_states, dones = self.convert_batch(states, actions, rewards, next_states, dones)
         return self._inner_update(states, actions, rewards, next_states, dones)
 
+    @tf.function
+    def update_from_buffer(self, replay_buffer, batch_size):
+        """
+        sample + update in a single graph without returning to Python
+
+        :param replay_buffer: tf_rl.common.memory_tf.ReplayBuffer whose `sample` is composed of TF ops
+        :param batch_size: python int, otherwise the graph is retraced at every call
+        """
+        batch = replay_buffer.sample(batch_size)
+        states, actions, rewards, next_states, dones = [tf.cast(data, dtype=dtype)
+                                                        for data, dtype in zip(batch, self.batch_dtypes)]
+        return self._inner_update(states, actions, rewards, next_states, dones)
+
+    def update_fused(self, states, actions, rewards, next_states, dones, tau):
+        """
+        `update` followed by the soft update of the target models in a single compiled call
+        so that a training step costs one Python dispatch and doesn't sync with the device
+
+        :param tau: coefficient of the Polyak averaging, it is fed as a tensor so that a new value doesn't retrace
+        """
+        states, actions, rewards, next_states, dones = self.convert_batch(states, actions, rewards, next_states, dones)
+        return self._fused_update(states, actions, rewards, next_states, dones, tf.constant(tau, dtype=tf.float32))
+
+    @tf.function
+    def _fused_update(self, states, actions, rewards, next_states, dones, tau):
+        loss = self._inner_update(states, actions, rewards, next_states, dones)
+        # the automatic control dependencies of tf.function run the assignments after the gradient steps
+        for target, source in self.target_model_pairs():
+            soft_target_model_update_graph(target, source, tau=tau)
+        return loss
+
+    def update_many(self, states, actions, rewards, next_states, dones, taus=None):
+        """
+        k sequential updates in a single compiled call, which saves the Python dispatch of each update
+
+        :param states, actions, rewards, next_states, dones: k batches stacked in the shape of (k, batch_size, ...),
+                                                            e.g., by tf_rl.common.memory.ReplayBuffer.sample_many
+        :param taus: coefficient of the soft update of the target models after each update in the shape of (k,),
+                     0 skips the sync and 1 is the hard sync. None doesn't touch the target models
+        :return: outputs of the last update
+        """
+        states, actions, rewards, next_states, dones = self.convert_batch(states, actions, rewards, next_states, dones)
+        if taus is None:
+            taus = np.zeros(len(states), dtype=np.float32)
+        return self._update_many(states, actions, rewards, next_states, dones, tf.constant(taus, dtype=tf.float32))
+
+    @tf.function
+    def _update_many(self, states, actions, rewards, next_states, dones, taus):
+        def _step(i):
+            outputs = self._inner_update(states[i], actions[i], rewards[i], next_states[i], dones[i])
+            syncs = [tf.cond(taus[i] > 0,
+                             lambda: soft_target_model_update_graph(target, source, tau=taus[i]),
+                             tf.no_op)
+                     for target, source in self.target_model_pairs()]
+            # the next update has to see the synced target models
+            with tf.control_dependencies(syncs):
+                return tf.nest.map_structure(tf.identity, outputs)
+
+        # the first update is taken out of the loop to get the structure of the outputs
+        _, outputs = tf.while_loop(cond=lambda i, _: i < tf.shape(states)[0],
+                                   body=lambda i, _: (i + 1, _step(i)),
+                                   loop_vars=(tf.constant(1), _step(0)))
+        return outputs
+
+    def target_model_pairs(self):
+        """ list of (target model, main model) softly updated in `update_fused` and `update_many` """
+        raise NotImplementedError
+
     def _inner_update(self, states, actions, rewards, next_states, dones):
         raise NotImplementedError
 
@@ -43,14 +119,15 @@ class Agent_atari(Agent):
         action = self._select_action(tf.constant(state))
         return action.numpy()[0]
 
+    batch_dtypes = (np.float32, np.uint8, np.float32, np.float32, np.float32)
+
     def update(self, states, actions, rewards, next_states, dones):
-        states = np.array(states, dtype=np.float32)
-        next_states = np.array(next_states, dtype=np.float32)
-        actions = np.array(actions, dtype=np.uint8)
-        rewards = np.array(rewards, dtype=np.float32)
-        dones = np.array(dones, dtype=np.float32)
+        states, actions, rewards, next_states, dones = self.convert_batch(states, actions, rewards, next_states, dones)
         return self._inner_update(states, actions, rewards, next_states, dones)
 
+    def target_model_pairs(self):
+        return [(self.target_model, self.main_model)]
+
     def _select_action(self, state):
         raise NotImplementedError
 
@@ -75,13 +152,14 @@ class Agent_cartpole(Agent):
     def _select_action(self, state):
         raise NotImplementedError
 
+    batch_dtypes = (np.float32, np.uint8, np.float32, np.float32, np.float32)
+
     def update(self, states, actions, rewards, next_states, dones):
-        states = np.array(states, dtype=np.float32)
-        next_states = np.array(next_states, dtype=np.float32)
-        actions = np.array(actions, dtype=np.uint8)
-        rewards = np.array(rewards, dtype=np.float32)
-        dones = np.array(dones, dtype=np.float32)
+        states, actions, rewards, next_states, dones = self.convert_batch(states, actions, rewards, next_states, dones)
         return self._inner_update(states, actions, rewards, next_states, dones)
 
+    def target_model_pairs(self):
+        return [(self.target_model, self.main_model)]
+
     def _inner_update(self, states, actions, rewards, next_states, dones):
         raise NotImplementedError
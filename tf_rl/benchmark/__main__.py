@@ -0,0 +1,3 @@
+from tf_rl.benchmark.run import main
+
+main()
@@ -0,0 +1,121 @@
+"""
+Throughput of the update of the agents on random batches
+
+- update: transitions/s of `update`, i.e., batch_size * updates/s
+          for DDPG and SAC, this is `update_fused` which includes the soft update of the target models
+- select_action: calls/s of the action selection on a single state
+
+Each agent is built in its own try-block since some of them rely on the TF1 APIs(e.g., tf.contrib)
+which are not available in every version of TF. The failures are recorded in the results.
+"""
+
+import tempfile
+import argparse
+import functools
+import numpy as np
+import tensorflow as tf
+from tf_rl.benchmark.utils import measure, result, error
+
+SUITE = "agent"
+
+
+def _random_batch(batch_size, obs_dim, num_action, flg_discrete):
+    states = np.random.randn(batch_size, obs_dim).astype(np.float32)
+    next_states = np.random.randn(batch_size, obs_dim).astype(np.float32)
+    if flg_discrete:
+        actions = np.random.randint(num_action, size=batch_size)
+    else:
+        actions = np.random.uniform(-1, 1, size=(batch_size, num_action)).astype(np.float32)
+    rewards = np.random.randn(batch_size).astype(np.float32)
+    dones = np.random.randint(2, size=batch_size).astype(np.float32)
+    return states, actions, rewards, next_states, dones
+
+
+def _build_dqn(obs_dim, num_action, batch_size):
+    from tf_rl.examples.DQN.utils.agent import dqn_agent
+    from tf_rl.examples.DQN.utils.network import cartpole_net
+    from tf_rl.examples.DQN.utils.policy import EpsilonGreedyPolicy_eager
+    agent = dqn_agent(model=cartpole_net,
+                      policy=EpsilonGreedyPolicy_eager(num_action=num_action, epsilon_fn=lambda: tf.constant(0.1)),
+                      optimizer=tf.compat.v1.train.RMSPropOptimizer(0.00025, 0.95, 0.0, 0.00001, True),
+                      loss_fn=tf.compat.v1.losses.huber_loss,
+                      grad_clip_fn=lambda grads: grads,
+                      obs_prc_fn=lambda x: x,
+                      num_action=num_action,
+                      model_dir=tempfile.mkdtemp(),
+                      gamma=0.99,
+                      obs_shape=(obs_dim,),
+                      batch_size=batch_size)
+    return agent, agent.update, agent.select_action, True
+
+
+def _build_ddpg(obs_dim, num_action, batch_size):
+    from tf_rl.examples.DDPG.utils.agent import DDPG
+    from tf_rl.examples.DDPG.utils.network import Actor, Critic
+    from tf_rl.common.random_process import GaussianNoise
+    model_dir = tempfile.mkdtemp()
+    agent = DDPG(actor=Actor,
+                 critic=Critic,
+                 num_action=num_action,
+                 random_process=GaussianNoise(mu=0.0, sigma=0.2),
+                 gamma=0.99,
+                 L2_reg=0.5,
+                 actor_model_dir=model_dir + "/actor",
+                 critic_model_dir=model_dir + "/critic",
+                 obs_shape=(obs_dim,),
+                 batch_size=batch_size)
+    return agent, functools.partial(agent.update_fused, tau=1e-2), agent.select_action, False
+
+
+def _build_sac(obs_dim, num_action, batch_size):
+    from tf_rl.agents.SAC import SAC
+    from tf_rl.common.networks import SAC_Actor, SAC_Critic
+    model_dir = tempfile.mkdtemp()
+    params = argparse.Namespace(actor_model_dir=model_dir + "/actor",
+                                critic_model_dir=model_dir + "/critic",
+                                alpha=0.2,
+                                gamma=0.99)
+    agent = SAC(SAC_Actor, SAC_Critic, num_action, params)
+    return agent, functools.partial(agent.update_fused, tau=1e-2), agent.predict, False
+
+
+def _build_trpo(obs_dim, num_action, batch_size):
+    from tf_rl.agents.TRPO import TRPO
+    from tf_rl.common.networks import TRPO_Policy, TRPO_Value
+    params = argparse.Namespace(num_updates=1, batch_size=batch_size, kl_target=0.003, L2_reg=0.001, gamma=0.99,
+                                gae_discount=0.98)
+    agent = TRPO(TRPO_Policy, TRPO_Value, num_action, params)
+
+    def _update(states, actions, rewards, next_states, dones):
+        # TRPO is on-policy, so that we regard a batch as a rollout
+        return agent.update(states, actions, rewards, dones)
+
+    return agent, _update, agent.predict, False
+
+
+AGENTS = {
+    "DQN": _build_dqn,
+    "DDPG": _build_ddpg,
+    "SAC": _build_sac,
+    "TRPO": _build_trpo,
+}
+
+
+def run(agents, batch_sizes, num_iter, obs_dim, num_action):
+    tf.compat.v1.train.get_or_create_global_step()
+    results = list()
+    for name in agents:
+        for batch_size in batch_sizes:
+            try:
+                agent, update_fn, select_action_fn, flg_discrete = AGENTS[name](obs_dim, num_action, batch_size)
+                batch = _random_batch(batch_size, obs_dim, num_action, flg_discrete)
+                sec = measure(lambda: update_fn(*batch), num_iter=num_iter, num_warmup=2)
+                results.append(result(SUITE, name + ".update", "transitions/s", sec, items_per_call=batch_size,
+                                      batch_size=batch_size, obs_dim=obs_dim, num_action=num_action))
+                state = batch[0][0]
+                sec = measure(lambda: select_action_fn(state), num_iter=num_iter, num_warmup=2)
+                results.append(result(SUITE, name + ".select_action", "calls/s", sec, batch_size=batch_size,
+                                      obs_dim=obs_dim, num_action=num_action))
+            except Exception as e:
+                results.append(error(SUITE, name, e, batch_size=batch_size))
+    return results
@@ -0,0 +1,160 @@
+"""
+Throughput of the replay buffers and the segment trees
+
+- add: transitions/s of `add`
+- sample: transitions/s of `sample`, i.e., batch_size * samples/s
+- update_priorities: transitions/s of `update_priorities` of PrioritizedReplayBuffer
+"""
+
+import tempfile
+import numpy as np
+from tf_rl.common.memory import ReplayBuffer, ColumnarReplayBuffer, FrameReplayBuffer, PrioritizedReplayBuffer, \
+    ColumnarPrioritizedReplayBuffer, HER_replay_buffer
+from tf_rl.common.segment_tree import SumSegmentTree, MinSegmentTree
+from tf_rl.common.utils import her_sampler
+from tf_rl.benchmark.utils import measure, result, error
+
+SUITE = "memory"
+
+
+def _fill(memory, size, obs_shape, obs_dtype, episode_len=200):
+    """ add `size` transitions of random episodes and return the sec per add """
+    obs = np.random.randint(0, 255, size=(episode_len + 1,) + obs_shape).astype(obs_dtype)
+    actions = np.random.randint(0, 4, size=episode_len)
+    rewards = np.random.randn(episode_len)
+
+    def _add_episode():
+        for t in range(episode_len):
+            memory.add(obs[t], actions[t], rewards[t], obs[t + 1], t == episode_len - 1)
+
+    num_episodes = max(size // episode_len, 1)
+    return measure(_add_episode, num_iter=num_episodes, num_warmup=0, num_repeat=1) / episode_len
+
+
+def _bench_buffer(name, memory_fn, sizes, batch_sizes, num_iter, obs_shape, obs_dtype, flg_per=False):
+    results = list()
+    for size in sizes:
+        try:
+            memory = memory_fn(size)
+            results.append(result(SUITE, name + ".add", "transitions/s", _fill(memory, size, obs_shape, obs_dtype),
+                                  size=size, obs_shape=list(obs_shape)))
+            for batch_size in batch_sizes:
+                args = (0.4,) if flg_per else ()
+                sec = measure(lambda: memory.sample(batch_size, *args), num_iter=num_iter)
+                results.append(result(SUITE, name + ".sample", "transitions/s", sec, items_per_call=batch_size,
+                                      size=size, batch_size=batch_size, obs_shape=list(obs_shape)))
+                if flg_per:
+                    idxes = memory.sample(batch_size, 0.4)[-1]
+                    priorities = np.random.uniform(size=batch_size) + 1e-6
+                    sec = measure(lambda: memory.update_priorities(idxes, priorities), num_iter=num_iter)
+                    results.append(result(SUITE, name + ".update_priorities", "transitions/s", sec,
+                                          items_per_call=batch_size, size=size, batch_size=batch_size))
+        except Exception as e:
+            results.append(error(SUITE, name, e, size=size))
+    return results
+
+
+def _bench_segment_tree(sizes, batch_sizes, num_iter):
+    results = list()
+    for size in sizes:
+        # capacity has to be a power of 2
+        capacity = 1 << (size - 1).bit_length()
+        try:
+            sum_tree, min_tree = SumSegmentTree(capacity), MinSegmentTree(capacity)
+            sec = measure(lambda: sum_tree.__setitem__(np.random.randint(capacity), np.random.uniform()),
+                          num_iter=num_iter)
+            results.append(result(SUITE, "SumSegmentTree.set", "items/s", sec, size=capacity))
+            sum_tree[np.arange(capacity)] = np.random.uniform(size=capacity)
+            min_tree[np.arange(capacity)] = np.random.uniform(size=capacity)
+            for batch_size in batch_sizes:
+                idxes = np.random.randint(capacity, size=batch_size)
+                values = np.random.uniform(size=batch_size)
+                sec = measure(lambda: sum_tree.__setitem__(idxes, values), num_iter=num_iter)
+                results.append(result(SUITE, "SumSegmentTree.set_batch", "items/s", sec, items_per_call=batch_size,
+                                      size=capacity, batch_size=batch_size))
+                prefixsums = np.random.uniform(size=batch_size) * sum_tree.sum()
+                sec = measure(lambda: sum_tree.find_prefixsum_idx(prefixsums), num_iter=num_iter)
+                results.append(result(SUITE, "SumSegmentTree.find_prefixsum_idx", "items/s", sec,
+                                      items_per_call=batch_size, size=capacity, batch_size=batch_size))
+            sec = measure(lambda: min_tree.min(), num_iter=num_iter)
+            results.append(result(SUITE, "MinSegmentTree.min", "calls/s", sec, size=capacity))
+        except Exception as e:
+            results.append(error(SUITE, "SegmentTree", e, size=size))
+    return results
+
+
+def _bench_her(sizes, batch_sizes, num_iter, T=50):
+    results = list()
+    env_params = {"max_timesteps": T, "obs": 10, "goal": 3, "action": 4}
+    sampler = her_sampler(replay_strategy="future", replay_k=4,
+                          reward_func=lambda ag, g, info: -(np.linalg.norm(ag - g, axis=-1) > 0.05).astype(np.float32))
+    for size in sizes:
+        try:
+            memory = HER_replay_buffer(env_params, size, sampler.sample_her_transitions)
+            episode = [np.random.randn(1, T + 1, env_params["obs"]),
+                       np.random.randn(1, T + 1, env_params["goal"]),
+                       np.random.randn(1, T, env_params["goal"]),
+                       np.random.randn(1, T, env_params["action"])]
+            sec = measure(lambda: memory.store_episode(episode), num_iter=max(size // T, 1), num_warmup=0,
+                          num_repeat=1)
+            results.append(result(SUITE, "HER_replay_buffer.store_episode", "transitions/s", sec, items_per_call=T,
+                                  size=size))
+            for batch_size in batch_sizes:
+                sec = measure(lambda: memory.sample(batch_size), num_iter=num_iter)
+                results.append(result(SUITE, "HER_replay_buffer.sample", "transitions/s", sec,
+                                      items_per_call=batch_size, size=size, batch_size=batch_size))
+        except Exception as e:
+            results.append(error(SUITE, "HER_replay_buffer", e, size=size))
+    return results
+
+
+def _bench_memory_tf(sizes, batch_sizes, num_iter, obs_shape, max_adds=2000):
+    """ memory_tf is filled partially since an eager `add` is slow """
+    results = list()
+    try:
+        from tf_rl.common.memory_tf import ReplayBuffer as ReplayBuffer_tf
+    except Exception as e:
+        return [error(SUITE, "memory_tf", e)]
+
+    for size in sizes:
+        for n_step in [0, 5]:
+            name = "memory_tf.ReplayBuffer" + ("_n_step" if n_step else "")
+            try:
+                memory = ReplayBuffer_tf(capacity=size, n_step=n_step, act_shape=(), obs_shape=obs_shape,
+                                         checkpoint_dir=tempfile.mkdtemp())
+                sec = _fill(memory, min(size, max_adds), obs_shape, np.float32)
+                results.append(result(SUITE, name + ".add", "transitions/s", sec, size=size,
+                                      obs_shape=list(obs_shape)))
+                for batch_size in batch_sizes:
+                    sec = measure(lambda: memory.sample_tf(batch_size), num_iter=num_iter, num_warmup=2)
+                    results.append(result(SUITE, name + ".sample_tf", "transitions/s", sec,
+                                          items_per_call=batch_size, size=size, batch_size=batch_size))
+            except Exception as e:
+                results.append(error(SUITE, name, e, size=size))
+    return results
+
+
+def run(sizes, batch_sizes, num_iter, obs_dim):
+    traj_dir = tempfile.mkdtemp()
+    obs_shape = (obs_dim,)
+    frame_shape = (84, 84, 4)
+    results = list()
+    results += _bench_buffer("ReplayBuffer", lambda size: ReplayBuffer(size, traj_dir=traj_dir),
+                             sizes, batch_sizes, num_iter, obs_shape, np.float32)
+    results += _bench_buffer("ColumnarReplayBuffer", lambda size: ColumnarReplayBuffer(size, traj_dir=traj_dir),
+                             sizes, batch_sizes, num_iter, obs_shape, np.float32)
+    results += _bench_buffer("ColumnarReplayBuffer_n_step",
+                             lambda size: ColumnarReplayBuffer(size, n_step=5, flg_seq=False, traj_dir=traj_dir),
+                             sizes, batch_sizes, num_iter, obs_shape, np.float32)
+    results += _bench_buffer("PrioritizedReplayBuffer",
+                             lambda size: PrioritizedReplayBuffer(size, alpha=0.6),
+                             sizes, batch_sizes, num_iter, obs_shape, np.float32, flg_per=True)
+    results += _bench_buffer("ColumnarPrioritizedReplayBuffer",
+                             lambda size: ColumnarPrioritizedReplayBuffer(size, alpha=0.6),
+                             sizes, batch_sizes, num_iter, obs_shape, np.float32, flg_per=True)
+    results += _bench_buffer("FrameReplayBuffer", lambda size: FrameReplayBuffer(size, traj_dir=traj_dir),
+                             sizes, batch_sizes, num_iter, frame_shape, np.uint8)
+    results += _bench_segment_tree(sizes, batch_sizes, num_iter)
+    results += _bench_her(sizes, batch_sizes, num_iter)
+    results += _bench_memory_tf(sizes, batch_sizes, num_iter, obs_shape)
+    return results
@@ -0,0 +1,85 @@
+"""
+Latency of a gradient step of the networks in tf_rl/common/networks.py in each execution mode
+(see tf_rl.common.eager_util.set_execution_mode)
+
+- float32: tf.function as the agents do by default
+- xla: the same step compiled by XLA
+- bfloat16 / bfloat16_xla: the conv trunk in bfloat16, only for the networks with the conv layers
+
+Each record has `speedup`, which is the ratio of the time of float32 to the one of the mode.
+"""
+
+import numpy as np
+import tensorflow as tf
+from tf_rl.common import networks
+from tf_rl.common.eager_util import set_execution_mode, compiled_function
+from tf_rl.benchmark.utils import measure, result, error
+
+SUITE = "network"
+IMAGE_SHAPE = (84, 84, 4)
+
+# name: (function building the network, input shapes given obs_dim and num_action, flg_conv)
+NETWORKS = {
+    "Nature_DQN": (lambda num_action: networks.Nature_DQN(num_action), lambda o, a: [IMAGE_SHAPE], True),
+    "Duelling_atari": (lambda num_action: networks.Duelling_atari(num_action), lambda o, a: [IMAGE_SHAPE], True),
+    "DDPG_Actor": (lambda num_action: networks.DDPG_Actor(num_action), lambda o, a: [(o,)], False),
+    "DDPG_Critic": (lambda num_action: networks.DDPG_Critic(1), lambda o, a: [(o,), (a,)], False),
+    "SAC_Actor": (lambda num_action: networks.SAC_Actor(num_action), lambda o, a: [(o,)], False),
+    "SAC_Critic": (lambda num_action: networks.SAC_Critic(1), lambda o, a: [(o,), (a,)], False),
+    # the input of HER is the concatenation of the observation and the goal
+    "HER_Actor": (lambda num_action: networks.HER_Actor(num_action), lambda o, a: [(2 * o,)], False),
+    "HER_Critic": (lambda num_action: networks.HER_Critic(1), lambda o, a: [(2 * o,), (a,)], False),
+    "TRPO_Policy": (lambda num_action: networks.TRPO_Policy(num_action), lambda o, a: [(o,)], False),
+    "TRPO_Value": (lambda num_action: networks.TRPO_Value(1), lambda o, a: [(o,)], False),
+}
+
+# mode: (xla, mixed_precision)
+MODES = {
+    "float32": (False, False),
+    "xla": (True, False),
+    "bfloat16": (False, True),
+    "bfloat16_xla": (True, True),
+}
+
+
+def _train_step(model, optimizer, jit_compile):
+    """ a gradient step on the squared outputs, it stands for the update of an agent """
+
+    def _step(*inputs):
+        with tf.GradientTape() as tape:
+            outputs = tf.nest.flatten(model(*inputs))
+            loss = tf.add_n([tf.math.reduce_mean(tf.math.square(tf.cast(output, tf.float32)))
+                             for output in outputs])
+        grads = tape.gradient(loss, model.trainable_variables)
+        optimizer.apply_gradients(zip(grads, model.trainable_variables))
+        return loss
+
+    return compiled_function(_step, jit_compile=jit_compile)
+
+
+def run(networks_to_run, batch_sizes, num_iter, obs_dim, num_action):
+    results = list()
+    for name in networks_to_run:
+        build_fn, input_shapes_fn, flg_conv = NETWORKS[name]
+        for batch_size in batch_sizes:
+            inputs = [tf.constant(np.random.randn(batch_size, *shape).astype(np.float32))
+                      for shape in input_shapes_fn(obs_dim, num_action)]
+            baseline = None
+            for mode, (xla, mixed_precision) in MODES.items():
+                if mixed_precision and not flg_conv:
+                    continue
+                try:
+                    # the networks read the mode when they are built
+                    set_execution_mode(xla=xla, mixed_precision=mixed_precision)
+                    model = build_fn(num_action)
+                    step = _train_step(model, tf.keras.optimizers.Adam(1e-4), jit_compile=xla)
+                    sec = measure(lambda: step(*inputs), num_iter=num_iter, num_warmup=2)
+                    baseline = sec if mode == "float32" else baseline
+                    results.append(result(SUITE, "{}.{}".format(name, mode), "updates/s", sec,
+                                          batch_size=batch_size, obs_dim=obs_dim, num_action=num_action,
+                                          mode=mode, speedup=None if baseline is None else baseline / sec))
+                except Exception as e:
+                    results.append(error(SUITE, "{}.{}".format(name, mode), e, batch_size=batch_size, mode=mode))
+                finally:
+                    set_execution_mode()
+    return results
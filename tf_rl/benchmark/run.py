@@ -0,0 +1,102 @@
+"""
+CPU-only benchmark suite for the replay buffers, the agents and the networks
+
+Usage:
+    python -m tf_rl.benchmark.run --output ./bench.json
+    python -m tf_rl.benchmark.run --suites memory --sizes 10000 100000 --batch_sizes 32 256
+    python -m tf_rl.benchmark.run --suites network --networks DDPG_Actor Nature_DQN
+
+The results are dumped as JSON with the commit hash, so that we can compare them across the commits.
+"""
+
+import os
+import sys
+import json
+import argparse
+import platform
+import datetime
+import subprocess
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def _meta(params):
+    import numpy as np
+    import tensorflow as tf
+    return {"commit": _git_commit(),
+            "date": datetime.datetime.now().isoformat(),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "tensorflow": tf.__version__,
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "params": vars(params)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark suite of tf_rl")
+    parser.add_argument("--suites", default=["memory", "agent"], nargs="+", help="memory, agent and/or network")
+    parser.add_argument("--agents", default=["DQN", "DDPG", "SAC", "TRPO"], nargs="+", help="agents to benchmark")
+    parser.add_argument("--networks", default=None, nargs="+", help="networks to benchmark, all by default")
+    parser.add_argument("--sizes", default=[10000, 100000], type=int, nargs="+", help="sizes of the buffers")
+    parser.add_argument("--batch_sizes", default=[32, 256], type=int, nargs="+", help="batch sizes")
+    parser.add_argument("--num_iter", default=100, type=int, help="the number of calls in a measurement")
+    parser.add_argument("--obs_dim", default=17, type=int, help="dim of the vector observation(HalfCheetah: 17)")
+    parser.add_argument("--num_action", default=6, type=int, help="the number of actions(HalfCheetah: 6)")
+    parser.add_argument("--seed", default=123, type=int, help="seed for randomness")
+    parser.add_argument("--output", default=None, help="path to the JSON file, print to stdout if not given")
+    params = parser.parse_args(argv)
+
+    # hide the GPUs before TF is imported so that the results don't depend on the accelerator
+    os.environ["CUDA_VISIBLE_DEVICES"] = ""
+
+    import numpy as np
+    import tensorflow as tf
+    from tf_rl.benchmark import memory_benchmark, agent_benchmark, network_benchmark
+
+    tf.compat.v1.enable_eager_execution()
+    np.random.seed(params.seed)
+    tf.compat.v1.set_random_seed(params.seed)
+
+    results = list()
+    if "memory" in params.suites:
+        results += memory_benchmark.run(sizes=params.sizes,
+                                        batch_sizes=params.batch_sizes,
+                                        num_iter=params.num_iter,
+                                        obs_dim=params.obs_dim)
+    if "agent" in params.suites:
+        results += agent_benchmark.run(agents=params.agents,
+                                       batch_sizes=params.batch_sizes,
+                                       num_iter=params.num_iter,
+                                       obs_dim=params.obs_dim,
+                                       num_action=params.num_action)
+    if "network" in params.suites:
+        results += network_benchmark.run(networks_to_run=params.networks or list(network_benchmark.NETWORKS),
+                                         batch_sizes=params.batch_sizes,
+                                         num_iter=params.num_iter,
+                                         obs_dim=params.obs_dim,
+                                         num_action=params.num_action)
+
+    for record in results:
+        if record["status"] == "ok":
+            print("[{suite}] {name:<45s} {throughput:>14.1f} {unit}".format(**record), file=sys.stderr)
+        else:
+            print("[{suite}] {name:<45s} {error}".format(**record), file=sys.stderr)
+
+    output = json.dumps({"meta": _meta(params), "results": results}, indent=2)
+    if params.output is None:
+        print(output)
+    else:
+        with open(params.output, "w") as f:
+            f.write(output)
+    return results
+
+
+if __name__ == '__main__':
+    main()
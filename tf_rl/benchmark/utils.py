@@ -0,0 +1,40 @@
+import time
+import traceback
+import numpy as np
+
+
+def measure(fn, num_iter, num_warmup=1, num_repeat=3):
+    """
+    measure the execution time of `fn`
+
+    :param fn: function to be measured, it is called `num_iter` times in a repeat
+    :param num_warmup: the number of calls before the measurement, e.g., to trace the tf.functions
+    :param num_repeat: we take the median of the repeats to be robust to the noise
+    :return: median of the time for a call in seconds
+    """
+    for _ in range(num_warmup):
+        fn()
+
+    elapsed = list()
+    for _ in range(num_repeat):
+        begin = time.perf_counter()
+        for _ in range(num_iter):
+            fn()
+        elapsed.append((time.perf_counter() - begin) / num_iter)
+    return float(np.median(elapsed))
+
+
+def result(suite, name, unit, sec_per_call, items_per_call=1, **kwargs):
+    """ a record of the result, `throughput` is the number of `unit` per second """
+    record = {"suite": suite, "name": name, "status": "ok", "unit": unit,
+              "throughput": items_per_call / sec_per_call, "ms_per_call": sec_per_call * 1e3}
+    record.update(kwargs)
+    return record
+
+
+def error(suite, name, e, **kwargs):
+    """ a record of the failed case, we keep going with the other cases """
+    record = {"suite": suite, "name": name, "status": "error",
+              "error": "{}: {}".format(type(e).__name__, e), "traceback": traceback.format_exc()}
+    record.update(kwargs)
+    return record
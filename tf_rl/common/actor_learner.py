@@ -0,0 +1,280 @@
+"""
+Actor-Learner architecture on a single host
+
+The training loops in `tf_rl/common/train.py` step the env and update the agent alternately on one thread.
+Here the experience collection is decoupled from the learning.
+
+- Actors: processes which run the policy on their own env and stream the transitions to the learner
+- Learner: the main process which owns the agent and the replay buffer, it consumes the transitions
+           and periodically broadcasts the weights of the model to the actors
+
+The transitions travel through a bounded multiprocessing.Queue in chunks, so that the actors wait for the learner
+if it falls behind. The weights are broadcast via shared memory, hence a broadcast costs a copy of the weights
+regardless of the number of the actors.
+
+Staleness of the weights used by the actors is controlled by
+- broadcast_interval: the number of the updates between the broadcasts of the learner
+- sync_interval: the number of the env-steps between the checks of the new weights by an actor
+- max_staleness: the chunks collected by the weights older than this number of broadcasts are dropped
+
+Since the actors only need a model and a policy, the learner only needs the update of the agent taking a batch of
+(states, actions, rewards, next_states, dones). The DQN example wires it, see `train_actors` in
+`tf_rl/examples/DQN/utils/train.py` and `tf_rl/examples/DQN/config/actor_learner.gin`.
+
+Usage(DQN):
+    def actor_fn():
+        # called in each actor, so that TF is initialised there
+        model = Model(num_action)
+        model(np.zeros((1,) + obs_shape, dtype=np.float32))  # build the model before the weights are set
+        return model, EpsilonGreedyPolicy_actor(model=model, num_action=num_action, obs_prc_fn=obs_prc_fn,
+                                                eps_start=1.0, eps_end=0.02, decay_steps=decay_steps // num_actors)
+
+    actor_learner = ActorLearner(env_fn=lambda: gym.make("CartPole-v0"),
+                                 actor_fn=actor_fn,
+                                 weights=agent.main_model.get_weights(),
+                                 num_actors=num_actors)
+    train_actor_learner(actor_learner,
+                        replay_buffer,
+                        update_fn=agent.update,
+                        get_weights=agent.main_model.get_weights,
+                        num_frames=100000,
+                        batch_size=32)
+"""
+
+import ctypes
+import queue
+import itertools
+import numpy as np
+import multiprocessing
+from tf_rl.common.utils import num_crossed
+from tf_rl.common.vec_env import CloudpickleWrapper
+
+
+class SharedWeights(object):
+    """
+    Weights of a model in shared memory with a version number
+
+    :param weights: list of np.ndarray, e.g., `model.get_weights()`, to allocate the memory
+    :param ctx: multiprocessing context
+    """
+
+    def __init__(self, weights, ctx):
+        self._shapes = [np.shape(w) for w in weights]
+        self._sizes = [int(np.prod(shape)) for shape in self._shapes]
+        self._buf = ctx.RawArray(ctypes.c_float, sum(self._sizes))
+        self._version = ctx.RawValue(ctypes.c_long, 0)
+        self._lock = ctx.Lock()
+        self.write(weights)
+
+    @property
+    def version(self):
+        return self._version.value
+
+    def write(self, weights):
+        flat = np.frombuffer(self._buf, dtype=np.float32)
+        with self._lock:
+            flat[...] = np.concatenate([np.ravel(w) for w in weights])
+            self._version.value += 1
+
+    def read(self):
+        """ Returns: version and the copies of the weights """
+        flat = np.frombuffer(self._buf, dtype=np.float32)
+        with self._lock:
+            version, flat = self._version.value, flat.copy()
+        weights = np.split(flat, np.cumsum(self._sizes)[:-1])
+        return version, [w.reshape(shape) for w, shape in zip(weights, self._shapes)]
+
+
+def _actor_worker(index, env_fn_wrapper, actor_fn_wrapper, shared_weights, transition_queue, stop_event,
+                  chunk_size, sync_interval, seed):
+    """ main loop of an actor, it collects the transitions until the learner sets the stop event """
+    # the learner doesn't consume the last chunks, so that the process should not wait for them to be flushed
+    transition_queue.cancel_join_thread()
+    env = env_fn_wrapper.x()
+    if seed is not None:
+        env.seed(seed + index)
+    model, select_action = actor_fn_wrapper.x()
+    state = env.reset()
+    # build the model before setting the weights
+    select_action(state)
+
+    version, transitions, episode_rewards, total_reward = 0, list(), list(), 0
+    try:
+        for t in itertools.count():
+            if t % sync_interval == 0 and shared_weights.version != version:
+                version, weights = shared_weights.read()
+                model.set_weights(weights)
+
+            action = select_action(state)
+            next_state, reward, done, _ = env.step(action)
+            transitions.append((state, action, reward, next_state, done))
+            total_reward += reward
+            state = next_state
+            if done:
+                episode_rewards.append(total_reward)
+                total_reward = 0
+                state = env.reset()
+
+            if len(transitions) == chunk_size:
+                # we check the stop event periodically while the queue is full
+                while not stop_event.is_set():
+                    try:
+                        transition_queue.put((version, transitions, episode_rewards), timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop_event.is_set():
+                    break
+                transitions, episode_rewards = list(), list()
+    except KeyboardInterrupt:
+        print("Actor {}: got KeyboardInterrupt".format(index))
+    finally:
+        env.close()
+
+
+class ActorLearner(object):
+    """
+    Actor processes and the channels between them and the learner
+
+    :param env_fn: function creating an env
+    :param actor_fn: function returning (model, select_action), where `model.set_weights` takes the broadcast weights
+                     and `select_action` maps a state to the action to store in the replay buffer.
+                     It is called in the actor processes, so that TF is initialised there.
+    :param weights: initial weights of the model, e.g., `agent.main_model.get_weights()`
+    :param num_actors: the number of the actor processes
+    :param chunk_size: the number of the transitions sent to the learner at once
+    :param queue_size: the number of the chunks in the queue, the actors wait for the learner when it's full
+    :param sync_interval: the number of the env-steps between the checks of the new weights by an actor
+    :param max_staleness: if given, the chunks collected by the weights older than this number of broadcasts
+                          are dropped
+    :param seed: each env is seeded by seed + its index
+    :param context: start method of multiprocessing, "spawn" by default since TF doesn't survive fork
+    """
+
+    def __init__(self,
+                 env_fn,
+                 actor_fn,
+                 weights,
+                 num_actors=4,
+                 chunk_size=32,
+                 queue_size=64,
+                 sync_interval=100,
+                 max_staleness=None,
+                 seed=None,
+                 context="spawn"):
+        self.num_actors = num_actors
+        self._max_staleness = max_staleness
+        self._ctx = multiprocessing.get_context(context)
+        self.shared_weights = SharedWeights(weights, self._ctx)
+        self._queue = self._ctx.Queue(maxsize=queue_size)
+        self._stop_event = self._ctx.Event()
+        self.processes = [self._ctx.Process(target=_actor_worker,
+                                            args=(index, CloudpickleWrapper(env_fn), CloudpickleWrapper(actor_fn),
+                                                  self.shared_weights, self._queue, self._stop_event, chunk_size,
+                                                  sync_interval, seed))
+                          for index in range(num_actors)]
+        self.num_dropped = 0
+        self.staleness = 0
+        self.closed = False
+        self._flg_started = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def start(self):
+        if self._flg_started:
+            return
+        for process in self.processes:
+            # if the main process crashes, we should not cause things to hang
+            process.daemon = True
+            process.start()
+        self._flg_started = True
+
+    def broadcast(self, weights):
+        """ publish the new weights, the actors pick them up at the next check """
+        self.shared_weights.write(weights)
+
+    def drain(self, replay_buffer, block=True, reward_buffer=None):
+        """
+        Add the transitions sent from the actors to the replay buffer
+
+        :param block: if True, it waits for at least one chunk
+        :param reward_buffer: if given, the rewards of the finished episodes are appended
+        :return: the number of the transitions added
+        """
+        num_added = 0
+        while True:
+            try:
+                version, transitions, episode_rewards = self._queue.get(block=block and num_added == 0, timeout=1.0)
+            except queue.Empty:
+                if block and num_added == 0:
+                    if not any(process.is_alive() for process in self.processes):
+                        raise RuntimeError("All the actors have exited")
+                    continue
+                return num_added
+
+            self.staleness = self.shared_weights.version - version
+            if reward_buffer is not None:
+                reward_buffer.extend(episode_rewards)
+            if self._max_staleness is not None and self.staleness > self._max_staleness:
+                self.num_dropped += len(transitions)
+                continue
+            for transition in transitions:
+                replay_buffer.add(*transition)
+            num_added += len(transitions)
+
+    def close(self):
+        if self.closed:
+            return
+        self._stop_event.set()
+        if self._flg_started:
+            for process in self.processes:
+                process.join()
+        self.closed = True
+
+
+def train_actor_learner(actor_learner,
+                        replay_buffer,
+                        update_fn,
+                        get_weights,
+                        num_frames,
+                        batch_size,
+                        learning_start=1000,
+                        train_freq=1,
+                        broadcast_interval=100,
+                        reward_buffer=None):
+    """
+    Learner loop, it updates the agent `1 / train_freq` times per transition collected by the actors
+
+    :param actor_learner: ActorLearner
+    :param replay_buffer: replay buffer owned by the learner
+    :param update_fn: function taking a batch, e.g., `agent.update` or `functools.partial(agent.update_fused, tau=tau)`
+    :param get_weights: function returning the weights to broadcast, e.g., `agent.main_model.get_weights`
+    :param num_frames: the number of the transitions to collect
+    :param batch_size: batch size of the update
+    :param learning_start: the number of the transitions collected before the first update
+    :param train_freq: the number of the transitions per update
+    :param broadcast_interval: the number of the updates between the broadcasts of the weights
+    :param reward_buffer: if given, the rewards of the finished episodes are appended
+    :return: the number of the updates
+    """
+    actor_learner.start()
+    num_updates, frames = 0, 0
+    try:
+        while frames < num_frames:
+            prev_frames = frames
+            frames += actor_learner.drain(replay_buffer, block=True, reward_buffer=reward_buffer)
+            if frames <= learning_start:
+                continue
+
+            for _ in range(num_crossed(max(prev_frames, learning_start), frames, train_freq)):
+                update_fn(*replay_buffer.sample(batch_size))
+                num_updates += 1
+                if num_updates % broadcast_interval == 0:
+                    actor_learner.broadcast(get_weights())
+    finally:
+        actor_learner.close()
+    return num_updates
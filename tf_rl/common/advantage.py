@@ -0,0 +1,117 @@
+"""
+Generalized Advantage Estimation and discounted returns on padded batches of rollouts
+
+The on-policy agents used to discount each path separately in Python, e.g., `scipy.signal.lfilter` in TRPO and
+the per-step loop of `generate_advantage` in NerveNet.
+Here the rollouts are laid out as [num_envs, T] arrays and the advantages and the returns are computed together
+by one reverse scan over the time axis, which is vectorised over the envs.
+
+- compute_gae: NumPy backend
+- compute_gae_tf: tf.function backend, so that it can be a part of the compiled update
+- pad_paths / unpad: conversion between the list of the paths of variable length and the padded arrays
+
+An episode ends at the step where `done` is 1, and neither the advantages nor the returns are bootstrapped across it.
+So a row can contain multiple episodes and the padded steps after the last episode don't leak into it.
+
+Usage:
+    rewards, mask = pad_paths([path["rewards"] for path in paths])
+    values, _ = pad_paths([path["baseline"] for path in paths])
+    advantages, returns = compute_gae(rewards, values, dones=last_step_dones(mask), gamma=0.99, lam=0.95)
+    advantages = unpad(advantages, mask)  # same order as np.concatenate of the paths
+"""
+
+import numpy as np
+import tensorflow as tf
+
+
+def compute_gae(rewards, values, dones, last_values=None, gamma=0.99, lam=0.95):
+    """
+    GAE(gamma, lambda) and the discounted returns in one reverse scan
+
+        delta_t = r_t + gamma * V_{t+1} * (1 - d_t) - V_t
+        A_t = delta_t + gamma * lambda * (1 - d_t) * A_{t+1}
+        R_t = r_t + gamma * (1 - d_t) * R_{t+1}
+
+    :param rewards: [num_envs, T]
+    :param values: [num_envs, T], the values of the states
+    :param dones: [num_envs, T], 1 at the last step of an episode
+    :param last_values: [num_envs], the values of the states after the last step to bootstrap from,
+                        None means that the rollouts end with the terminal states
+    :return: advantages and returns in [num_envs, T], the lambda-returns are `advantages + values`
+    """
+    rewards = np.asarray(rewards, dtype=np.float32)
+    values = np.asarray(values, dtype=np.float32)
+    not_dones = 1. - np.asarray(dones, dtype=np.float32)
+    if last_values is None:
+        last_values = np.zeros(rewards.shape[0], dtype=np.float32)
+    next_values = np.concatenate([values[:, 1:], np.reshape(last_values, (-1, 1))], axis=1)
+    deltas = rewards + gamma * next_values * not_dones - values
+
+    advantages = np.zeros_like(rewards)
+    returns = np.zeros_like(rewards)
+    advantage, reward_sum = np.zeros(rewards.shape[0], dtype=np.float32), np.asarray(last_values, dtype=np.float32)
+    for t in reversed(range(rewards.shape[1])):
+        advantage = deltas[:, t] + gamma * lam * not_dones[:, t] * advantage
+        reward_sum = rewards[:, t] + gamma * not_dones[:, t] * reward_sum
+        advantages[:, t] = advantage
+        returns[:, t] = reward_sum
+    return advantages, returns
+
+
+@tf.function
+def compute_gae_tf(rewards, values, dones, last_values, gamma=0.99, lam=0.95):
+    """
+    tf.function version of `compute_gae`, the reverse scan runs in the graph by tf.scan
+
+    :param rewards: [num_envs, T]
+    :param values: [num_envs, T]
+    :param dones: [num_envs, T]
+    :param last_values: [num_envs], zeros if the rollouts end with the terminal states
+    :return: advantages and returns in [num_envs, T]
+    """
+    rewards = tf.cast(rewards, tf.float32)
+    values = tf.cast(values, tf.float32)
+    not_dones = 1. - tf.cast(dones, tf.float32)
+    last_values = tf.cast(last_values, tf.float32)
+    next_values = tf.concat([values[:, 1:], tf.expand_dims(last_values, axis=1)], axis=1)
+    deltas = rewards + gamma * next_values * not_dones - values
+
+    def _step(carry, inputs):
+        advantage, reward_sum = carry
+        delta, reward, not_done = inputs
+        return delta + gamma * lam * not_done * advantage, reward + gamma * not_done * reward_sum
+
+    # scan over the time axis, so that the envs are processed at once
+    advantages, returns = tf.scan(_step,
+                                  (tf.transpose(deltas), tf.transpose(rewards), tf.transpose(not_dones)),
+                                  initializer=(tf.zeros_like(last_values), last_values),
+                                  reverse=True)
+    return tf.transpose(advantages), tf.transpose(returns)
+
+
+def pad_paths(paths, length=None):
+    """
+    Stack the paths of variable length into [num_paths, length] with zeros
+
+    :param paths: list of the arrays whose first dim is the time axis, e.g., the rewards of the episodes
+    :param length: length after the padding, the longest path by default
+    :return: padded array in the dtype of the paths and the boolean mask of the valid steps
+    """
+    lengths = np.array([len(path) for path in paths])
+    length = np.max(lengths) if length is None else length
+    mask = np.arange(length)[None, :] < lengths[:, None]
+    padded = np.zeros(mask.shape + np.shape(paths[0])[1:], dtype=np.result_type(*paths))
+    padded[mask] = np.concatenate(paths)
+    return padded, mask
+
+
+def last_step_dones(mask):
+    """ dones of the padded paths each of which ends with the terminal state, it's 1 at the last valid step """
+    dones = np.zeros(mask.shape, dtype=np.float32)
+    dones[np.arange(mask.shape[0]), mask.sum(axis=1) - 1] = 1.
+    return dones
+
+
+def unpad(padded, mask):
+    """ Returns: the valid steps in the same order as `np.concatenate(paths)` """
+    return np.asarray(padded)[mask]
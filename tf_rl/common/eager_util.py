@@ -1,5 +1,9 @@
+import gin
 import tensorflow as tf
 
+# opt-in execution mode set by `set_execution_mode`, it is read when the agents and the networks are built
+_EXECUTION_MODE = {"xla": False, "mixed_precision": False}
+
 
 def eager_setup():
     """
@@ -20,4 +24,71 @@ def eager_setup():
     # === For TF 2.0 ===
     config = tf.compat.v1.ConfigProto()
     config.gpu_options.allow_growth = True
-    tf.compat.v1.InteractiveSession(config=config)
\ No newline at end of file
+    tf.compat.v1.InteractiveSession(config=config)
+
+
+@gin.configurable
+def set_execution_mode(xla=False, mixed_precision=False):
+    """
+    Opt-in execution mode of the agents and the networks, e.g., in a gin file
+
+        set_execution_mode.xla = True
+        set_execution_mode.mixed_precision = True
+
+    - xla: the update steps of the agents are compiled by XLA, it fuses the small ops of the MLPs into a few kernels
+    - mixed_precision: the conv trunks compute in bfloat16 while the variables, the heads and the losses stay
+                       in float32. bfloat16 has the same exponent range as float32, so that the loss doesn't need
+                       the dynamic scaling of float16 to keep the gradients from underflowing.
+
+    Call it before building the agent since the mode is read at the construction.
+    """
+    _EXECUTION_MODE["xla"] = xla
+    _EXECUTION_MODE["mixed_precision"] = mixed_precision
+
+
+def xla_enabled():
+    return _EXECUTION_MODE["xla"]
+
+
+def conv_dtype():
+    """ dtype policy of the conv layers, None keeps the default of float32 """
+    if not _EXECUTION_MODE["mixed_precision"]:
+        return None
+    mixed_precision = tf.keras.mixed_precision
+    # the policy left the experimental namespace in TF 2.4
+    policy = getattr(mixed_precision, "Policy", None) or mixed_precision.experimental.Policy
+    return policy("mixed_bfloat16")
+
+
+def compiled_function(fn, input_signature=None, jit_compile=False):
+    """ tf.function optionally compiled by XLA, `jit_compile` was called `experimental_compile` before TF 2.5 """
+    if not jit_compile:
+        return tf.function(fn, input_signature=input_signature)
+    try:
+        return tf.function(fn, input_signature=input_signature, jit_compile=True)
+    except TypeError:
+        return tf.function(fn, input_signature=input_signature, experimental_compile=True)
+
+
+def traced_function(fn, input_signature, trace_counter, name=None, jit_compile=False):
+    """
+    wraps `fn` by tf.function with `input_signature` and counts the number of the traces in `trace_counter`
+
+    Since the python code in tf.function runs only while it is traced, the counter is incremented only when
+    the function is (re)traced. So, by watching the counter, we can notice the unexpected retracing
+    caused by the change of the shape or the dtype of the inputs.
+
+    :param fn: python function to compile
+    :param input_signature: list of tf.TensorSpec, None lets tf.function trace for every new shape/dtype
+    :param trace_counter: dict(e.g., collections.Counter) shared by the functions of an agent
+    :param name: key in trace_counter, the name of fn is used by default
+    :param jit_compile: compile fn by XLA, see `set_execution_mode`
+    """
+    name = fn.__name__ if name is None else name
+    trace_counter[name] = 0
+
+    def _fn(*args):
+        trace_counter[name] += 1
+        return fn(*args)
+
+    return compiled_function(_fn, input_signature=input_signature, jit_compile=jit_compile)
@@ -0,0 +1,92 @@
+"""
+Batched evaluation of an agent on the vectorised envs
+
+eval_Agent runs `n_trial` episodes one after another and calls the policy once per env-step of a single env.
+`run_episodes` runs them concurrently on the envs of a VectorEnv and selects the actions of all the envs
+by one forward pass, so that 100 evaluation episodes on 10 envs cost about 10 sequential episodes.
+
+eval_Agent_vec and final_eval are the evaluation steps shared by the training loops of the examples.
+Only the final evaluation runs on the VectorEnv, the periodic evaluations during training still call
+the serial eval_Agent of the example on a single env.
+
+Usage:
+    env = make_vec_env(lambda: gym.make("CartPole-v0"), num_envs=10)
+    all_rewards = run_episodes(env, lambda states: agent.select_actions_eval(states, epsilon=0.05), n_trial=100)
+    eval_summary(all_rewards)
+"""
+
+import datetime
+import numpy as np
+from tf_rl.common.colab_utils import transfer_log_dirs
+
+
+def run_episodes(env, select_actions, n_trial):
+    """
+    Run `n_trial` episodes on the envs of a VectorEnv and returns their rewards
+
+    Since the short episodes finish first, taking the first `n_trial` episodes would bias the score.
+    So each env is assigned a fixed number of episodes in advance and the rest of its episodes is ignored.
+
+    :param env: VectorEnv, e.g., tf_rl.common.vec_env.SubprocVectorEnv
+    :param select_actions: function mapping a batch of states to a batch of actions
+    :param n_trial: the number of episodes
+    :return: rewards of the episodes in the shape of (n_trial,)
+    """
+    # the number of the episodes of each env
+    quotas = np.full(env.num_envs, n_trial // env.num_envs)
+    quotas[:n_trial % env.num_envs] += 1
+
+    all_rewards = [list() for _ in range(env.num_envs)]
+    total_rewards = np.zeros(env.num_envs)
+    states = env.reset()
+    while any(len(rewards) < quota for rewards, quota in zip(all_rewards, quotas)):
+        states, rewards, dones, _ = env.step(select_actions(states))
+        total_rewards += rewards
+        for i in np.where(dones)[0]:
+            if len(all_rewards[i]) < quotas[i]:
+                all_rewards[i].append(total_rewards[i])
+            total_rewards[i] = 0
+    return np.concatenate([np.array(rewards, dtype=np.float64) for rewards in all_rewards])
+
+
+def eval_summary(all_rewards):
+    """ prints and returns the statistics of the rewards of the evaluation episodes """
+    summary = {"max": np.max(all_rewards),
+               "min": np.min(all_rewards),
+               "std": np.std(all_rewards),
+               "mean": np.mean(all_rewards)}
+    print("=== Evaluation Result ===")
+    print("| Max: {max} | Min: {min} | STD: {std} | MEAN: {mean} |".format(**summary))
+    return summary
+
+
+def eval_Agent_vec(select_actions, env, n_trial=1, log_dir=None, google_colab=False):
+    """
+    Evaluate the trained agent on VectorEnv, the episodes run concurrently on its envs
+
+    :param select_actions: function mapping a batch of states to a batch of actions, see `run_episodes`
+    :return: the mean of the rewards of the episodes
+    """
+    all_rewards = run_episodes(env, select_actions, n_trial=n_trial)
+
+    _time = datetime.datetime.now()
+    for ep, episode_reward in enumerate(all_rewards):
+        print("[{}] | Evaluation | Ep: {}/{} | Score: {} |".format(_time, ep + 1, n_trial, episode_reward))
+    if n_trial > 2: eval_summary(all_rewards)
+
+    if google_colab: transfer_log_dirs(log_dir)
+    return np.mean(all_rewards)
+
+
+def final_eval(eval_Agent, agent, select_actions, eval_env, eval_vec_env, n_trial, log_dir=None, google_colab=False):
+    """
+    The final evaluation of a training loop, the episodes run concurrently on eval_vec_env if it is given
+
+    :param eval_Agent: serial evaluator of the example, it runs the episodes on eval_env if eval_vec_env is None
+    :param select_actions: see `eval_Agent_vec`, it is used only on eval_vec_env
+    """
+    if eval_vec_env is None:
+        return eval_Agent(agent, eval_env, n_trial=n_trial, log_dir=log_dir, google_colab=google_colab)
+    score = eval_Agent_vec(select_actions, eval_vec_env, n_trial=n_trial, log_dir=log_dir, google_colab=google_colab)
+    eval_vec_env.close()
+    return score
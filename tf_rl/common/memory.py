@@ -202,6 +202,14 @@ class ReplayBuffer(object):
             else:
                 return self._encode_sample_n_step(idxes)
 
+    def sample_many(self, k, batch_size):
+        """
+        Sample k batches stacked in the shape of (k, batch_size, ...) for `agent.update_many`
+        Since the transitions are drawn independently, this is a single `sample` of k * batch_size transitions.
+        """
+        batch = self.sample(k * batch_size)
+        return tuple(np.reshape(data, (k, batch_size) + np.shape(data)[1:]) for data in batch)
+
     def save(self):
         """ save method """
         o_t, a, r, o_tp1, d = self._get_all_data()
@@ -279,6 +287,296 @@ class ReplayBuffer(object):
         self._next_idx = 0
 
 
+class ColumnarReplayBuffer(ReplayBuffer):
+    """
+    Experience Replay Memory Buffer which stores each component(o, a, r, no, d) in its own bucket
+
+    Instead of keeping a list of tuples, we preallocate one typed numpy ring array per component
+    at the first call of `add`, so that the shape/dtype of each component is given by the first transition.
+    Then sampling becomes a single fancy-index gather per component instead of a python loop over the indices.
+
+    n-step sampling(n_step > 0) is also done with array ops on the buckets, see `_n_step_window`.
+
+    Note:
+        rewards and dones are stored as float32 regardless of their dtype at the first step
+        because the first reward in an episode is often a python int(0) which would truncate the later ones.
+    """
+
+    def __init__(self, size,
+                 n_step=0,
+                 gamma=0.99,
+                 flg_seq=True,
+                 traj_dir="./tmp",
+                 recover_data=False):
+        # buckets are allocated lazily at the first `add`
+        self._buffers = None
+        self._size = 0
+        super(ColumnarReplayBuffer, self).__init__(size=size,
+                                                   n_step=n_step,
+                                                   gamma=gamma,
+                                                   flg_seq=flg_seq,
+                                                   traj_dir=traj_dir,
+                                                   recover_data=recover_data)
+
+    def __len__(self):
+        return self._size
+
+    def _allocate(self, obs_t, action):
+        """ Preallocate the buckets using the first transition """
+        obs_t, action = np.asarray(obs_t), np.asarray(action)
+        self._buffers = {
+            "obs": np.zeros((self._maxsize,) + obs_t.shape, dtype=obs_t.dtype),
+            "action": np.zeros((self._maxsize,) + action.shape, dtype=action.dtype),
+            "reward": np.zeros((self._maxsize,), dtype=np.float32),
+            "next_obs": np.zeros((self._maxsize,) + obs_t.shape, dtype=obs_t.dtype),
+            "done": np.zeros((self._maxsize,), dtype=np.float32),
+        }
+
+    def add(self, obs_t, action, reward, obs_tp1, done):
+        if self._buffers is None:
+            self._allocate(obs_t, action)
+
+        # LazyFrames are converted into an array through `__array__` in the assignment
+        self._buffers["obs"][self._next_idx] = obs_t
+        self._buffers["action"][self._next_idx] = action
+        self._buffers["reward"][self._next_idx] = reward
+        self._buffers["next_obs"][self._next_idx] = obs_tp1
+        self._buffers["done"][self._next_idx] = done
+
+        self._next_idx = (self._next_idx + 1) % self._maxsize
+        self._size = min(self._size + 1, self._maxsize)
+
+    def _encode_sample(self, idxes):
+        """ One step sampling method """
+        idxes = np.asarray(idxes)
+        return self._buffers["obs"][idxes], self._buffers["action"][idxes], self._buffers["reward"][idxes], \
+               self._buffers["next_obs"][idxes], self._buffers["done"][idxes]
+
+    def _n_step_window(self, idxes):
+        """
+        Compute the n-step window starting at each index for the whole batch at once
+
+        Return:
+            slots: (batch, n) indices of the transitions from t to t+n-1 in the ring
+            mask: (batch, n) 1 if the transition belongs to the same episode as the one at t, 0 otherwise
+        """
+        idxes = np.asarray(idxes)
+        offsets = np.arange(self._n_step)
+        slots = (idxes[:, None] + offsets[None, :]) % self._maxsize
+
+        # the window can't go beyond the newest transition in the ring
+        num_ahead = (self._next_idx - 1 - idxes) % self._maxsize
+        mask = (offsets[None, :] <= num_ahead[:, None]).astype(np.float32)
+
+        # the transitions after the end of an episode are masked out but the terminal one itself is kept
+        not_done = 1. - self._buffers["done"][slots]
+        mask[:, 1:] *= np.cumprod(not_done[:, :-1], axis=1)
+        return slots, mask
+
+    def _encode_sample_n_step_sequence(self, idxes):
+        """
+        n-consecutive time-step sampling method
+        Return:
+            obs, act, rew, next_obs, done FROM t to t+n, which are padded by 0s after termination
+        """
+        slots, mask = self._n_step_window(idxes)
+        result = list()
+        for key in ["obs", "action", "reward", "next_obs", "done"]:
+            data = self._buffers[key][slots]
+            result.append(data * mask.reshape(mask.shape + (1,) * (data.ndim - 2)).astype(data.dtype))
+        return tuple(result)
+
+    def _encode_sample_n_step(self, idxes):
+        """
+        n-step ahead sampling method
+        Return:
+            obs, act, rew, next_obs, done at t as well as t+n
+
+            the reward at t+n is the discounted n-step return: sum_{k=0}^{n-1} gamma^k * r_{t+k}
+            and the obs/next_obs/done at t+n are the ones of the last transition of the episode within the window
+            so that the obs at t+n is the state to bootstrap from and the done at t+n masks the bootstrapping.
+            Since the agents discount the bootstrap by gamma^n, the done at t+n is also set to 1
+            when the window is cut by the newest transition in the ring(e.g., prioritized sampling)
+            so that the truncated window doesn't bootstrap with the wrong discount.
+        """
+        idxes = np.asarray(idxes)
+        slots, mask = self._n_step_window(idxes)
+
+        # discounted n-step return
+        discount = self._gamma ** np.arange(self._n_step, dtype=np.float32)
+        reward_n = np.sum(self._buffers["reward"][slots] * mask * discount[None, :], axis=-1)
+
+        # index of the last valid transition in the window to bootstrap from
+        window_len = np.sum(mask, axis=-1).astype(np.int64)
+        bootstrap_idxes = slots[np.arange(len(idxes)), window_len - 1]
+
+        obs_t, action, reward, obs_tp1, done = self._encode_sample(idxes)
+        _, action_n, _, obs_tp1_n, done_n = self._encode_sample(bootstrap_idxes)
+
+        # mask the bootstrapping of the windows shorter than n_step
+        done_n = np.where(window_len < self._n_step, np.ones_like(done_n), done_n)
+        return np.concatenate([obs_t, obs_tp1_n], axis=-1), np.stack([action, action_n], axis=1), \
+               np.stack([reward, reward_n], axis=1), np.concatenate([obs_tp1, obs_tp1_n], axis=-1), \
+               np.stack([done, done_n], axis=1)
+
+    def _get_all_data(self):
+        """ Extract all data in the storage to save it """
+        return self._encode_sample(np.arange(self._size))
+
+    def sample(self, batch_size):
+        """ See ReplayBuffer.sample """
+        if self._n_step == 0:
+            idxes = np.random.randint(low=0, high=self._size, size=batch_size)
+            return self._encode_sample(idxes)
+        else:
+            # we don't sample the newest n-1 transitions whose window is not complete yet
+            oldest = self._next_idx if self._size == self._maxsize else 0
+            high = max(self._size - self._n_step + 1, 1)
+            idxes = (oldest + np.random.randint(low=0, high=high, size=batch_size)) % self._maxsize
+            if self._flg_seq:
+                return self._encode_sample_n_step_sequence(idxes)
+            else:
+                return self._encode_sample_n_step(idxes)
+
+    def refresh(self):
+        # we keep the allocated buckets and just move the cursor back
+        self._next_idx = 0
+        self._size = 0
+
+
+class FrameReplayBuffer(ReplayBuffer):
+    """
+    Frame-indexed Experience Replay Memory Buffer for `wrap_deepmind(..., frame_stack=True)` envs
+
+    ReplayBuffer stores both obs and next_obs as (84, 84, k) arrays so that every single frame is stored
+    about 2k times once LazyFrames are forced. Instead, we keep one ring of single frames in which
+    the consecutive frames of an episode are laid out next to each other, and rebuild the k-frame stacks
+    of obs and next_obs at sample time.
+
+    Layout of the ring at the beginning of an episode(k=4):
+        | f0 | f1 | f2 | f3(t=0) | f4(t=1) | ... | fT(terminal) |
+        - the first k-1 slots hold the older frames of the first obs and they are not sampled
+        - slot i holds the newest frame of obs_t and slot i+1 holds the one of obs_tp1
+        - the terminal frame is kept in its own slot which is never sampled
+    so that obs_t = ring[i-k+1: i+1], obs_tp1 = ring[i-k+2: i+2] and these never cross the episode boundary.
+
+    Note:
+        `size` is the number of frames in the ring, so it holds slightly less transitions than `size`
+        because each episode consumes k extra slots.
+        The frames are stored in the dtype of the first obs, i.e., uint8 for wrap_deepmind.
+    """
+
+    def __init__(self, size,
+                 frame_stack=4,
+                 traj_dir="./tmp",
+                 recover_data=False):
+        self._k = frame_stack
+        self._buffers = None
+        self._valid = np.zeros(size, dtype=np.bool_)
+        self._num_valid = 0  # number of transitions in the ring
+        self._num_written = 0  # number of slots written so far, capped at size
+        self._head = -1  # the most recently written slot
+        self._flg_new_episode = True
+        super(FrameReplayBuffer, self).__init__(size=size,
+                                                traj_dir=traj_dir,
+                                                recover_data=recover_data)
+
+    def __len__(self):
+        return self._num_valid
+
+    def _split_frames(self, obs):
+        """ Split the stacked obs: (h, w, k*c) -> (k, h, w, c) """
+        obs = np.asarray(obs)
+        frames = obs.reshape(obs.shape[:-1] + (self._k, obs.shape[-1] // self._k))
+        return np.moveaxis(frames, -2, 0)
+
+    def _allocate(self, obs_t, action):
+        """ Preallocate the buckets using the first transition """
+        frame, action = self._split_frames(obs_t)[-1], np.asarray(action)
+        self._buffers = {
+            "frame": np.zeros((self._maxsize,) + frame.shape, dtype=frame.dtype),
+            "action": np.zeros((self._maxsize,) + action.shape, dtype=action.dtype),
+            "reward": np.zeros((self._maxsize,), dtype=np.float32),
+            "done": np.zeros((self._maxsize,), dtype=np.float32),
+        }
+
+    def _write_frame(self, frame):
+        """ Write a frame at the next slot which is not sampled until a transition is written on it """
+        self._head = (self._head + 1) % self._maxsize
+        if self._valid[self._head]:
+            self._valid[self._head] = False
+            self._num_valid -= 1
+        self._buffers["frame"][self._head] = frame
+        self._num_written = min(self._num_written + 1, self._maxsize)
+
+    def add(self, obs_t, action, reward, obs_tp1, done):
+        if self._buffers is None:
+            self._allocate(obs_t, action)
+
+        if self._flg_new_episode:
+            # store all k frames of the first obs
+            for frame in self._split_frames(obs_t):
+                self._write_frame(frame)
+            self._flg_new_episode = False
+
+        # the newest frame of obs_t is at the head of the ring
+        self._next_idx = self._head
+        self._buffers["action"][self._next_idx] = action
+        self._buffers["reward"][self._next_idx] = reward
+        self._buffers["done"][self._next_idx] = done
+        self._valid[self._next_idx] = True
+        self._num_valid += 1
+
+        # the newest frame of obs_tp1 becomes the newest frame of obs_t in the next transition
+        self._write_frame(self._split_frames(obs_tp1)[-1])
+        self._flg_new_episode = bool(done)
+
+    def _sampleable(self, idxes):
+        """ a slot is sampleable if it holds a transition whose k-1 older frames are not overwritten """
+        age = (self._head - idxes) % self._maxsize
+        return self._valid[idxes] & (age + self._k - 1 < self._num_written)
+
+    def _stack_frames(self, idxes):
+        """ Rebuild the stacked obs which ends at each index: (batch, h, w, k*c) """
+        # (batch, k) matrix of the slots, ordered from the oldest to the newest frame
+        slots = (idxes[:, None] + np.arange(-self._k + 1, 1)[None, :]) % self._maxsize
+        frames = np.moveaxis(self._buffers["frame"][slots], 1, -2)  # (batch, h, w, k, c)
+        return frames.reshape(frames.shape[:-2] + (-1,))
+
+    def _encode_sample(self, idxes):
+        """ One step sampling method """
+        idxes = np.asarray(idxes)
+        return self._stack_frames(idxes), self._buffers["action"][idxes], self._buffers["reward"][idxes], \
+               self._stack_frames((idxes + 1) % self._maxsize), self._buffers["done"][idxes]
+
+    def _get_all_data(self):
+        """ Extract all data in the storage to save it """
+        # go through the ring from the oldest slot so that the episodes are restored in order
+        idxes = (self._head + 1 + np.arange(self._maxsize)) % self._maxsize
+        return self._encode_sample(idxes[self._sampleable(idxes)])
+
+    def sample(self, batch_size):
+        """ See ReplayBuffer.sample """
+        # otherwise the redraw below never ends
+        assert self._num_valid > 0, "no transition to sample yet"
+        idxes = np.random.randint(low=0, high=self._num_written, size=batch_size)
+        mask = self._sampleable(idxes)
+        # redraw the invalid ones(padding slots) which only account for a few slots per episode
+        while not mask.all():
+            idxes[~mask] = np.random.randint(low=0, high=self._num_written, size=np.sum(~mask))
+            mask = self._sampleable(idxes)
+        return self._encode_sample(idxes)
+
+    def refresh(self):
+        # we keep the allocated buckets and just move the cursor back
+        self._valid[:] = False
+        self._num_valid = 0
+        self._num_written = 0
+        self._head = -1
+        self._next_idx = 0
+        self._flg_new_episode = True
+
+
 class PrioritizedReplayBuffer(ReplayBuffer):
     def __init__(self, size, alpha, n_step=0, gamma=0.99):
         """Create Prioritized Replay buffer.
@@ -314,14 +612,13 @@ class PrioritizedReplayBuffer(ReplayBuffer):
         self._it_min[idx] = self._max_priority ** self._alpha
 
     def _sample_proportional(self, batch_size):
-        res = []
-        p_total = self._it_sum.sum(0, len(self._storage) - 1)
+        """ draw one prefixsum from each of `batch_size` equal ranges and search them at once """
+        if batch_size == 0:
+            return np.zeros(0, dtype=np.int64)
+        p_total = self._it_sum.sum(0, len(self) - 1)
         every_range_len = p_total / batch_size
-        for i in range(batch_size):
-            mass = random.random() * every_range_len + i * every_range_len
-            idx = self._it_sum.find_prefixsum_idx(mass)
-            res.append(idx)
-        return res
+        mass = (np.random.random(size=batch_size) + np.arange(batch_size)) * every_range_len
+        return self._it_sum.find_prefixsum_idx(mass)
 
     def sample(self, batch_size, beta):
         """Sample a batch of experiences.
@@ -359,15 +656,12 @@ class PrioritizedReplayBuffer(ReplayBuffer):
 
         idxes = self._sample_proportional(batch_size)
 
-        weights = []
-        p_min = self._it_min.min() / self._it_sum.sum()
-        max_weight = (p_min * len(self._storage)) ** (-beta)
+        p_total = self._it_sum.sum()
+        p_min = self._it_min.min() / p_total
+        max_weight = (p_min * len(self)) ** (-beta)
 
-        for idx in idxes:
-            p_sample = self._it_sum[idx] / self._it_sum.sum()
-            weight = (p_sample * len(self._storage)) ** (-beta)
-            weights.append(weight / max_weight)
-        weights = np.array(weights)
+        p_sample = self._it_sum[idxes] / p_total
+        weights = (p_sample * len(self)) ** (-beta) / max_weight
         if self._n_step == 0:
             encoded_sample = self._encode_sample(idxes)
         else:
@@ -387,15 +681,25 @@ class PrioritizedReplayBuffer(ReplayBuffer):
             transitions at the sampled idxes denoted by
             variable `idxes`.
         """
+        idxes, priorities = np.asarray(idxes), np.asarray(priorities)
         assert len(idxes) == len(priorities)
-        for idx, priority in zip(idxes, priorities):
-            assert priority > 0
-            assert 0 <= idx < len(self._storage)
-            self._it_sum[idx] = priority ** self._alpha
-            self._it_min[idx] = priority ** self._alpha
+        assert np.all(priorities > 0)
+        assert np.all(0 <= idxes) and np.all(idxes < len(self))
+        self._it_sum[idxes] = priorities ** self._alpha
+        self._it_min[idxes] = priorities ** self._alpha
+
+        self._max_priority = max(self._max_priority, np.max(priorities))
 
-            self._max_priority = max(self._max_priority, priority)
 
+class ColumnarPrioritizedReplayBuffer(PrioritizedReplayBuffer, ColumnarReplayBuffer):
+    """
+    Prioritized Replay buffer on top of the columnar storage
+
+    The sampling and the n-step returns are computed on the buckets of ColumnarReplayBuffer.
+    Note that the window of the newest n-1 transitions is cut at the newest one
+    since PrioritizedReplayBuffer samples any index in the buffer.
+    """
+    pass
 
 
 """
@@ -448,6 +752,11 @@ class HER_replay_buffer:
         transitions = self.sample_func(temp_buffers, batch_size)
         return transitions
 
+    def sample_many(self, k, batch_size):
+        """ k batches of transitions stacked in the shape of (k, batch_size, ...) for `agent.update_many` """
+        transitions = self.sample(k * batch_size)
+        return {key: np.reshape(value, (k, batch_size) + value.shape[1:]) for key, value in transitions.items()}
+
     def _get_storage_idx(self, inc=None):
         inc = inc or 1
         if self.current_size + inc <= self.size:
@@ -7,7 +7,6 @@ from __future__ import division
 from __future__ import print_function
 
 import tensorflow as tf
-import numpy as np
 
 
 class Table:
@@ -32,10 +31,21 @@ class Table:
         return tf.gather(self._storage, tf.range(start=_start, limit=_end))
 
     def refresh(self):
-        self._storage = tf.Variable(tf.zeros(self._shape, dtype=self._dtype), dtype=self._dtype)
+        # assign zeros instead of creating a new variable so that the graphs and the checkpoint keep tracking it
+        self._storage.assign(tf.zeros(self._shape, dtype=self._dtype))
 
 
 class ReplayBuffer:
+    """
+    Replay buffer whose storages are tf.Variable
+
+    All the methods are composed of TF ops, i.e., indices are drawn by `tf.random.uniform`
+    and a batch is collected by one `tf.gather` per table.
+    So that `sample` can be called inside a tf.function(e.g., the update of an agent)
+    and a whole "sample + update" step runs in a single graph without returning to Python.
+    See `tf_rl.agents.core.Agent.update_from_buffer`.
+    """
+
     def __init__(self,
                  capacity,
                  n_step,
@@ -98,6 +108,8 @@ class ReplayBuffer:
         return data
 
     def refresh(self):
+        self._current_idx.assign(0)
+        self._len_idx.assign(0)
         self._action_table.refresh()
         self._obs_table.refresh()
         self._next_obs_table.refresh()
@@ -111,20 +123,19 @@ class ReplayBuffer:
         return self.manager.save()
 
     def add(self, obs_t, action, reward, obs_tp1, done):
-        # 1. validate the position of the cursor
-        self._current_idx.assign((self._current_idx + 1) % self._capacity)
-
-        # 2. insert the data to the position
+        # 1. insert the data to the position of the cursor
         self._write(self._current_idx, obs_t, action, reward, obs_tp1, done)
 
+        # 2. move the cursor to the next position, which is the oldest one once the buffer is full
+        self._current_idx.assign((self._current_idx + 1) % self._capacity)
+
         # 3. maintain the index representing the length of the buffer
-        if self._len_idx < self._capacity:
-            self._len_idx.assign_add(1)
+        self._len_idx.assign(tf.minimum(self._len_idx + 1, self._capacity))
 
     def _validate_dtype(self, value, dtype):
         return tf.cast(value, dtype=dtype)
 
-    def _write(self, row, obs, next_obs, action, reward, done):
+    def _write(self, row, obs, action, reward, next_obs, done):
         obs = self._validate_dtype(value=obs, dtype=self._obs_dtype)
         next_obs = self._validate_dtype(value=next_obs, dtype=self._obs_dtype)
         action = self._validate_dtype(value=action, dtype=self._act_dtype)
@@ -138,6 +149,7 @@ class ReplayBuffer:
         self._done_table.write(row, done)
 
     def _read_row(self, row):
+        """ row can be a tensor of any shape, then the shape of the results is row.shape + shape of a table """
         obs = self._obs_table.read_row(row)
         next_obs = self._next_obs_table.read_row(row)
         action = self._action_table.read_row(row)
@@ -145,13 +157,17 @@ class ReplayBuffer:
         done = self._done_table.read_row(row)
         return obs, action, next_obs, reward, done
 
-    def _read_seq(self, _start, _end):
-        obs_seq = self._obs_table.read_seq(_start, _end)
-        next_obs_seq = self._next_obs_table.read_seq(_start, _end)
-        action_seq = self._action_table.read_seq(_start, _end)
-        reward_seq = self._reward_table.read_seq(_start, _end)
-        done_seq = self._done_table.read_seq(_start, _end)
-        return obs_seq, action_seq, next_obs_seq, reward_seq, done_seq
+    def _sample_idxes(self, batch_size):
+        """ draw the indices of the transitions in the ring buffer uniformly """
+        # in n-step sampling, the newest n-1 transitions can't be the start of the sequence
+        # since the sequence would go beyond the newest transition
+        num_candidates = self._len_idx - max(self._n_step - 1, 0)
+        oldest = (self._current_idx - self._len_idx) % self._capacity
+        # the buffer has to hold at least n_step transitions, otherwise the range below is empty
+        assert_op = tf.debugging.assert_positive(num_candidates, message="not enough transitions to sample")
+        with tf.control_dependencies([assert_op]):
+            offsets = tf.random.uniform(shape=(batch_size,), minval=0, maxval=num_candidates, dtype=tf.int32)
+        return (oldest + offsets) % self._capacity
 
     def sample(self, batch_size):
         """Sample a batch of experiences.
@@ -161,127 +177,57 @@ class ReplayBuffer:
             How many transitions to sample.
         Returns
         -------
-        obs_batch: np.array
+        obs_batch: tf.Tensor
             batch of observations
-        act_batch: np.array
+        act_batch: tf.Tensor
             batch of actions executed given obs_batch
-        rew_batch: np.array
+        rew_batch: tf.Tensor
             rewards received as results of executing act_batch
-        next_obs_batch: np.array
+        next_obs_batch: tf.Tensor
             next set of observations seen after executing act_batch
-        done_mask: np.array
+        done_mask: tf.Tensor
             done_mask[i] = 1 if executing act_batch[i] resulted in
             the end of an episode and 0 otherwise.
         """
-        # generate random numbers to collect samples from the storages
-        idxes = tf.py_function(func=lambda: np.random.randint(low=0, high=self._len_idx-1, size=batch_size),
-                               inp=[],
-                               Tout=tf.int32)
+        idxes = self._sample_idxes(batch_size)
         if self._n_step == 0:
-            return self._encode_sample(idxes, batch_size)
+            return self._encode_sample(idxes)
         else:
-            return self._encode_sample_n_step_sequence(idxes, batch_size)
+            return self._encode_sample_n_step_sequence(idxes)
 
     @tf.function
     def sample_tf(self, batch_size):
-        """Sample a batch of experiences.
-        Parameters
-        ----------
-        batch_size: int
-            How many transitions to sample.
-        Returns
-        -------
-        obs_batch: np.array
-            batch of observations
-        act_batch: np.array
-            batch of actions executed given obs_batch
-        rew_batch: np.array
-            rewards received as results of executing act_batch
-        next_obs_batch: np.array
-            next set of observations seen after executing act_batch
-        done_mask: np.array
-            done_mask[i] = 1 if executing act_batch[i] resulted in
-            the end of an episode and 0 otherwise.
-        """
-        # generate random numbers to collect samples from the storages
-        idxes = tf.py_function(func=lambda: np.random.randint(low=0, high=self._len_idx-1, size=batch_size),
-                               inp=[],
-                               Tout=tf.int32)
-        if self._n_step == 0:
-            return self._encode_sample(idxes, batch_size)
-        else:
-            return self._encode_sample_n_step_sequence(idxes, batch_size)
+        """ `sample` compiled by tf.function, batch_size has to be a python int to avoid the retracing """
+        return self.sample(batch_size)
 
-    def _encode_sample(self, idxes, batch_size):
+    def _encode_sample(self, idxes):
         """ One step sampling method """
-        obses_t = tf.TensorArray(dtype=self._obs_dtype, size=batch_size)
-        actions = tf.TensorArray(dtype=self._act_dtype, size=batch_size)
-        rewards = tf.TensorArray(dtype=self._reward_dtype, size=batch_size)
-        obses_tp1 = tf.TensorArray(dtype=self._obs_dtype, size=batch_size)
-        dones = tf.TensorArray(dtype=self._done_dtype, size=batch_size)
-
-        for id in range(batch_size):
-            obs_t, action, obs_tp1, reward, done = self._read_row(row=tf.gather(idxes, id))
-            obses_t = obses_t.write(id, obs_t)
-            actions = actions.write(id, action)
-            rewards = rewards.write(id, reward)
-            obses_tp1 = obses_tp1.write(id, obs_tp1)
-            dones = dones.write(id, done)
-        return obses_t.stack(), actions.stack(), rewards.stack(), obses_tp1.stack(), dones.stack()
-
-    def _encode_sample_n_step_sequence(self, idxes, batch_size):
+        obs_t, action, obs_tp1, reward, done = self._read_row(row=idxes)
+        return obs_t, action, reward, obs_tp1, done
+
+    def _encode_sample_n_step_sequence(self, idxes):
         """
         n-consecutive time-step sampling method
         Return:
-            obs, act, rew, next_obs, done FROM t to t+n
+            obs, act, rew, next_obs, done FROM t to t+n, each of which is in the shape of (batch, n_step, ...)
+            the transitions after the end of an episode are padded by 0s
         """
-        obses_t = tf.TensorArray(dtype=self._obs_dtype, size=batch_size)
-        actions = tf.TensorArray(dtype=self._act_dtype, size=batch_size)
-        rewards = tf.TensorArray(dtype=self._reward_dtype, size=batch_size)
-        obses_tp1 = tf.TensorArray(dtype=self._obs_dtype, size=batch_size)
-        dones = tf.TensorArray(dtype=self._done_dtype, size=batch_size)
-
-        # === Sampling method ===
-        for id in range(batch_size):
-            index = tf.gather(idxes, id)
-            if index + self._n_step >= self._len_idx:  # avoid the index out of range error!!
-                first_half = self._len_idx - 1 - index
-                second_half = self._n_step - first_half
-                o_seq1, a_seq1, no_seq1, r_seq1, d_seq1 = self._read_seq(_start=index, _end=index+first_half)
-                o_seq2, a_seq2, no_seq2, r_seq2, d_seq2 = self._read_seq(_start=0, _end=second_half)
-                o_seq = tf.concat([o_seq1, o_seq2], axis=0)
-                a_seq = tf.concat([a_seq1, a_seq2], axis=0)
-                no_seq = tf.concat([no_seq1, no_seq2], axis=0)
-                r_seq = tf.concat([r_seq1, r_seq2], axis=0)
-                d_seq = tf.concat([d_seq1, d_seq2], axis=0)
-            else:
-                o_seq, a_seq, no_seq, r_seq, d_seq = self._read_seq(_start=index, _end=index + self._n_step)
-
-            # check if the specified range contains the terminate state
-            o_seq, a_seq, no_seq, r_seq, d_seq = self._check_episode_end(o_seq, a_seq, no_seq, r_seq, d_seq)
-
-            obses_t = obses_t.write(id, o_seq)
-            actions = actions.write(id, a_seq)
-            rewards = rewards.write(id, r_seq)
-            obses_tp1 = obses_tp1.write(id, no_seq)
-            dones = dones.write(id, d_seq)
-        return obses_t.stack(), actions.stack(), rewards.stack(), obses_tp1.stack(), dones.stack()
-
-    def _check_episode_end(self, o_seq, a_seq, no_seq, r_seq, d_seq):
-        """ validate if the extracted part of the memory from _start to _end is semantically correct. """
-        _id = tf.argmax(d_seq)
-        if _id == 0:
-            return o_seq, a_seq, no_seq, r_seq, d_seq
-        else:
-            o_seq = self._zero_padding(_id, o_seq, self._obs_dtype, self._obs_shape)
-            a_seq = self._zero_padding(_id, a_seq, self._act_dtype, self._act_shape)
-            no_seq = self._zero_padding(_id, no_seq, self._obs_dtype, self._obs_shape)
-            r_seq = self._zero_padding(_id, r_seq, self._reward_dtype, self._reward_shape)
-            d_seq = self._zero_padding(_id, d_seq, self._done_dtype, self._done_shape)
-            return o_seq, a_seq, no_seq, r_seq, d_seq
-
-    def _zero_padding(self, index, data, dtype, shape):
+        # (batch, n_step) indices of the sequences starting at idxes
+        slots = (tf.expand_dims(idxes, axis=-1) + tf.range(self._n_step)) % self._capacity
+        o_seq, a_seq, no_seq, r_seq, d_seq = self._read_row(row=slots)
+
+        # the terminal transition itself is kept and the ones after it are masked out
+        not_done = 1. - tf.cast(d_seq, dtype=tf.float32)
+        mask = tf.math.cumprod(not_done, axis=1, exclusive=True)
+
+        o_seq = self._zero_padding(mask, o_seq, self._obs_dtype, self._obs_shape)
+        a_seq = self._zero_padding(mask, a_seq, self._act_dtype, self._act_shape)
+        no_seq = self._zero_padding(mask, no_seq, self._obs_dtype, self._obs_shape)
+        r_seq = self._zero_padding(mask, r_seq, self._reward_dtype, self._reward_shape)
+        d_seq = self._zero_padding(mask, d_seq, self._done_dtype, self._done_shape)
+        return o_seq, a_seq, r_seq, no_seq, d_seq
+
+    def _zero_padding(self, mask, data, dtype, shape):
         """ Pad the states after termination by 0s """
-        before_terminate = tf.gather(data, tf.range(start=0, limit=index))
-        after_terminate = tf.zeros(shape=(self._n_step-index,)+shape, dtype=dtype)
-        return tf.concat([before_terminate, after_terminate], axis=0)
\ No newline at end of file
+        mask = tf.cast(mask, dtype=dtype)[(Ellipsis,) + (tf.newaxis,) * len(shape)]
+        return data * mask
@@ -1,5 +1,6 @@
 import tensorflow as tf
 import tensorflow_probability as tfp
+from tf_rl.common.eager_util import conv_dtype
 
 tfd = tfp.distributions
 
@@ -12,9 +13,9 @@ XAVIER_INIT = tf.initializers.GlorotUniform()
 class Nature_DQN(tf.keras.Model):
     def __init__(self, num_action):
         super(Nature_DQN, self).__init__()
-        self.conv1 = tf.keras.layers.Conv2D(32, kernel_size=8, strides=8, activation='relu')
-        self.conv2 = tf.keras.layers.Conv2D(64, kernel_size=4, strides=2, activation='relu')
-        self.conv3 = tf.keras.layers.Conv2D(64, kernel_size=3, strides=1, activation='relu')
+        self.conv1 = tf.keras.layers.Conv2D(32, kernel_size=8, strides=8, activation='relu', dtype=conv_dtype())
+        self.conv2 = tf.keras.layers.Conv2D(64, kernel_size=4, strides=2, activation='relu', dtype=conv_dtype())
+        self.conv3 = tf.keras.layers.Conv2D(64, kernel_size=3, strides=1, activation='relu', dtype=conv_dtype())
         self.flat = tf.keras.layers.Flatten()
         self.fc1 = tf.keras.layers.Dense(512, activation='relu')
         self.pred = tf.keras.layers.Dense(num_action, activation='linear')
@@ -25,7 +26,8 @@ class Nature_DQN(tf.keras.Model):
         x = self.conv1(inputs)
         x = self.conv2(x)
         x = self.conv3(x)
-        x = self.flat(x)
+        # the heads and the loss stay in float32 when the conv trunk runs in bfloat16
+        x = tf.cast(self.flat(x), tf.float32)
         x = self.fc1(x)
         return self.pred(x)
 
@@ -52,11 +54,11 @@ class Duelling_atari(tf.keras.Model):
         super(Duelling_atari, self).__init__()
         self.duelling_type = duelling_type
         self.conv1 = tf.keras.layers.Conv2D(32, kernel_size=8, strides=8, activation='relu', kernel_regularizer=L2,
-                                            bias_regularizer=L2)
+                                            bias_regularizer=L2, dtype=conv_dtype())
         self.conv2 = tf.keras.layers.Conv2D(64, kernel_size=4, strides=2, activation='relu', kernel_regularizer=L2,
-                                            bias_regularizer=L2)
+                                            bias_regularizer=L2, dtype=conv_dtype())
         self.conv3 = tf.keras.layers.Conv2D(64, kernel_size=3, strides=1, activation='relu', kernel_regularizer=L2,
-                                            bias_regularizer=L2)
+                                            bias_regularizer=L2, dtype=conv_dtype())
         self.flat = tf.keras.layers.Flatten()
         self.fc1 = tf.keras.layers.Dense(512, activation='relu', kernel_regularizer=L2, bias_regularizer=L2)
         self.q_value = tf.keras.layers.Dense(num_action, activation='linear', kernel_regularizer=L2,
@@ -69,7 +71,8 @@ class Duelling_atari(tf.keras.Model):
         x = self.conv1(inputs)
         x = self.conv2(x)
         x = self.conv3(x)
-        x = self.flat(x)
+        # the heads and the loss stay in float32 when the conv trunk runs in bfloat16
+        x = tf.cast(self.flat(x), tf.float32)
         x = self.fc1(x)
         q_value = self.q_value(x)
         v_value = self.v_value(x)
@@ -370,7 +373,7 @@ class TRPO_Policy(tf.keras.Model):
         self.dense1 = tf.keras.layers.Dense(128, activation='tanh', kernel_initializer=KERNEL_INIT)
         self.dense2 = tf.keras.layers.Dense(128, activation='tanh', kernel_initializer=KERNEL_INIT)
         self.mean = tf.keras.layers.Dense(output_shape, activation='linear', kernel_initializer=KERNEL_INIT)
-        self.std = tf.get_variable('sigma', (1, output_shape), tf.float32, tf.constant_initializer(0.6))
+        self.std = tf.Variable(tf.constant(0.6, shape=(1, output_shape)), name='sigma')
 
     # @tf.contrib.eager.defun(autograph=False)
     @tf.function
@@ -0,0 +1,166 @@
+"""
+Frozen and quantized inference of the trained policies
+
+`predict`/`select_action` of the agents pay for the TF eager runtime on every call, i.e., the conversion of the
+input into a tensor and the dispatch of the Keras model, which dominates the latency of the small networks.
+Here the forward pass of a trained model is frozen into a TFLite flatbuffer, optionally quantized into int8,
+and PolicyServer runs it on the TFLite interpreter, whose call is a copy of the input and a few kernels.
+
+- export_policy: restores the latest checkpoint written by `create_checkpoint`'s manager and exports the model
+- PolicyServer: loads the exported file and serves `act(obs_batch)`. It uses the standalone `tflite_runtime`
+                if it's installed, so that the deployment doesn't need TF at all
+
+Usage(DQN):
+    export_policy(model=cartpole_net(num_action),
+                  obs_shape=(4,),
+                  export_path="./policy.tflite",
+                  checkpoint_dir=log_dir["model_path"],
+                  output_fn=lambda q_values: tf.math.argmax(q_values, axis=-1, output_type=tf.int32),
+                  quantize="dynamic")
+    server = PolicyServer("./policy.tflite")
+    actions = server.act(obs_batch)
+"""
+
+import numpy as np
+import tensorflow as tf
+
+QUANTIZE_MODES = (None, "dynamic", "int8")
+
+
+def restore_model(model, checkpoint_dir, obs_shape):
+    """
+    Restore the weights of the model from the latest checkpoint of `create_checkpoint`'s manager
+
+    The model is built first, so that the weights are restored immediately instead of at the first call.
+    The optimizer and the time-step in the checkpoint are ignored.
+    """
+    model(tf.zeros((1,) + tuple(obs_shape)))
+    latest = tf.train.latest_checkpoint(checkpoint_dir)
+    assert latest is not None, "No checkpoint is found in {}".format(checkpoint_dir)
+    tf.train.Checkpoint(model=model).restore(latest).expect_partial()
+    print("Restored the model from {}".format(latest))
+    return model
+
+
+def export_policy(model,
+                  obs_shape,
+                  export_path,
+                  checkpoint_dir=None,
+                  output_fn=None,
+                  quantize=None,
+                  representative_states=None,
+                  batch_size=1):
+    """
+    Freeze the forward pass of the model into a TFLite flatbuffer
+
+    :param model: tf.keras.Model, e.g., `agent.main_model` of DQN or `agent.actor` of DDPG/SAC
+    :param obs_shape: shape of an observation
+    :param export_path: path to the .tflite file
+    :param checkpoint_dir: if given, the latest checkpoint in it is restored before the export
+    :param output_fn: post-processing in the graph, e.g., argmax of the q-values or picking the deterministic action
+                      of SAC_Actor, so that the server returns the actions
+    :param quantize: None(float32), "dynamic"(int8 weights) or "int8"(int8 weights and activations,
+                     it needs `representative_states` to calibrate the ranges of the activations)
+    :param representative_states: array of the states, e.g., sampled from the replay buffer
+    :param batch_size: batch size of the input, PolicyServer resizes it on demand
+    :return: the size of the exported file in bytes
+    """
+    assert quantize in QUANTIZE_MODES, "quantize must be one of {}".format(QUANTIZE_MODES)
+    assert quantize != "int8" or representative_states is not None, "int8 needs representative_states"
+    if checkpoint_dir is not None:
+        restore_model(model, checkpoint_dir, obs_shape)
+    output_fn = (lambda outputs: outputs) if output_fn is None else output_fn
+
+    @tf.function(input_signature=[tf.TensorSpec(shape=(batch_size,) + tuple(obs_shape), dtype=tf.float32)])
+    def _policy(states):
+        return output_fn(model(states))
+
+    concrete_fn = _policy.get_concrete_function()
+    try:
+        # the recent versions need the owner of the variables to freeze them
+        converter = tf.lite.TFLiteConverter.from_concrete_functions([concrete_fn], trackable_obj=model)
+    except TypeError:
+        converter = tf.lite.TFLiteConverter.from_concrete_functions([concrete_fn])
+
+    if quantize is not None:
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantize == "int8":
+        states = np.asarray(representative_states, dtype=np.float32)
+
+        def _representative_dataset():
+            for i in range(0, len(states) - batch_size + 1, batch_size):
+                yield [states[i: i + batch_size]]
+
+        converter.representative_dataset = _representative_dataset
+
+    flatbuffer = converter.convert()
+    with open(export_path, "wb") as f:
+        f.write(flatbuffer)
+    return len(flatbuffer)
+
+
+def _interpreter_class():
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class PolicyServer(object):
+    """
+    Serves the policy exported by `export_policy`
+
+    The interpreter is not thread-safe, so that create one server per thread.
+
+    :param model_path: path to the .tflite file
+    :param num_threads: the number of the threads of the interpreter, 1 is the fastest for the small networks
+    """
+
+    def __init__(self, model_path, num_threads=1):
+        Interpreter = _interpreter_class()
+        try:
+            self._interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        except TypeError:
+            self._interpreter = Interpreter(model_path=model_path)
+        self._interpreter.allocate_tensors()
+        input_detail = self._interpreter.get_input_details()[0]
+        output_detail = self._interpreter.get_output_details()[0]
+        self._input_index = input_detail["index"]
+        self._output_index = output_detail["index"]
+        self._input_dtype = input_detail["dtype"]
+        self._input_quantization = input_detail["quantization"]
+        self._output_quantization = output_detail["quantization"]
+        self.obs_shape = tuple(input_detail["shape"][1:])
+        self._batch_size = int(input_detail["shape"][0])
+
+    def _resize(self, batch_size):
+        self._interpreter.resize_tensor_input(self._input_index, (batch_size,) + self.obs_shape)
+        self._interpreter.allocate_tensors()
+        self._batch_size = batch_size
+
+    def act(self, obs_batch):
+        """
+        :param obs_batch: array in the shape of (batch_size,) + obs_shape
+        :return: the outputs of the exported function for the batch
+        """
+        obs_batch = np.asarray(obs_batch, dtype=np.float32)
+        if obs_batch.shape[0] != self._batch_size:
+            self._resize(obs_batch.shape[0])
+        scale, zero_point = self._input_quantization
+        if scale:
+            obs_batch = np.round(obs_batch / scale + zero_point)
+            # the observations out of the calibrated range saturate instead of wrapping around
+            info = np.iinfo(self._input_dtype)
+            obs_batch = np.clip(obs_batch, info.min, info.max)
+        self._interpreter.set_tensor(self._input_index, obs_batch.astype(self._input_dtype, copy=False))
+        self._interpreter.invoke()
+        outputs = self._interpreter.get_tensor(self._output_index)
+        scale, zero_point = self._output_quantization
+        if scale:
+            outputs = (outputs.astype(np.float32) - zero_point) * scale
+        return outputs
+
+    def act_single(self, obs):
+        """ `act` on a single observation """
+        return self.act(np.expand_dims(obs, axis=0))[0]
@@ -0,0 +1,186 @@
+"""
+Asynchronous prefetching of batches between a replay buffer and `agent.update`
+
+The training loops sample a batch and then update the agent synchronously on the same thread.
+BatchPrefetcher wraps a replay buffer and prepares the next batches in a background thread,
+so that the numpy gather and the dtype conversion overlap with the gradient step running in TF.
+
+Since it exposes the same API as the replay buffers(add, sample, update_priorities, ...),
+it is used in place of the replay buffer by the training loops in `tf_rl/common/train.py`.
+It is opt-in through `prefetch_replay_buffer`, e.g., in a gin file
+
+    prefetch_replay_buffer.flg_prefetch = True
+
+or it can be passed to the loops directly
+
+    replay_buffer = BatchPrefetcher(ReplayBuffer(params.memory_size),
+                                    batch_size=params.batch_size,
+                                    dtypes=agent.batch_dtypes)
+    train_DQN(agent, env, policy, replay_buffer, reward_buffer, summary_writer)
+"""
+
+import threading
+import queue
+import gin
+import numpy as np
+import tensorflow as tf
+
+
+class BatchPrefetcher(object):
+    """
+    Background sampler stage with a bounded queue
+
+    :param replay_buffer: any replay buffer in tf_rl/common/memory.py
+    :param batch_size: batch size to sample, this has to be the same as the one passed to `sample`
+    :param dtypes: numpy dtype of each component of a batch, None keeps the original dtype
+    :param queue_size: the number of batches prepared ahead
+    :param flg_tensor: if True, the batches are converted into tf.Tensor in the background thread
+    :param device: if given, the tf.Tensors are copied to this device(e.g., "/gpu:0") in the background thread
+    :param flg_deterministic: if True, we don't use the background thread and sample on `sample` call,
+                              so that the sequence of the batches is reproducible with a fixed seed
+    """
+
+    def __init__(self,
+                 replay_buffer,
+                 batch_size,
+                 dtypes=None,
+                 queue_size=2,
+                 flg_tensor=True,
+                 device=None,
+                 flg_deterministic=False):
+        self.replay_buffer = replay_buffer
+        self._batch_size = batch_size
+        self._dtypes = dtypes
+        self._flg_tensor = flg_tensor
+        self._device = device
+        self._flg_deterministic = flg_deterministic
+        self._sample_args = ()
+
+        # the buffer is shared by the main thread(add) and the sampler thread(sample)
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def __len__(self):
+        return len(self.replay_buffer)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def add(self, *args, **kwargs):
+        with self._lock:
+            self.replay_buffer.add(*args, **kwargs)
+
+    def update_priorities(self, idxes, priorities):
+        """ See PrioritizedReplayBuffer.update_priorities """
+        with self._lock:
+            self.replay_buffer.update_priorities(idxes, priorities)
+
+    def save(self):
+        with self._lock:
+            return self.replay_buffer.save()
+
+    def refresh(self):
+        # the prepared batches are from the old buffer so that we throw them away
+        self.close()
+        with self._lock:
+            self.replay_buffer.refresh()
+
+    def _convert(self, batch):
+        """ convert a batch into the given dtypes and tf.Tensor """
+        batch = list(batch)
+        if self._dtypes is not None:
+            for i, dtype in enumerate(self._dtypes):
+                if dtype is not None:
+                    batch[i] = np.asarray(batch[i], dtype=dtype)
+        if self._flg_tensor:
+            if self._device is not None:
+                with tf.device(self._device):
+                    batch = [tf.identity(tf.convert_to_tensor(data)) for data in batch]
+            else:
+                batch = [tf.convert_to_tensor(data) for data in batch]
+        return tuple(batch)
+
+    def _sample(self):
+        with self._lock:
+            batch = self.replay_buffer.sample(self._batch_size, *self._sample_args)
+        return self._convert(batch)
+
+    def _put(self, item):
+        """ put an item into the queue, we check the stop event periodically while the queue is full """
+        while not self._stop_event.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+
+    def _run(self):
+        """ main loop of the sampler thread """
+        try:
+            while not self._stop_event.is_set():
+                self._put(self._sample())
+        except Exception as e:
+            # pass the error to the main thread, unless it's already closing the prefetcher
+            self._put(e)
+
+    def start(self):
+        if self._thread is None and not self._flg_deterministic:
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def close(self):
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+        self._queue = queue.Queue(maxsize=self._queue.maxsize)
+
+    def sample(self, batch_size, *args):
+        """
+        Returns the next prepared batch
+
+        the extra args(e.g., beta of PrioritizedReplayBuffer) are used from the next batch to prepare,
+        so that the batches already in the queue were sampled with the slightly old ones.
+        Likewise, the priorities of those batches don't reflect the latest `update_priorities`.
+        """
+        assert batch_size == self._batch_size, "batch_size has to be the same as the one given to the prefetcher"
+        self._sample_args = args
+        if self._flg_deterministic:
+            return self._sample()
+
+        # the sampler starts at the first call so that it doesn't sample from the empty buffer
+        self.start()
+        batch = self._queue.get()
+        if isinstance(batch, Exception):
+            self.close()
+            raise batch
+        return batch
+
+
+@gin.configurable
+def prefetch_replay_buffer(replay_buffer, batch_size, dtypes=None, flg_prefetch=False, queue_size=2, device=None):
+    """
+    Wraps the replay buffer by BatchPrefetcher if `flg_prefetch` is set, otherwise it is returned as is
+
+    :param replay_buffer: any replay buffer in tf_rl/common/memory.py
+    :param batch_size: batch size of the training loop
+    :param dtypes: see BatchPrefetcher, e.g., `agent.batch_dtypes`
+    :param flg_prefetch: opt-in flag of the prefetching
+    :param queue_size: see BatchPrefetcher
+    :param device: see BatchPrefetcher
+    """
+    if not flg_prefetch or isinstance(replay_buffer, BatchPrefetcher):
+        return replay_buffer
+    return BatchPrefetcher(replay_buffer, batch_size=batch_size, dtypes=dtypes, queue_size=queue_size, device=device)
+
+
+def close_prefetcher(replay_buffer):
+    """ stops the sampler thread if the replay buffer is wrapped by BatchPrefetcher """
+    if isinstance(replay_buffer, BatchPrefetcher):
+        replay_buffer.close()
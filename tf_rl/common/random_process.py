@@ -12,7 +12,7 @@ import numpy as np
 # [reference] https://github.com/matthiasplappert/keras-rl/blob/master/rl/random.py
 
 class RandomProcess(object):
-    def reset_states(self):
+    def reset_states(self, idx=None):
         pass
 
 
@@ -56,17 +56,24 @@ class OrnsteinUhlenbeckProcess(AnnealedGaussianProcess):
         self.n_steps += 1
         return x
 
-    def reset_states(self):
-        self.x_prev = self.x0 if self.x0 is not None else np.zeros(self.size)
+    def reset_states(self, idx=None):
+        """ reset the whole process, or only the rows `idx` of the process in the shape of (num_envs, num_action) """
+        x0 = self.x0 if self.x0 is not None else np.zeros(self.size)
+        if idx is None:
+            self.x_prev = x0
+        else:
+            self.x_prev = np.array(self.x_prev, dtype=np.float64)
+            self.x_prev[idx] = np.broadcast_to(x0, self.x_prev.shape)[idx]
 
 
 class GaussianNoise:
-    def __init__(self, mu, sigma=0.2):
+    def __init__(self, mu, sigma=0.2, size=None):
         self.mu = mu
         self.sigma = sigma
+        self.size = size
 
     def sample(self):
-        return np.random.normal(self.mu, self.sigma)
+        return np.random.normal(self.mu, self.sigma, size=self.size)
 
-    def reset_states(self):
+    def reset_states(self, idx=None):
         pass
\ No newline at end of file
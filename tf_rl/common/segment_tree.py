@@ -2,13 +2,16 @@
 Segment Tree Implementation of OpenAI Baselines
 https://github.com/openai/baselines/blob/master/baselines/common/segment_tree.py
 
+Unlike the original one, the values are stored in a numpy array so that
+we can update / search a batch of indices at once by descending all levels of the tree simultaneously.
 """
 
 import operator
+import numpy as np
 
 
 class SegmentTree(object):
-    def __init__(self, capacity, operation, neutral_element):
+    def __init__(self, capacity, operation, batch_operation, neutral_element):
         """Build a Segment Tree data structure.
         https://en.wikipedia.org/wiki/Segment_tree
         Can be used as regular array, but with two
@@ -26,29 +29,18 @@ class SegmentTree(object):
             and operation for combining elements (eg. sum, max)
             must form a mathematical group together with the set of
             possible values for array elements (i.e. be associative)
+        batch_operation: numpy.ufunc
+            element-wise counterpart of `operation` used for a batch of indices (eg. np.add, np.minimum)
         neutral_element: obj
             neutral element for the operation above. eg. float('-inf')
             for max and 0 for sum.
         """
         assert capacity > 0 and capacity & (capacity - 1) == 0, "capacity must be positive and a power of 2."
         self._capacity = capacity
-        self._value = [neutral_element for _ in range(2 * capacity)]
+        self._value = np.full(2 * capacity, neutral_element, dtype=np.float64)
         self._operation = operation
-
-    def _reduce_helper(self, start, end, node, node_start, node_end):
-        if start == node_start and end == node_end:
-            return self._value[node]
-        mid = (node_start + node_end) // 2
-        if end <= mid:
-            return self._reduce_helper(start, end, 2 * node, node_start, mid)
-        else:
-            if mid + 1 <= start:
-                return self._reduce_helper(start, end, 2 * node + 1, mid + 1, node_end)
-            else:
-                return self._operation(
-                    self._reduce_helper(start, mid, 2 * node, node_start, mid),
-                    self._reduce_helper(mid + 1, end, 2 * node + 1, mid + 1, node_end)
-                )
+        self._batch_operation = batch_operation
+        self._neutral_element = neutral_element
 
     def reduce(self, start=0, end=None):
         """Returns result of applying `self.operation`
@@ -69,24 +61,48 @@ class SegmentTree(object):
             end = self._capacity
         if end < 0:
             end += self._capacity
-        end -= 1
-        return self._reduce_helper(start, end, 1, 0, self._capacity - 1)
+        if start == 0 and end == self._capacity:
+            return self._value[1]
+
+        # bottom-up traversal over the half open range [start, end)
+        # which is the same as the inclusive range [start, end - 1] of the original implementation
+        result = self._neutral_element
+        start, end = start + self._capacity, end + self._capacity
+        while start < end:
+            if start & 1:
+                result = self._operation(result, self._value[start])
+                start += 1
+            if end & 1:
+                end -= 1
+                result = self._operation(result, self._value[end])
+            start //= 2
+            end //= 2
+        return result
 
     def __setitem__(self, idx, val):
-        # index of the leaf
-        idx += self._capacity
-        self._value[idx] = val
-        idx //= 2
-        while idx >= 1:
-            self._value[idx] = self._operation(
-                self._value[2 * idx],
-                self._value[2 * idx + 1]
-            )
+        if np.isscalar(idx):
+            # index of the leaf
+            idx += self._capacity
+            self._value[idx] = val
+            idx //= 2
+            while idx >= 1:
+                self._value[idx] = self._operation(self._value[2 * idx], self._value[2 * idx + 1])
+                idx //= 2
+        else:
+            # batched update: we update all the leaves first and then recompute their parents level by level.
+            # duplicated indices just recompute the same parent twice so that we don't need np.unique
+            idx = np.asarray(idx) + self._capacity
+            if idx.size == 0:
+                return
+            self._value[idx] = val
             idx //= 2
+            while idx[0] >= 1:
+                self._value[idx] = self._batch_operation(self._value[2 * idx], self._value[2 * idx + 1])
+                idx //= 2
 
     def __getitem__(self, idx):
-        assert 0 <= idx < self._capacity
-        return self._value[self._capacity + idx]
+        assert np.all(0 <= np.asarray(idx)) and np.all(np.asarray(idx) < self._capacity)
+        return self._value[self._capacity + np.asarray(idx)]
 
 
 class SumSegmentTree(SegmentTree):
@@ -94,6 +110,7 @@ class SumSegmentTree(SegmentTree):
         super(SumSegmentTree, self).__init__(
             capacity=capacity,
             operation=operator.add,
+            batch_operation=np.add,
             neutral_element=0.0
         )
 
@@ -109,22 +126,28 @@ class SumSegmentTree(SegmentTree):
         probability efficiently.
         Parameters
         ----------
-        perfixsum: float
+        perfixsum: float or np.array
             upperbound on the sum of array prefix
         Returns
         -------
-        idx: int
+        idx: int or np.array
             highest index satisfying the prefixsum constraint
         """
-        assert 0 <= prefixsum <= self.sum() + 1e-5
-        idx = 1
-        while idx < self._capacity:  # while non-leaf
-            if self._value[2 * idx] > prefixsum:
-                idx = 2 * idx
-            else:
-                prefixsum -= self._value[2 * idx]
-                idx = 2 * idx + 1
-        return idx - self._capacity
+        flg_scalar = np.isscalar(prefixsum)
+        prefixsum = np.array(prefixsum, dtype=np.float64, ndmin=1)
+        if prefixsum.size == 0:
+            return np.zeros(prefixsum.shape, dtype=np.int64)
+        assert np.all(0 <= prefixsum) and np.all(prefixsum <= self.sum() + 1e-5)
+
+        # descend the tree for all the prefixsums simultaneously
+        idx = np.ones(prefixsum.shape, dtype=np.int64)
+        while idx[0] < self._capacity:  # while non-leaf, all leaves are on the same level
+            left = self._value[2 * idx]
+            flg_right = left <= prefixsum
+            prefixsum -= np.where(flg_right, left, 0.0)
+            idx = 2 * idx + flg_right
+        idx -= self._capacity
+        return int(idx[0]) if flg_scalar else idx
 
 
 class MinSegmentTree(SegmentTree):
@@ -132,6 +155,7 @@ class MinSegmentTree(SegmentTree):
         super(MinSegmentTree, self).__init__(
             capacity=capacity,
             operation=min,
+            batch_operation=np.minimum,
             neutral_element=float('inf')
         )
 
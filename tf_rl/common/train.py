@@ -1,6 +1,7 @@
 import time
 from collections import deque
 from tf_rl.common.utils import *
+from tf_rl.common.prefetcher import prefetch_replay_buffer, close_prefetcher
 from tf_rl.common.visualise import visualise_act_and_dist
 
 """
@@ -11,7 +12,18 @@ so that, we can unify train_DQN and train_DQN_PER
 """
 
 
-def train_DQN(agent, env, policy, replay_buffer, reward_buffer, summary_writer):
+def _hard_sync_taus(timestep, num_updates, train_interval, sync_freq):
+    """
+    coefficients of the target syncs for `agent.update_many` which replay the hard syncs of the training loop
+
+    the i-th update was scheduled at the env-step t_i and the target model is synced after it
+    if a multiple of sync_freq falls in [t_i, t_i + train_interval), i.e., before the next update
+    """
+    steps = timestep - train_interval * np.arange(num_updates - 1, -1, -1)
+    return ((steps + train_interval - 1) // sync_freq > (steps - 1) // sync_freq).astype(np.float32)
+
+
+def train_DQN(agent, env, policy, replay_buffer, reward_buffer, summary_writer, num_updates_per_call=1):
     """
     Training train_script for DQN and other advanced models without PER
 
@@ -22,9 +34,14 @@ def train_DQN(agent, env, policy, replay_buffer, reward_buffer, summary_writer):
     :param reward_buffer:
     :param params:
     :param summary_writer:
+    :param num_updates_per_call: if > 1, the updates are accumulated and run by a single `agent.update_many` call
+                                 together with the hard syncs of the target model
     :return:
     """
     get_ready(agent.params)
+    if num_updates_per_call == 1:
+        # the batches of `sample_many` are not prefetched
+        replay_buffer = prefetch_replay_buffer(replay_buffer, agent.params.batch_size, dtypes=agent.batch_dtypes)
     time_buffer = list()
     global_timestep = tf.compat.v1.train.get_global_step()
     log = logger(agent.params)
@@ -54,16 +71,25 @@ def train_DQN(agent, env, policy, replay_buffer, reward_buffer, summary_writer):
                     agent.eval_flg = True
 
                 if (global_timestep.numpy() > agent.params.learning_start) and (
-                        global_timestep.numpy() % agent.params.train_interval == 0):
-                    states, actions, rewards, next_states, dones = replay_buffer.sample(agent.params.batch_size)
+                        global_timestep.numpy() % (agent.params.train_interval * num_updates_per_call) == 0):
+                    if num_updates_per_call == 1:
+                        states, actions, rewards, next_states, dones = replay_buffer.sample(agent.params.batch_size)
 
-                    loss, batch_loss = agent.update(states, actions, rewards, next_states, dones)
+                        loss, batch_loss = agent.update(states, actions, rewards, next_states, dones)
+                    else:
+                        states, actions, rewards, next_states, dones = replay_buffer.sample_many(
+                            num_updates_per_call, agent.params.batch_size)
+                        taus = _hard_sync_taus(global_timestep.numpy(), num_updates_per_call,
+                                               agent.params.train_interval, agent.params.sync_freq)
+                        loss, batch_loss = agent.update_many(states, actions, rewards, next_states, dones, taus=taus)
 
                 # synchronise the target and main models by hard
                 if (global_timestep.numpy() > agent.params.learning_start) and (
                         global_timestep.numpy() % agent.params.sync_freq == 0):
                     agent.manager.save()
-                    agent.target_model.set_weights(agent.main_model.get_weights())
+                    if num_updates_per_call == 1:
+                        # otherwise, the target model is synced in `agent.update_many`
+                        agent.target_model.set_weights(agent.main_model.get_weights())
 
             """
             ===== After 1 Episode is Done =====
@@ -91,6 +117,7 @@ def train_DQN(agent, env, policy, replay_buffer, reward_buffer, summary_writer):
             # check the stopping condition
             if global_timestep.numpy() > agent.params.num_frames:
                 print("=== Training is Done ===")
+                close_prefetcher(replay_buffer)
                 eval_Agent(agent, env, n_trial=agent.params.test_episodes)
                 env.close()
                 break
@@ -459,8 +486,15 @@ def train_DRQN(agent, env, policy, replay_buffer, reward_buffer, params, summary
 
 """
 
-def train_DDPG_original(agent, env, replay_buffer, reward_buffer, summary_writer):
+def train_DDPG_original(agent, env, replay_buffer, reward_buffer, summary_writer, num_updates_per_call=1):
+    """
+    :param num_updates_per_call: if > 1, the updates are accumulated and run by a single `agent.update_many` call
+                                 every `num_updates_per_call` env-steps
+    """
     get_ready(agent.params)
+    if num_updates_per_call == 1:
+        # the batches of `sample_many` are not prefetched
+        replay_buffer = prefetch_replay_buffer(replay_buffer, agent.params.batch_size, dtypes=agent.batch_dtypes)
 
     global_timestep = tf.compat.v1.train.get_or_create_global_step()
     time_buffer = deque(maxlen=agent.params.reward_buffer_ep)
@@ -490,11 +524,17 @@ def train_DDPG_original(agent, env, replay_buffer, reward_buffer, summary_writer
                     """
                     === Update the models
                     """
-                    if global_timestep.numpy() > agent.params.learning_start:
-                        states, actions, rewards, next_states, dones = replay_buffer.sample(agent.params.batch_size)
-                        loss = agent.update(states, actions, rewards, next_states, dones)
-                        soft_target_model_update_eager(agent.target_actor, agent.actor, tau=agent.params.soft_update_tau)
-                        soft_target_model_update_eager(agent.target_critic, agent.critic, tau=agent.params.soft_update_tau)
+                    if (global_timestep.numpy() > agent.params.learning_start) and (
+                            global_timestep.numpy() % num_updates_per_call == 0):
+                        if num_updates_per_call == 1:
+                            states, actions, rewards, next_states, dones = replay_buffer.sample(agent.params.batch_size)
+                            loss = agent.update_fused(states, actions, rewards, next_states, dones,
+                                                      tau=agent.params.soft_update_tau)
+                        else:
+                            states, actions, rewards, next_states, dones = replay_buffer.sample_many(
+                                num_updates_per_call, agent.params.batch_size)
+                            loss = agent.update_many(states, actions, rewards, next_states, dones,
+                                                     taus=np.full(num_updates_per_call, agent.params.soft_update_tau))
 
                     global_timestep.assign_add(1)
                     episode_len += 1
@@ -539,6 +579,7 @@ def train_DDPG_original(agent, env, replay_buffer, reward_buffer, summary_writer
                 # check the stopping condition
                 if global_timestep.numpy() > agent.params.num_frames:
                     print("=== Training is Done ===")
+                    close_prefetcher(replay_buffer)
                     eval_reward, eval_distance, eval_action = eval_Agent_DDPG(env, agent)
                     eval_epochs.append(global_timestep.numpy())
                     action_buffer.append(eval_action)
@@ -600,9 +641,8 @@ def train_DDPG_onpolicy(agent, env, replay_buffer, reward_buffer, summary_writer
                 for t_train in range(int(episode_len)):
                     # for t_train in range(10): # for test purpose
                     states, actions, rewards, next_states, dones = replay_buffer.sample(batch_size)
-                    loss = agent.update(states, actions, rewards, next_states, dones)
-                    soft_target_model_update_eager(agent.target_actor, agent.actor, tau=agent.params.soft_update_tau)
-                    soft_target_model_update_eager(agent.target_critic, agent.critic, tau=agent.params.soft_update_tau)
+                    loss = agent.update_fused(states, actions, rewards, next_states, dones,
+                                              tau=agent.params.soft_update_tau)
 
                 # save the updated models
                 agent.actor_manager.save()
@@ -645,8 +685,15 @@ def train_DDPG_onpolicy(agent, env, replay_buffer, reward_buffer, summary_writer
                     break
 
 
-def train_SAC(agent, env, replay_buffer, reward_buffer, summary_writer):
+def train_SAC(agent, env, replay_buffer, reward_buffer, summary_writer, num_updates_per_call=1):
+    """
+    :param num_updates_per_call: if > 1, the updates are accumulated and run by a single `agent.update_many` call
+                                 every `num_updates_per_call` env-steps
+    """
     get_ready(agent.params)
+    if num_updates_per_call == 1:
+        # the batches of `sample_many` are not prefetched
+        replay_buffer = prefetch_replay_buffer(replay_buffer, agent.params.batch_size, dtypes=agent.batch_dtypes)
 
     global_timestep = tf.compat.v1.train.get_or_create_global_step()
     time_buffer = deque(maxlen=agent.params.reward_buffer_ep)
@@ -684,10 +731,17 @@ def train_SAC(agent, env, replay_buffer, reward_buffer, summary_writer):
                     """
                     === Update the models
                     """
-                    if global_timestep.numpy() > agent.params.learning_start:
-                        states, actions, rewards, next_states, dones = replay_buffer.sample(agent.params.batch_size)
-                        loss = agent.update(states, actions, rewards, next_states, dones)
-                        soft_target_model_update_eager(agent.target_critic, agent.critic, tau=agent.params.soft_update_tau)
+                    if (global_timestep.numpy() > agent.params.learning_start) and (
+                            global_timestep.numpy() % num_updates_per_call == 0):
+                        if num_updates_per_call == 1:
+                            states, actions, rewards, next_states, dones = replay_buffer.sample(agent.params.batch_size)
+                            loss = agent.update_fused(states, actions, rewards, next_states, dones,
+                                                      tau=agent.params.soft_update_tau)
+                        else:
+                            states, actions, rewards, next_states, dones = replay_buffer.sample_many(
+                                num_updates_per_call, agent.params.batch_size)
+                            loss = agent.update_many(states, actions, rewards, next_states, dones,
+                                                     taus=np.full(num_updates_per_call, agent.params.soft_update_tau))
 
                 """
                 ===== After 1 Episode is Done =====
@@ -721,6 +775,7 @@ def train_SAC(agent, env, replay_buffer, reward_buffer, summary_writer):
                 # check the stopping condition
                 if global_timestep.numpy() > agent.params.num_frames:
                     print("=== Training is Done ===")
+                    close_prefetcher(replay_buffer)
                     eval_reward, eval_distance, eval_action = eval_Agent_DDPG(env, agent)
                     eval_epochs.append(global_timestep.numpy())
                     action_buffer.append(eval_action)
@@ -814,14 +869,12 @@ def train_HER(agent, env, replay_buffer, summary_writer):
                     agent.g_norm.update(transitions['g'])
                     # ==== finish update normaliser ====
 
-                    # Update Loop
-                    for _ in range(agent.params.num_updates):
-                        transitions = replay_buffer.sample(agent.params.batch_size)
-                        agent.update(transitions)
+                    # Update Loop, all the updates run in a single compiled call
+                    transitions = replay_buffer.sample_many(agent.params.num_updates, agent.params.batch_size)
+                    agent.update_many(transitions)
 
                     # sync networks
-                    soft_target_model_update_eager(agent.target_actor, agent.actor, tau=agent.params.tau)
-                    soft_target_model_update_eager(agent.target_critic, agent.critic, tau=agent.params.tau)
+                    agent.update_target_models(tau=agent.params.tau)
 
                 """
                 === After 1 epoch ===
@@ -858,7 +911,7 @@ def train_TRPO(agent, env, reward_buffer, summary_writer):
         with tf.contrib.summary.always_record_summaries():
 
             while global_timestep < agent.params.num_frames:
-                states, actions, rewards, = [], [], []
+                states, actions, rewards, dones = [], [], [], []
                 for _ in range(agent.params.num_rollout):
                     state = env.reset()
                     normaliser.normalise(state)
@@ -875,6 +928,7 @@ def train_TRPO(agent, env, reward_buffer, summary_writer):
                         actions.append(action)
                         # rewards.append(reward*0.0025) # reward scaling
                         rewards.append(reward)  # reward scaling
+                        dones.append(done)
 
                         global_timestep.assign_add(1)
                         total_reward += reward
@@ -898,7 +952,7 @@ def train_TRPO(agent, env, reward_buffer, summary_writer):
                 """
                 # update the weights: inside it's got a for-loop and a stopping condition
                 # so that if the value of KL-divergence exceeds some threshold, then we stop updating.
-                loss = agent.update(states, actions, rewards)
+                loss = agent.update(states, actions, rewards, dones)
                 log.logging(global_timestep.numpy(), total_ep, np.sum(time_buffer), reward_buffer, np.mean(loss), 0,
                             [0])
 
@@ -321,6 +321,11 @@ def test(sess, agent, env, params):
     return
 
 
+def num_crossed(prev_ts, ts, interval):
+    """ the number of multiples of interval in (prev_ts, ts], e.g., the syncs due in a step of VectorEnv """
+    return ts // interval - prev_ts // interval
+
+
 class logger:
     def __init__(self, num_frames, interval_MAR):
         self._num_frames = num_frames
@@ -606,8 +611,24 @@ def soft_target_model_update_eager(target, source, tau=1e-2):
     :return:
     """
 
-    for param, target_param in zip(source.weights, target.weights):
-        target_param.assign(tau * param + (1 - tau) * target_param)
+    soft_target_model_update_graph(target, source, tau=tau)
+
+
+def soft_target_model_update_graph(target, source, tau=1e-2):
+    """
+    In-graph soft update of the model parameters
+    target = tau * source + (1 - tau) * target
+
+    Unlike soft_target_model_update_eager, this is not a tf.function by itself so that it can be called
+    inside the compiled update of an agent, then the Polyak averaging runs in the same graph as the gradient steps.
+
+    :param target: target model
+    :param source: main model
+    :param tau: float or scalar tf.Tensor
+    :return: op grouping all the assignments
+    """
+    return tf.group(*[target_param.assign(tau * param + (1 - tau) * target_param)
+                      for param, target_param in zip(source.weights, target.weights)])
 
 
 """
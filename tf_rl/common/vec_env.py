@@ -0,0 +1,302 @@
+"""
+Vectorised Environments
+
+Design reference
+https://github.com/openai/baselines/tree/master/baselines/common/vec_env
+
+A VectorEnv steps N copies of an env at once so that the agent can select the actions for all of them
+by one forward pass of the policy instead of one `tf.function` call per env-step.
+
+- SyncVectorEnv: steps the envs one after another in the main process
+- SubprocVectorEnv: steps each env in its own process, which uses all the cores of a CPU-only node
+- ShmemVectorEnv: same as SubprocVectorEnv but the workers write the observations into shared memory,
+                  so that only the commands travel through the pipes(e.g., 84x84x4 frames of Atari)
+
+Every env is reset automatically at the end of an episode, hence the observation returned by `step`
+is the first one of the next episode. The last observation of the finished episode is stored in
+`info["terminal_observation"]` so that we can still store the correct transition in the replay buffer.
+
+Usage:
+    env = SubprocVectorEnv([lambda: gym.make("CartPole-v0") for _ in range(8)])
+    states = env.reset()                                    # (8, 4)
+    next_states, rewards, dones, infos = env.step(actions)  # (8, 4), (8,), (8,), list of 8 dicts
+"""
+
+import ctypes
+import numpy as np
+import multiprocessing
+import cloudpickle
+import pickle
+
+
+def _step_and_reset(env, action):
+    """ step the env and reset it if the episode is over """
+    obs, reward, done, info = env.step(action)
+    if done:
+        info = dict(info)
+        info["terminal_observation"] = obs
+        obs = env.reset()
+    return obs, reward, done, info
+
+
+class VectorEnv(object):
+    """
+    boiler plate of a vectorised env
+
+    :param env_fns: list of functions creating an env
+    """
+
+    def __init__(self, env_fns):
+        self.env_fns = env_fns
+        self.num_envs = len(env_fns)
+        self.observation_space = None
+        self.action_space = None
+
+    def reset(self):
+        """ Returns: observations in the shape of (num_envs, ...) """
+        raise NotImplementedError
+
+    def step(self, actions):
+        """ Returns: observations, rewards, dones and the list of infos of all the envs """
+        raise NotImplementedError
+
+    def seed(self, seed):
+        """ each env is seeded by seed + its index so that they don't generate the same trajectory """
+        raise NotImplementedError
+
+    def close(self):
+        raise NotImplementedError
+
+    def sample_actions(self):
+        """ random actions for all the envs """
+        return np.stack([self.action_space.sample() for _ in range(self.num_envs)])
+
+
+class SyncVectorEnv(VectorEnv):
+    """ steps the envs sequentially in the main process """
+
+    def __init__(self, env_fns):
+        super(SyncVectorEnv, self).__init__(env_fns)
+        self.envs = [env_fn() for env_fn in env_fns]
+        self.observation_space = self.envs[0].observation_space
+        self.action_space = self.envs[0].action_space
+
+    def reset(self):
+        return np.stack([np.asarray(env.reset()) for env in self.envs])
+
+    def step(self, actions):
+        obs, rewards, dones, infos = zip(*[_step_and_reset(env, action) for env, action in zip(self.envs, actions)])
+        return np.stack([np.asarray(ob) for ob in obs]), np.array(rewards), np.array(dones), list(infos)
+
+    def seed(self, seed):
+        for i, env in enumerate(self.envs):
+            env.seed(seed + i)
+
+    def close(self):
+        for env in self.envs:
+            env.close()
+
+
+class CloudpickleWrapper(object):
+    """ env_fns are often lambdas which the standard pickle can't serialise """
+
+    def __init__(self, x):
+        self.x = x
+
+    def __getstate__(self):
+        return cloudpickle.dumps(self.x)
+
+    def __setstate__(self, ob):
+        self.x = pickle.loads(ob)
+
+
+def _worker(remote, parent_remote, env_fn_wrapper):
+    """ main loop of the subprocess, it executes the commands sent from SubprocVectorEnv """
+    parent_remote.close()
+    env = env_fn_wrapper.x()
+    try:
+        while True:
+            cmd, data = remote.recv()
+            if cmd == "step":
+                obs, reward, done, info = _step_and_reset(env, data)
+                remote.send((np.asarray(obs), reward, done, info))
+            elif cmd == "reset":
+                remote.send(np.asarray(env.reset()))
+            elif cmd == "seed":
+                remote.send(env.seed(data))
+            elif cmd == "get_spaces":
+                remote.send((env.observation_space, env.action_space))
+            elif cmd == "close":
+                break
+            else:
+                raise NotImplementedError("Unknown command: {}".format(cmd))
+    except KeyboardInterrupt:
+        print("SubprocVectorEnv worker: got KeyboardInterrupt")
+    finally:
+        env.close()
+        remote.close()
+
+
+class SubprocVectorEnv(VectorEnv):
+    """
+    steps each env in its own process
+
+    :param env_fns: list of functions creating an env
+    :param context: start method of multiprocessing, e.g., "fork", "spawn" or "forkserver"
+    """
+
+    def __init__(self, env_fns, context=None):
+        super(SubprocVectorEnv, self).__init__(env_fns)
+        self.closed = False
+        ctx = multiprocessing.get_context(context)
+        self.remotes, self.work_remotes = zip(*[ctx.Pipe() for _ in range(self.num_envs)])
+        self.processes = [ctx.Process(target=_worker, args=(work_remote, remote, CloudpickleWrapper(env_fn)))
+                          for work_remote, remote, env_fn in zip(self.work_remotes, self.remotes, env_fns)]
+        for process in self.processes:
+            # if the main process crashes, we should not cause things to hang
+            process.daemon = True
+            process.start()
+        for work_remote in self.work_remotes:
+            work_remote.close()
+
+        self.remotes[0].send(("get_spaces", None))
+        self.observation_space, self.action_space = self.remotes[0].recv()
+
+    def reset(self):
+        for remote in self.remotes:
+            remote.send(("reset", None))
+        return np.stack([remote.recv() for remote in self.remotes])
+
+    def step(self, actions):
+        # send all the actions first so that the envs are stepped in parallel
+        for remote, action in zip(self.remotes, actions):
+            remote.send(("step", action))
+        obs, rewards, dones, infos = zip(*[remote.recv() for remote in self.remotes])
+        return np.stack(obs), np.array(rewards), np.array(dones), list(infos)
+
+    def seed(self, seed):
+        for i, remote in enumerate(self.remotes):
+            remote.send(("seed", seed + i))
+        for remote in self.remotes:
+            remote.recv()
+
+    def close(self):
+        if self.closed:
+            return
+        for remote in self.remotes:
+            remote.send(("close", None))
+        for process in self.processes:
+            process.join()
+        self.closed = True
+
+
+def _shmem_worker(remote, parent_remote, env_fn_wrapper, index, obs_bufs, obs_shape, obs_dtype):
+    """
+    main loop of the subprocess of ShmemVectorEnv
+
+    the observations are written into the shared memory at `index` and only the scalars are sent to the pipe
+    """
+    parent_remote.close()
+    env = env_fn_wrapper.x()
+    obs_buf, terminal_obs_buf = [np.frombuffer(buf, dtype=obs_dtype).reshape((-1,) + obs_shape)[index]
+                                 for buf in obs_bufs]
+    try:
+        while True:
+            cmd, data = remote.recv()
+            if cmd == "step":
+                obs, reward, done, info = _step_and_reset(env, data)
+                if done:
+                    terminal_obs_buf[...] = np.asarray(info.pop("terminal_observation"))
+                obs_buf[...] = np.asarray(obs)
+                remote.send((reward, done, info))
+            elif cmd == "reset":
+                obs_buf[...] = np.asarray(env.reset())
+                remote.send(None)
+            elif cmd == "seed":
+                remote.send(env.seed(data))
+            elif cmd == "close":
+                break
+            else:
+                raise NotImplementedError("Unknown command: {}".format(cmd))
+    except KeyboardInterrupt:
+        print("ShmemVectorEnv worker: got KeyboardInterrupt")
+    finally:
+        env.close()
+        remote.close()
+
+
+class ShmemVectorEnv(SubprocVectorEnv):
+    """
+    steps each env in its own process and receives the observations via shared memory
+
+    Unlike SubprocVectorEnv, the observations are neither pickled nor copied to the pipe.
+    The workers write them into the preallocated blocks and the main process reads them as numpy arrays.
+    We use multiprocessing.RawArray(instead of multiprocessing.shared_memory which requires python3.8)
+    since the blocks are created before the workers start and are inherited by them.
+
+    :param env_fns: list of functions creating an env
+    :param context: start method of multiprocessing, e.g., "fork", "spawn" or "forkserver"
+    """
+
+    def __init__(self, env_fns, context=None):
+        VectorEnv.__init__(self, env_fns)
+        self.closed = False
+
+        # we need the spaces to allocate the shared memory before starting the workers
+        dummy = env_fns[0]()
+        self.observation_space, self.action_space = dummy.observation_space, dummy.action_space
+        dummy.close()
+        self._obs_shape = self.observation_space.shape
+        self._obs_dtype = np.dtype(self.observation_space.dtype)
+
+        ctx = multiprocessing.get_context(context)
+        nbytes = self.num_envs * int(np.prod(self._obs_shape)) * self._obs_dtype.itemsize
+
+        # one block for the latest observations and one for the last ones of the finished episodes
+        self._obs_bufs = [ctx.RawArray(ctypes.c_byte, nbytes) for _ in range(2)]
+        self._obs, self._terminal_obs = [np.frombuffer(buf, dtype=self._obs_dtype).reshape((self.num_envs,) +
+                                                                                           self._obs_shape)
+                                         for buf in self._obs_bufs]
+
+        self.remotes, self.work_remotes = zip(*[ctx.Pipe() for _ in range(self.num_envs)])
+        self.processes = [ctx.Process(target=_shmem_worker,
+                                      args=(work_remote, remote, CloudpickleWrapper(env_fn), index,
+                                            self._obs_bufs, self._obs_shape, self._obs_dtype))
+                          for index, (work_remote, remote, env_fn) in enumerate(zip(self.work_remotes,
+                                                                                    self.remotes,
+                                                                                    env_fns))]
+        for process in self.processes:
+            # if the main process crashes, we should not cause things to hang
+            process.daemon = True
+            process.start()
+        for work_remote in self.work_remotes:
+            work_remote.close()
+
+    def reset(self):
+        for remote in self.remotes:
+            remote.send(("reset", None))
+        for remote in self.remotes:
+            remote.recv()
+        # the workers overwrite the block at the next step so that we return a copy
+        return self._obs.copy()
+
+    def step(self, actions):
+        # send all the actions first so that the envs are stepped in parallel
+        for remote, action in zip(self.remotes, actions):
+            remote.send(("step", action))
+        rewards, dones, infos = zip(*[remote.recv() for remote in self.remotes])
+        infos = list(infos)
+        for i in np.where(dones)[0]:
+            infos[i]["terminal_observation"] = self._terminal_obs[i].copy()
+        return self._obs.copy(), np.array(rewards), np.array(dones), infos
+
+
+def make_vec_env(env_fn, num_envs, flg_subproc=True, flg_shmem=False):
+    """ create a VectorEnv of `num_envs` copies of the env created by `env_fn` """
+    env_fns = [env_fn for _ in range(num_envs)]
+    if flg_shmem:
+        return ShmemVectorEnv(env_fns)
+    elif flg_subproc:
+        return SubprocVectorEnv(env_fns)
+    else:
+        return SyncVectorEnv(env_fns)
@@ -523,6 +523,7 @@ def make_atari(env_id, skip_frame_k=4, max_episode_steps=None):
 # I will rely on those wrappers.
 # frame_stack and scale consumes a lot of memory so that if you have enough memory, then try it.
 # my local has 16GB RAM though, it was not enough.... 0.5M replay buffer took up about 8.5GB of RAM...
+# use FrameReplayBuffer in tf_rl/common/memory.py with frame_stack=True, which stores each frame only once.
 def wrap_deepmind(env, episode_life=True, clip_rewards=True, frame_stack=False, skip_frame_k=4, scale=False):
     """Configure environment for DeepMind-style Atari.
     """
@@ -9,6 +9,8 @@ from tf_rl.common.set_up import set_up_for_training
 from tf_rl.common.random_process import OrnsteinUhlenbeckProcess, GaussianNoise
 from tf_rl.common.memory import ReplayBuffer
 from tf_rl.common.utils import eager_setup
+from tf_rl.common.eager_util import set_execution_mode
+from tf_rl.common.vec_env import make_vec_env
 from tf_rl.examples.DDPG.utils.network import Actor, Critic
 from tf_rl.examples.DDPG.utils.agent import DDPG
 from tf_rl.examples.DDPG.utils.train import train
@@ -23,6 +25,9 @@ def train_eval(log_dir="DDPG",
                seed=123,
                gpu_id=0,
                env_name="HalfCheetah-v2",
+               num_envs=1,
+               flg_subproc_env=True,
+               num_eval_envs=1,
                num_frames=10000,
                tau=1e-2,
                memory_size=5000,
@@ -49,23 +54,46 @@ def train_eval(log_dir="DDPG",
 
     env = gym.make(env_name)
     env = Monitor(env=env, directory=log_dir["video_path"], force=True)
+    if num_envs > 1:
+        # the envs for training are not recorded, the original one is used for evaluation
+        eval_env, env = env, make_vec_env(env_fn=lambda: gym.make(env_name),
+                                          num_envs=num_envs,
+                                          flg_subproc=flg_subproc_env)
+        env.seed(seed)
+    else:
+        eval_env = None
+    if num_eval_envs > 1:
+        # the episodes of the final evaluation run concurrently on these envs
+        eval_vec_env = make_vec_env(env_fn=lambda: gym.make(env_name),
+                                    num_envs=num_eval_envs,
+                                    flg_subproc=flg_subproc_env)
+        eval_vec_env.seed(seed + num_envs)
+    else:
+        eval_vec_env = None
 
     replay_buffer = ReplayBuffer(memory_size, traj_dir=log_dir["traj_path"])
     reward_buffer = deque(maxlen=interval_MAR)
     summary_writer = tf.compat.v2.summary.create_file_writer(log_dir["summary_path"])
 
     if random_process == "ou":
-        random_process = OrnsteinUhlenbeckProcess(size=env.action_space.shape[0],
+        # with VectorEnv, each env has its own row of the noise process, which is reset at the end of its episode
+        random_process = OrnsteinUhlenbeckProcess(size=(num_envs, env.action_space.shape[0]) if num_envs > 1
+                                                  else env.action_space.shape[0],
                                                   theta=0.15,
                                                   mu=mu,
                                                   sigma=sigma)
     elif random_process == "gaussian":
+        # white noise has no state, so the envs only need independent samples
         random_process = GaussianNoise(mu=mu,
-                                       sigma=sigma)
+                                       sigma=sigma,
+                                       size=(num_envs, env.action_space.shape[0]) if num_envs > 1 else None)
     else:
         random_process = False
         assert False, "choose the random process from either gaussian or ou"
 
+    # XLA and mixed precision are opt-in via gin, the networks read the mode when they are built
+    set_execution_mode()
+
     agent = DDPG(actor=Actor,
                  critic=Critic,
                  num_action=env.action_space.shape[0],
@@ -73,7 +101,9 @@ def train_eval(log_dir="DDPG",
                  gamma=gamma,
                  L2_reg=L2_reg,
                  actor_model_dir=log_dir["model_path"] + "/actor",
-                 critic_model_dir=log_dir["model_path"] + "/critic")
+                 critic_model_dir=log_dir["model_path"] + "/critic",
+                 obs_shape=env.observation_space.shape,
+                 batch_size=batch_size)
 
     train(agent,
           env,
@@ -88,7 +118,9 @@ def train_eval(log_dir="DDPG",
           batch_size,
           interval_MAR,
           log_dir,
-          google_colab)
+          google_colab,
+          eval_env,
+          eval_vec_env)
 
 
 def main(gin_file, gin_params, log_dir, prev_log, google_colab):
@@ -1,7 +1,10 @@
 import numpy as np
 import tensorflow as tf
 from copy import deepcopy
-from tf_rl.common.utils import create_checkpoint
+from collections import Counter
+from tf_rl.common.utils import create_checkpoint, soft_target_model_update_graph
+from tf_rl.common.policy_server import export_policy
+from tf_rl.common.eager_util import traced_function, xla_enabled
 
 
 class DDPG(object):
@@ -13,7 +16,14 @@ class DDPG(object):
                  gamma,
                  L2_reg,
                  actor_model_dir,
-                 critic_model_dir):
+                 critic_model_dir,
+                 obs_shape=None,
+                 batch_size=None):
+        """
+        :param obs_shape: shape of an observation, if given, the input signatures of the tf.functions are fixed
+                          so that they are traced only once(see `warmup`)
+        :param batch_size: batch size of the update, None allows any batch size at the cost of the retracing
+        """
         self._num_action = num_action
         self._gamma = gamma
         self._L2_reg = L2_reg
@@ -36,18 +46,95 @@ class DDPG(object):
                                                 optimizer=self.critic_optimizer,
                                                 model_dir=critic_model_dir)
 
+        # === Compile the tf.functions ===
+        # the number of the traces of each function, it should stay at 1 after `warmup`
+        self.num_traces = Counter()
+        self._obs_shape = obs_shape
+        if obs_shape is None:
+            select_action_signature, update_signature, fused_update_signature = None, None, None
+        else:
+            # the batch dim of the action selection is free since VectorEnv feeds a batch of states
+            select_action_signature = [tf.TensorSpec(shape=(None,) + tuple(obs_shape), dtype=tf.float32)]
+            update_signature = [tf.TensorSpec(shape=(batch_size,) + tuple(obs_shape), dtype=tf.float32),
+                                tf.TensorSpec(shape=(batch_size, num_action), dtype=tf.float32),
+                                tf.TensorSpec(shape=(batch_size,), dtype=tf.float32),
+                                tf.TensorSpec(shape=(batch_size,) + tuple(obs_shape), dtype=tf.float32),
+                                tf.TensorSpec(shape=(batch_size,), dtype=tf.float32)]
+            fused_update_signature = update_signature + [tf.TensorSpec(shape=(), dtype=tf.float32)]
+        self._select_action = traced_function(self._select_action, select_action_signature, self.num_traces)
+        # the update steps have no summaries, so that they can be compiled by XLA as a whole
+        self._inner_update = traced_function(self._inner_update, update_signature, self.num_traces,
+                                             jit_compile=xla_enabled())
+        self._fused_update = traced_function(self._fused_update, fused_update_signature, self.num_traces,
+                                             jit_compile=xla_enabled())
+
+    def warmup(self):
+        """
+        Trace the tf.functions before the first env-step so that the training doesn't stall in the middle
+        Make sure to call this in the context of the summary writer, otherwise the summaries in the update are lost
+        """
+        if self._obs_shape is None:
+            # without the input signatures, we don't know the inputs until the first call
+            return
+        self._select_action.get_concrete_function()
+        self._inner_update.get_concrete_function()
+        self._fused_update.get_concrete_function()
+
+    def export(self, export_dir):
+        """
+        Export the action selection as a SavedModel, then `load_select_action` restores it without tracing
+        """
+        assert self._obs_shape is not None, "obs_shape is required to export the functions"
+        module = tf.Module()
+        module.actor = self.actor
+        module.select_action = self._select_action
+        tf.saved_model.save(module, export_dir,
+                            signatures={"select_action": self._select_action.get_concrete_function()})
+
+    def load_select_action(self, export_dir):
+        """ Replace the action selection by the one exported by `export` """
+        self._select_action = tf.saved_model.load(export_dir).select_action
+
+    def export_lite(self, export_path, quantize=None, representative_states=None):
+        """
+        Export the deterministic action selection as a TFLite flatbuffer for tf_rl.common.policy_server.PolicyServer
+
+        :param quantize: None, "dynamic" or "int8", see `export_policy`
+        :param representative_states: states to calibrate the int8 activations, e.g., sampled from the replay buffer
+        """
+        assert self._obs_shape is not None, "obs_shape is required to export the functions"
+        return export_policy(model=self.actor,
+                             obs_shape=self._obs_shape,
+                             export_path=export_path,
+                             quantize=quantize,
+                             representative_states=representative_states)
+
     def select_action(self, state):
         state = np.expand_dims(state, axis=0).astype(np.float32)
         action = self._select_action(tf.constant(state))
         return action.numpy()[0] + self.random_process.sample()
 
+    def select_actions(self, states):
+        """
+        select the actions for a batch of states(e.g., the observations of VectorEnv) by one forward pass
+        random_process has to generate the noise in the shape of (num_envs, num_action)
+        """
+        states = np.asarray(states, dtype=np.float32)
+        actions = self._select_action(tf.constant(states))
+        return actions.numpy() + self.random_process.sample()
+
     def select_action_eval(self, state):
         """ Deterministic behaviour """
         state = np.expand_dims(state, axis=0).astype(np.float32)
         action = self._select_action(tf.constant(state))
         return action.numpy()[0]
 
-    @tf.function
+    def select_actions_eval(self, states):
+        """ Batched version of `select_action_eval`, e.g., for tf_rl.common.evaluator.run_episodes """
+        states = np.asarray(states, dtype=np.float32)
+        actions = self._select_action(tf.constant(states))
+        return actions.numpy()
+
     def _select_action(self, state):
         return self.actor(state)
 
@@ -64,7 +151,27 @@ class DDPG(object):
         dones = np.array(dones, dtype=np.float32)
         return self._inner_update(states, actions, rewards, next_states, dones)
 
-    @tf.function
+    def update_fused(self, states, actions, rewards, next_states, dones, tau):
+        """
+        `update` followed by the soft update of the target actor and critic in a single compiled call,
+        so that a training step costs one Python dispatch instead of three
+
+        :param tau: coefficient of the Polyak averaging, it is fed as a tensor so that a new value doesn't retrace
+        """
+        states = np.array(states, dtype=np.float32)
+        next_states = np.array(next_states, dtype=np.float32)
+        actions = np.array(actions, dtype=np.float32)
+        rewards = np.array(rewards, dtype=np.float32)
+        dones = np.array(dones, dtype=np.float32)
+        return self._fused_update(states, actions, rewards, next_states, dones, tf.constant(tau, dtype=tf.float32))
+
+    def _fused_update(self, states, actions, rewards, next_states, dones, tau):
+        loss = self._inner_update(states, actions, rewards, next_states, dones)
+        # the automatic control dependencies of tf.function run the assignments after the gradient steps
+        soft_target_model_update_graph(self.target_actor, self.actor, tau=tau)
+        soft_target_model_update_graph(self.target_critic, self.critic, tau=tau)
+        return loss
+
     def _inner_update(self, states, actions, rewards, next_states, dones):
         self.global_ts = tf.compat.v1.train.get_global_step()
         # Update Critic
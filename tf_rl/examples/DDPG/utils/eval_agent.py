@@ -26,3 +26,4 @@ def eval_Agent(agent, env, n_trial=1, log_dir=None, google_colab=False):
 
     if google_colab: transfer_log_dirs(log_dir)
     return np.array([all_rewards]).mean()
+
@@ -4,26 +4,12 @@ import itertools
 import tensorflow as tf
 import numpy as np
 from tf_rl.common.to_markdown import params_to_markdown
-from tf_rl.common.utils import logger
+from tf_rl.common.utils import logger, num_crossed
+from tf_rl.common.vec_env import VectorEnv
+from tf_rl.common.evaluator import final_eval
 from tf_rl.examples.DDPG.utils.eval_agent import eval_Agent
 
 
-@tf.function
-def soft_target_model_update_eager(target, source, tau=1e-2):
-    """
-    Soft update model parameters.
-    target = tau * source + (1 - tau) * target
-
-    :param main:
-    :param target:
-    :param tau:
-    :return:
-    """
-
-    for param, target_param in zip(source.weights, target.weights):
-        target_param.assign(tau * param + (1 - tau) * target_param)
-
-
 def train(agent,
           env,
           replay_buffer,
@@ -37,13 +23,22 @@ def train(agent,
           batch_size,
           interval_MAR,
           log_dir,
-          google_colab):
+          google_colab,
+          eval_env=None,
+          eval_vec_env=None):
+    if isinstance(env, VectorEnv):
+        return train_vec(agent, env, replay_buffer, reward_buffer, summary_writer, num_eval_episodes, num_frames, tau,
+                         eval_interval, hot_start, batch_size, interval_MAR, log_dir, google_colab, eval_env,
+                         eval_vec_env)
+
     time_buffer = list()
     log = logger(num_frames=num_frames, interval_MAR=interval_MAR)
     with summary_writer.as_default():
         tf.compat.v2.summary.text(name="Hyper-params",
                                   data=params_to_markdown(gin.operative_config_str()),
                                   step=0)
+        # trace the tf.functions in the context of the summary writer before the first env-step
+        agent.warmup()
         for epoch in itertools.count():
             state = env.reset()
             total_reward = 0
@@ -66,11 +61,7 @@ def train(agent,
                 """
                 if agent.global_ts.numpy() > hot_start:
                     states, actions, rewards, next_states, dones = replay_buffer.sample(batch_size)
-                    loss = agent.update(states, actions, rewards, next_states, dones)
-                    soft_target_model_update_eager(agent.target_actor, agent.actor,
-                                                   tau=tau)
-                    soft_target_model_update_eager(agent.target_critic, agent.critic,
-                                                   tau=tau)
+                    loss = agent.update_fused(states, actions, rewards, next_states, dones, tau=tau)
 
                 agent.global_ts.assign_add(1)
                 episode_len += 1
@@ -107,6 +98,9 @@ def train(agent,
                             epsilon=0)
                 time_buffer = list()
 
+            # the number of traces should stay the same after warmup, otherwise the inputs cause the retracing
+            tf.compat.v2.summary.scalar("agent/num_traces", sum(agent.num_traces.values()), step=ts)
+
             if agent.eval_flg:
                 score = eval_Agent(agent, env, log_dir=log_dir, google_colab=google_colab)
                 tf.compat.v2.summary.scalar("eval/Score", score, step=ts)
@@ -115,7 +109,127 @@ def train(agent,
             # check the stopping condition
             if ts >= num_frames:
                 print("=== Training is Done ===")
-                score = eval_Agent(agent, env, n_trial=num_eval_episodes, log_dir=log_dir, google_colab=google_colab)
+                # scale for execution in env (in DDPG, every action is clipped between [-1, 1] in agent.predict)
+                score = final_eval(eval_Agent, agent,
+                                   lambda states: agent.select_actions_eval(states) * eval_vec_env.action_space.high,
+                                   env, eval_vec_env, num_eval_episodes, log_dir, google_colab)
+                tf.compat.v2.summary.scalar("eval/Score", score, step=ts)
+                env.close()
+                break
+
+
+def train_vec(agent,
+              env,
+              replay_buffer,
+              reward_buffer,
+              summary_writer,
+              num_eval_episodes,
+              num_frames,
+              tau,
+              eval_interval,
+              hot_start,
+              batch_size,
+              interval_MAR,
+              log_dir,
+              google_colab,
+              eval_env,
+              eval_vec_env=None):
+    """
+    Training loop on VectorEnv
+
+    the actions of all the envs are selected by one forward pass and a step pushes `num_envs` transitions.
+    As in `train`, we update the models once per env-step so that a step of VectorEnv performs `num_envs` updates.
+    """
+    assert eval_env is not None, "VectorEnv can't be used for evaluation, please give a single env as eval_env"
+    num_episodes = 0
+    log = logger(num_frames=num_frames, interval_MAR=interval_MAR)
+    with summary_writer.as_default():
+        tf.compat.v2.summary.text(name="Hyper-params",
+                                  data=params_to_markdown(gin.operative_config_str()),
+                                  step=0)
+        # trace the tf.functions in the context of the summary writer before the first env-step
+        agent.warmup()
+        states = env.reset()
+        total_rewards = np.zeros(env.num_envs)
+        start = np.full(env.num_envs, time.time())
+        agent.random_process.reset_states()
+        log_start = time.time()
+        while True:
+            if agent.global_ts.numpy() < hot_start:
+                actions = env.sample_actions()
+            else:
+                actions = agent.select_actions(states)
+
+            # scale for execution in env (in DDPG, every action is clipped between [-1, 1] in agent.predict)
+            next_states, rewards, dones, infos = env.step(actions * env.action_space.high)
+            for i in range(env.num_envs):
+                # the env has already been reset so that we store the last state of the finished episode
+                next_state = infos[i]["terminal_observation"] if dones[i] else next_states[i]
+                replay_buffer.add(states[i], actions[i], rewards[i], next_state, dones[i])
+
+            """
+            === Update the models
+            """
+            prev_ts = agent.global_ts.numpy()
+            if prev_ts > hot_start:
+                for _ in range(env.num_envs):
+                    states_b, actions_b, rewards_b, next_states_b, dones_b = replay_buffer.sample(batch_size)
+                    agent.update_fused(states_b, actions_b, rewards_b, next_states_b, dones_b, tau=tau)
+
+            agent.global_ts.assign_add(env.num_envs)
+            ts = agent.global_ts.numpy()
+            total_rewards += rewards
+            states = next_states
+
+            # for evaluation purpose
+            if num_crossed(prev_ts, ts, eval_interval) > 0:
+                agent.eval_flg = True
+
+            """
+            ===== After an Episode of an env is Done =====
+            """
+            for i in np.where(dones)[0]:
+                tf.compat.v2.summary.scalar("train/reward", total_rewards[i], step=ts)
+                tf.compat.v2.summary.scalar("train/exec_time", time.time() - start[i], step=ts)
+                if ts > hot_start:
+                    tf.compat.v2.summary.scalar("train/MAR", np.mean(reward_buffer), step=ts)
+
+                # store the episode related variables
+                reward_buffer.append(total_rewards[i])
+                total_rewards[i] = 0
+                start[i] = time.time()
+                agent.random_process.reset_states(i)
+
+            if np.any(dones):
+                # save the updated models
+                agent.actor_manager.save()
+                agent.critic_manager.save()
+
+            prev_num_episodes = num_episodes
+            num_episodes += np.sum(dones)
+            if ts > hot_start and num_crossed(prev_num_episodes, num_episodes, interval_MAR) > 0:
+                log.logging(time_step=ts,
+                            exec_time=time.time() - log_start,
+                            reward_buffer=reward_buffer,
+                            epsilon=0)
+                log_start = time.time()
+
+            if np.any(dones):
+                tf.compat.v2.summary.scalar("agent/num_traces", sum(agent.num_traces.values()), step=ts)
+
+            if agent.eval_flg:
+                score = eval_Agent(agent, eval_env, log_dir=log_dir, google_colab=google_colab)
+                tf.compat.v2.summary.scalar("eval/Score", score, step=ts)
+                agent.eval_flg = False
+
+            # check the stopping condition
+            if ts >= num_frames:
+                print("=== Training is Done ===")
+                # scale for execution in env (in DDPG, every action is clipped between [-1, 1] in agent.predict)
+                score = final_eval(eval_Agent, agent,
+                                   lambda states: agent.select_actions_eval(states) * eval_vec_env.action_space.high,
+                                   eval_env, eval_vec_env, num_eval_episodes, log_dir, google_colab)
                 tf.compat.v2.summary.scalar("eval/Score", score, step=ts)
                 env.close()
+                eval_env.close()
                 break
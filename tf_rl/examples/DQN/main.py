@@ -5,16 +5,18 @@ import numpy as np
 import tensorflow as tf
 import functools
 from collections import deque
-from tf_rl.common.memory import ReplayBuffer
+from tf_rl.common.memory import ReplayBuffer, FrameReplayBuffer
 from tf_rl.common.utils import gradient_clip_fn
-from tf_rl.common.eager_util import eager_setup
+from tf_rl.common.eager_util import eager_setup, set_execution_mode
 from tf_rl.common.set_up import set_up_for_training
 from tf_rl.common.monitor import Monitor
 from tf_rl.common.wrappers import wrap_deepmind, make_atari
-from tf_rl.examples.DQN.utils.policy import EpsilonGreedyPolicy_eager
+from tf_rl.common.vec_env import make_vec_env
+from tf_rl.examples.DQN.utils.policy import EpsilonGreedyPolicy_eager, EpsilonGreedyPolicy_graph, \
+    EpsilonGreedyPolicy_actor
 from tf_rl.examples.DQN.utils.network import atari_net, cartpole_net
 from tf_rl.examples.DQN.utils.agent import dqn_agent
-from tf_rl.examples.DQN.utils.train import train
+from tf_rl.examples.DQN.utils.train import train, train_actors
 
 
 def prep_env(env_name, video_path):
@@ -29,6 +31,22 @@ def prep_env(env_name, video_path):
     return env
 
 
+def prep_env_fn(env_name):
+    """ the envs for training are not recorded, the one for evaluation is created by prep_env """
+    if env_name.lower() == "cartpole":
+        env_fn = lambda: gym.make("CartPole-v0")
+    else:
+        env_fn = lambda: wrap_deepmind(make_atari(env_name + "NoFrameskip-v4"), frame_stack=True)
+    return env_fn
+
+
+def prep_vec_env(env_name, num_envs, flg_subproc_env, flg_shmem_env, seed):
+    env = make_vec_env(env_fn=prep_env_fn(env_name), num_envs=num_envs, flg_subproc=flg_subproc_env,
+                       flg_shmem=flg_shmem_env)
+    env.seed(seed)
+    return env
+
+
 def prep_obs_processor(env_name):
     if env_name.lower() == "cartpole":
         obs_prc_fn = lambda x: x
@@ -37,6 +55,15 @@ def prep_obs_processor(env_name):
     return obs_prc_fn
 
 
+def prep_memory(env_name, memory_size, traj_dir, flg_frame_memory):
+    if env_name.lower() != "cartpole" and flg_frame_memory:
+        # store each frame once and rebuild the stacked frames at sample time
+        replay_buffer = FrameReplayBuffer(memory_size, traj_dir=traj_dir)
+    else:
+        replay_buffer = ReplayBuffer(memory_size, traj_dir=traj_dir)
+    return replay_buffer
+
+
 def prep_model(env_name, network_type=None):
     if env_name.lower() == "cartpole":
         model = cartpole_net
@@ -45,6 +72,25 @@ def prep_model(env_name, network_type=None):
     return model
 
 
+def prep_actor_fn(env_name, network_type, num_action, obs_shape, eps_start, eps_end, decay_steps):
+    """ actor_fn of ActorLearner, it is called in the actor processes """
+    model = prep_model(env_name, network_type=network_type)
+    obs_prc_fn = prep_obs_processor(env_name)
+
+    def actor_fn():
+        main_model = model(num_action)
+        # build the model before the weights are set, the first actions may be random ones
+        main_model(np.zeros((1,) + tuple(obs_shape), dtype=np.float32))
+        return main_model, EpsilonGreedyPolicy_actor(model=main_model,
+                                                     num_action=num_action,
+                                                     obs_prc_fn=obs_prc_fn,
+                                                     eps_start=eps_start,
+                                                     eps_end=eps_end,
+                                                     decay_steps=decay_steps)
+
+    return actor_fn
+
+
 @gin.configurable
 def train_eval(log_dir="DQN",
                prev_log="",
@@ -52,10 +98,18 @@ def train_eval(log_dir="DQN",
                seed=123,
                gpu_id=0,
                env_name="CartPole",
+               num_envs=1,
+               flg_subproc_env=True,
+               flg_shmem_env=False,
+               num_eval_envs=1,
+               num_actors=0,
+               broadcast_interval=100,
+               max_staleness=None,
                network_type="fast",
                eps_start=1.0,
                eps_end=0.02,
                decay_steps=3000,
+               flg_graph_policy=True,
                optimizer=tf.keras.optimizers.RMSprop,
                learning_rate=0.00025,
                decay=0.95,
@@ -67,6 +121,7 @@ def train_eval(log_dir="DQN",
                num_frames=10000,
                train_freq=1,
                memory_size=5000,
+               flg_frame_memory=False,
                hot_start=100,
                sync_freq=1000,
                batch_size=32,
@@ -83,6 +138,9 @@ def train_eval(log_dir="DQN",
     # instantiate annealing funcs for ep
     anneal_ep = tf.compat.v1.train.polynomial_decay(eps_start, global_timestep, decay_steps, eps_end)
 
+    # the graph policy selects the actions in the same tf.function as the forward pass
+    policy = EpsilonGreedyPolicy_graph if flg_graph_policy else EpsilonGreedyPolicy_eager
+
     # prep for training
     log_dir = set_up_for_training(env_name=env_name,
                                   seed=seed,
@@ -91,36 +149,102 @@ def train_eval(log_dir="DQN",
                                   prev_log=prev_log,
                                   google_colab=google_colab)
     env = prep_env(env_name=env_name, video_path=log_dir["video_path"])
-    replay_buffer = ReplayBuffer(memory_size, traj_dir=log_dir["traj_path"])
+    assert num_envs == 1 or num_actors == 0, "VectorEnv and the actors can't be used together"
+    if num_envs > 1:
+        # FrameReplayBuffer assumes that the frames of an episode come in order
+        assert not flg_frame_memory, "FrameReplayBuffer can't be used with the vectorised envs"
+        eval_env, env = env, prep_vec_env(env_name=env_name,
+                                          num_envs=num_envs,
+                                          flg_subproc_env=flg_subproc_env,
+                                          flg_shmem_env=flg_shmem_env,
+                                          seed=seed)
+    elif num_actors > 0:
+        # the actor processes create their own envs, so that env is used only for evaluation
+        assert not flg_frame_memory, "FrameReplayBuffer can't be used with the actors"
+        eval_env = env
+    else:
+        eval_env = None
+    if num_eval_envs > 1:
+        # the episodes of the final evaluation run concurrently on these envs
+        eval_vec_env = prep_vec_env(env_name=env_name,
+                                    num_envs=num_eval_envs,
+                                    flg_subproc_env=flg_subproc_env,
+                                    flg_shmem_env=flg_shmem_env,
+                                    seed=seed + num_envs)
+    else:
+        eval_vec_env = None
+    replay_buffer = prep_memory(env_name=env_name,
+                                memory_size=memory_size,
+                                traj_dir=log_dir["traj_path"],
+                                flg_frame_memory=flg_frame_memory)
     reward_buffer = deque(maxlen=interval_MAR)
     summary_writer = tf.compat.v2.summary.create_file_writer(log_dir["summary_path"])
 
+    # XLA and mixed precision are opt-in via gin, the networks read the mode when they are built
+    set_execution_mode()
+
     agent = dqn_agent(model=prep_model(env_name, network_type=network_type),
-                      policy=EpsilonGreedyPolicy_eager(num_action=env.action_space.n, epsilon_fn=anneal_ep),
+                      policy=policy(num_action=env.action_space.n, epsilon_fn=anneal_ep),
                       optimizer=optimizer(learning_rate, decay, momentum, epsilon, centered),
                       loss_fn=loss_fn,
                       grad_clip_fn=gradient_clip_fn(flag=grad_clip_flg),
                       num_action=env.action_space.n,
                       model_dir=log_dir["model_path"],
                       gamma=gamma,
-                      obs_prc_fn=prep_obs_processor(env_name))
-
-    train(global_timestep,
-          agent,
-          env,
-          replay_buffer,
-          reward_buffer,
-          summary_writer,
-          num_eval_episodes,
-          num_frames,
-          eval_interval,
-          hot_start,
-          train_freq,
-          batch_size,
-          sync_freq,
-          interval_MAR,
-          log_dir,
-          google_colab)
+                      obs_prc_fn=prep_obs_processor(env_name),
+                      obs_shape=env.observation_space.shape,
+                      batch_size=batch_size)
+
+    if num_actors > 0:
+        # the actors anneal epsilon over their own env-steps, which sum up to the global time-step
+        actor_fn = prep_actor_fn(env_name=env_name,
+                                 network_type=network_type,
+                                 num_action=env.action_space.n,
+                                 obs_shape=env.observation_space.shape,
+                                 eps_start=eps_start,
+                                 eps_end=eps_end,
+                                 decay_steps=max(decay_steps // num_actors, 1))
+        train_actors(global_timestep,
+                     agent,
+                     prep_env_fn(env_name),
+                     actor_fn,
+                     replay_buffer,
+                     reward_buffer,
+                     summary_writer,
+                     num_eval_episodes,
+                     num_frames,
+                     eval_interval,
+                     hot_start,
+                     train_freq,
+                     batch_size,
+                     sync_freq,
+                     num_actors,
+                     broadcast_interval,
+                     max_staleness,
+                     seed,
+                     log_dir,
+                     google_colab,
+                     eval_env,
+                     eval_vec_env)
+    else:
+        train(global_timestep,
+              agent,
+              env,
+              replay_buffer,
+              reward_buffer,
+              summary_writer,
+              num_eval_episodes,
+              num_frames,
+              eval_interval,
+              hot_start,
+              train_freq,
+              batch_size,
+              sync_freq,
+              interval_MAR,
+              log_dir,
+              google_colab,
+              eval_env,
+              eval_vec_env)
 
 
 def main(gin_file, gin_params, log_dir, prev_log, google_colab):
@@ -1,6 +1,10 @@
 import numpy as np
 import tensorflow as tf
+from collections import Counter
 from tf_rl.common.utils import create_checkpoint
+from tf_rl.common.policy_server import export_policy
+from tf_rl.common.eager_util import traced_function, compiled_function, xla_enabled
+from tf_rl.examples.DQN.utils.policy import GraphPolicy
 
 
 class dqn_agent(object):
@@ -14,7 +18,14 @@ class dqn_agent(object):
                  obs_prc_fn,
                  num_action,
                  model_dir,
-                 gamma):
+                 gamma,
+                 obs_shape=None,
+                 batch_size=None):
+        """
+        :param obs_shape: shape of an observation, if given, the input signatures of the tf.functions are fixed
+                          so that they are traced only once(see `warmup`)
+        :param batch_size: batch size of the update, None allows any batch size at the cost of the retracing
+        """
         self._gamma = gamma
         self._grad_clip_fn = grad_clip_fn
         self._loss_fn = loss_fn
@@ -32,20 +43,113 @@ class dqn_agent(object):
                                          optimizer=self._optimizer,
                                          model_dir=model_dir)
 
+        # === Compile the tf.functions ===
+        # the number of the traces of each function, it should stay at 1 after `warmup`
+        self.num_traces = Counter()
+        self._obs_shape = obs_shape
+        self._batch_size = batch_size
+        if obs_shape is None:
+            select_action_signature, explore_signature, update_signature = None, None, None
+        else:
+            # the batch dim of the action selection is free since VectorEnv feeds a batch of states
+            select_action_signature = [tf.TensorSpec(shape=(None,) + tuple(obs_shape), dtype=tf.float32)]
+            explore_signature = select_action_signature + [tf.TensorSpec(shape=(), dtype=tf.float32)]
+            update_signature = [tf.TensorSpec(shape=(batch_size,) + tuple(obs_shape), dtype=tf.float32),
+                                tf.TensorSpec(shape=(batch_size,), dtype=tf.int32),
+                                tf.TensorSpec(shape=(batch_size,), dtype=tf.float32),
+                                tf.TensorSpec(shape=(batch_size,) + tuple(obs_shape), dtype=tf.float32),
+                                tf.TensorSpec(shape=(batch_size,), dtype=tf.float32)]
+        self._select_action = traced_function(self._select_action, select_action_signature, self.num_traces)
+        self._update = traced_function(self._update, update_signature, self.num_traces)
+        if xla_enabled():
+            # the summaries can't be compiled by XLA, so that only the gradient step inside `_update` is
+            self._train_step = compiled_function(self._train_step, jit_compile=True)
+
+        # the policy composed of TF ops is compiled into the action selection
+        self._flg_graph_policy = isinstance(policy, GraphPolicy)
+        if self._flg_graph_policy:
+            self._explore = traced_function(self._explore, explore_signature, self.num_traces)
+
+    def warmup(self):
+        """
+        Trace the tf.functions before the first env-step so that the training doesn't stall in the middle
+        Make sure to call this in the context of the summary writer, otherwise the summaries in `_update` are lost
+        """
+        if self._obs_shape is None:
+            # without the input signatures, we don't know the inputs until the first call
+            return
+        self._select_action.get_concrete_function()
+        self._update.get_concrete_function()
+        if self._flg_graph_policy:
+            self._explore.get_concrete_function()
+
+    def export(self, export_dir):
+        """
+        Export the action selection as a SavedModel, then `load_select_action` restores it without tracing
+        """
+        assert self._obs_shape is not None, "obs_shape is required to export the functions"
+        module = tf.Module()
+        module.main_model = self.main_model
+        module.select_action = self._select_action
+        tf.saved_model.save(module, export_dir,
+                            signatures={"select_action": self._select_action.get_concrete_function()})
+
+    def load_select_action(self, export_dir):
+        """ Replace the action selection by the one exported by `export` """
+        self._select_action = tf.saved_model.load(export_dir).select_action
+
+    def export_lite(self, export_path, quantize=None, representative_states=None):
+        """
+        Export the greedy action selection as a TFLite flatbuffer for tf_rl.common.policy_server.PolicyServer
+        The server takes the observations processed by `obs_prc_fn`
+
+        :param quantize: None, "dynamic" or "int8", see `export_policy`
+        :param representative_states: states to calibrate the int8 activations, e.g., sampled from the replay buffer
+        """
+        assert self._obs_shape is not None, "obs_shape is required to export the functions"
+        return export_policy(model=self.main_model,
+                             obs_shape=self._obs_shape,
+                             export_path=export_path,
+                             output_fn=lambda q_values: tf.math.argmax(q_values, axis=-1, output_type=tf.int32),
+                             quantize=quantize,
+                             representative_states=representative_states)
+
     def select_action(self, state):
         state = np.expand_dims(self._obs_prc_fn(state), axis=0).astype(np.float32)
+        if self._flg_graph_policy:
+            return self._explore(tf.constant(state), self.policy.epsilon()).numpy()[0]
         action = self.policy.select_action(q_value_fn=self._select_action, state=state)
         return action
 
+    def select_actions(self, states):
+        """ select the actions for a batch of states(e.g., the observations of VectorEnv) by one forward pass """
+        states = np.asarray(self._obs_prc_fn(states), dtype=np.float32)
+        if self._flg_graph_policy:
+            return self._explore(tf.constant(states), self.policy.epsilon()).numpy()
+        actions = self.policy.select_actions(q_value_fn=self._select_action, states=states)
+        return actions
+
     def select_action_eval(self, state, epsilon):
         state = np.expand_dims(self._obs_prc_fn(state), axis=0).astype(np.float32)
+        if self._flg_graph_policy:
+            return self._explore(tf.constant(state), tf.constant(epsilon, dtype=tf.float32)).numpy()[0]
         action = self.policy.select_action(q_value_fn=self._select_action, state=state, epsilon=epsilon)
         return action
 
-    @tf.function
+    def select_actions_eval(self, states, epsilon):
+        """ Batched version of `select_action_eval`, e.g., for tf_rl.common.evaluator.run_episodes """
+        states = np.asarray(self._obs_prc_fn(states), dtype=np.float32)
+        if self._flg_graph_policy:
+            return self._explore(tf.constant(states), tf.constant(epsilon, dtype=tf.float32)).numpy()
+        actions = self.policy.select_actions(q_value_fn=self._select_action, states=states, epsilon=epsilon)
+        return actions
+
     def _select_action(self, state):
         return self.main_model(state)
 
+    def _explore(self, states, epsilon):
+        return self.policy.explore(self.main_model(states), epsilon)
+
     def update(self, states, actions, rewards, next_states, dones):
         states = np.array(states, dtype=np.float32)  # batch_size x w x h x c
         next_states = np.array(next_states, dtype=np.float32)  # batch_size x w x h x c
@@ -55,8 +159,25 @@ class dqn_agent(object):
         states, next_states = self._obs_prc_fn(states), self._obs_prc_fn(next_states)
         return self._update(states, actions, rewards, next_states, dones)
 
-    @tf.function
     def _update(self, states, actions, rewards, next_states, dones):
+        td_error, q_tp1, q_t, td_target = self._train_step(states, actions, rewards, next_states, dones)
+
+        # get the current global time-step
+        ts = self._timestep = tf.compat.v1.train.get_global_step()
+
+        # visualise the weights in layers
+        # for layer_id in range(len(self.main_model.trainable_variables)):
+        #     layer = self.main_model.trainable_variables[layer_id]
+        #     tf.compat.v2.summary.histogram("agent/{}".format(layer.name.split("/")[1]), layer, step=ts)
+
+        tf.compat.v2.summary.scalar("agent/loss_td_error", td_error, step=ts)
+        tf.compat.v2.summary.scalar("agent/mean_diff_q_tp1_q_t", tf.math.reduce_mean(q_tp1 - q_t), step=ts)
+        tf.compat.v2.summary.scalar("agent/mean_td_target", tf.math.reduce_mean(td_target), step=ts)
+        tf.compat.v2.summary.scalar("agent/mean_q_tp1", tf.math.reduce_mean(q_tp1), step=ts)
+        tf.compat.v2.summary.scalar("agent/mean_q_t", tf.math.reduce_mean(q_t), step=ts)
+        tf.compat.v2.summary.scalar("train/Eps", self.policy._epsilon_fn(), step=ts)
+
+    def _train_step(self, states, actions, rewards, next_states, dones):
         # ===== make sure to fit all process to compute gradients within this Tape context!! =====
         with tf.GradientTape() as tape:
             q_tp1 = self.target_model(next_states)  # batch_size x num_action
@@ -65,7 +186,8 @@ class dqn_agent(object):
             td_target = tf.stop_gradient(td_target)
 
             # get the q-values which is associated with actually taken actions in a game
-            idx = tf.concat([tf.expand_dims(tf.range(0, actions.shape[0]), 1), tf.expand_dims(actions, 1)], axis=-1)
+            idx = tf.concat([tf.expand_dims(tf.range(0, tf.shape(actions)[0]), 1), tf.expand_dims(actions, 1)],
+                            axis=-1)
             chosen_q = tf.gather_nd(q_t, idx)  # (batch_size,)
             td_error = self._loss_fn(td_target, chosen_q)  # scalar
 
@@ -77,18 +199,4 @@ class dqn_agent(object):
 
         # apply processed gradients to the network
         self._optimizer.apply_gradients(zip(grads, self.main_model.trainable_variables))
-
-        # get the current global time-step
-        ts = self._timestep = tf.compat.v1.train.get_global_step()
-
-        # visualise the weights in layers
-        # for layer_id in range(len(self.main_model.trainable_variables)):
-        #     layer = self.main_model.trainable_variables[layer_id]
-        #     tf.compat.v2.summary.histogram("agent/{}".format(layer.name.split("/")[1]), layer, step=ts)
-
-        tf.compat.v2.summary.scalar("agent/loss_td_error", td_error, step=ts)
-        tf.compat.v2.summary.scalar("agent/mean_diff_q_tp1_q_t", tf.math.reduce_mean(q_tp1 - q_t), step=ts)
-        tf.compat.v2.summary.scalar("agent/mean_td_target", tf.math.reduce_mean(td_target), step=ts)
-        tf.compat.v2.summary.scalar("agent/mean_q_tp1", tf.math.reduce_mean(q_tp1), step=ts)
-        tf.compat.v2.summary.scalar("agent/mean_q_t", tf.math.reduce_mean(q_t), step=ts)
-        tf.compat.v2.summary.scalar("train/Eps", self.policy._epsilon_fn(), step=ts)
+        return td_error, q_tp1, q_t, td_target
@@ -1,5 +1,6 @@
 import tensorflow as tf
 import functools
+from tf_rl.common.eager_util import conv_dtype
 
 """
 [Note] Weight/Bias Initialisation
@@ -54,17 +55,20 @@ class atari_net(tf.keras.Model):
         super(atari_net, self).__init__()
         if network_type == "nature":
             # Follows the original architecture
-            self.conv1 = tf.keras.layers.Conv2D(32, kernel_size=8, strides=8, activation='relu')
-            self.conv2 = tf.keras.layers.Conv2D(64, kernel_size=4, strides=2, activation='relu')
-            self.conv3 = tf.keras.layers.Conv2D(64, kernel_size=3, strides=1, activation='relu')
+            self.conv1 = tf.keras.layers.Conv2D(32, kernel_size=8, strides=8, activation='relu', dtype=conv_dtype())
+            self.conv2 = tf.keras.layers.Conv2D(64, kernel_size=4, strides=2, activation='relu', dtype=conv_dtype())
+            self.conv3 = tf.keras.layers.Conv2D(64, kernel_size=3, strides=1, activation='relu', dtype=conv_dtype())
             self.flat = tf.keras.layers.Flatten()
             self.fc1 = tf.keras.layers.Dense(256, activation='relu')
             self.pred = tf.keras.layers.Dense(num_action, activation='linear')
         elif network_type == "fast":
             # Follows the fast convergence architecture originated to PyTorch one!
-            self.conv1 = fast_converge_Conv2D(filters=32, kernel_size=8, strides=8, activation='relu')
-            self.conv2 = fast_converge_Conv2D(filters=64, kernel_size=4, strides=2, activation='relu')
-            self.conv3 = fast_converge_Conv2D(filters=64, kernel_size=3, strides=1, activation='relu')
+            self.conv1 = fast_converge_Conv2D(filters=32, kernel_size=8, strides=8, activation='relu',
+                                              dtype=conv_dtype())
+            self.conv2 = fast_converge_Conv2D(filters=64, kernel_size=4, strides=2, activation='relu',
+                                              dtype=conv_dtype())
+            self.conv3 = fast_converge_Conv2D(filters=64, kernel_size=3, strides=1, activation='relu',
+                                              dtype=conv_dtype())
             self.flat = tf.keras.layers.Flatten()
             self.fc1 = fast_converge_Dense(units=256, activation='relu')
             self.pred = fast_converge_Dense(units=num_action, activation='linear')
@@ -74,6 +78,7 @@ class atari_net(tf.keras.Model):
         x = self.conv1(inputs)
         x = self.conv2(x)
         x = self.conv3(x)
-        x = self.flat(x)
+        # the heads and the loss stay in float32 when the conv trunk runs in bfloat16
+        x = tf.cast(self.flat(x), tf.float32)
         x = self.fc1(x)
         return self.pred(x)
@@ -1,4 +1,5 @@
 import numpy as np
+import tensorflow as tf
 
 
 class EpsilonGreedyPolicy_eager:
@@ -17,6 +18,14 @@ class EpsilonGreedyPolicy_eager:
             action = np.argmax(q_values)
         return action
 
+    def select_actions(self, q_value_fn, states, epsilon=None):
+        """ Batched version of `select_action`, each state draws a random action independently """
+        _epsilon = self.current_epsilon() if epsilon is None else epsilon
+        actions = np.argmax(q_value_fn(states).numpy(), axis=-1)
+        flg_random = np.random.random(actions.shape[0]) < _epsilon
+        actions[flg_random] = np.random.randint(self._num_action, size=np.sum(flg_random))
+        return actions
+
     def current_epsilon(self):
         return self._epsilon_fn().numpy()
 
@@ -38,4 +47,93 @@ class EpsilonGreedyPolicy_torch:
         return action
 
     def current_epsilon(self, ts):
-        return self._epsilon_fn.get_value(ts)
\ No newline at end of file
+        return self._epsilon_fn.get_value(ts)
+
+
+class GraphPolicy(object):
+    """
+    boiler plate of a policy composed of TF ops
+
+    dqn_agent compiles `explore` into its action selection, so that the exploration runs in the same graph
+    as the forward pass of the model and only the integer actions are copied back to the host.
+    It takes a batch of states, hence a VectorEnv or a batched evaluation costs one call as well.
+    """
+
+    def __init__(self, num_action, epsilon_fn):
+        self._epsilon_fn = epsilon_fn
+        self._num_action = num_action
+
+    def explore(self, q_values, epsilon):
+        """
+        :param q_values: (batch_size, num_action)
+        :param epsilon: scalar tf.Tensor
+        :return: int32 actions in the shape of (batch_size,)
+        """
+        raise NotImplementedError
+
+    def epsilon(self):
+        """ epsilon of the annealing schedule as a tensor, so that it doesn't sync with the host """
+        return tf.cast(self._epsilon_fn(), dtype=tf.float32)
+
+    def current_epsilon(self):
+        return self._epsilon_fn().numpy()
+
+
+class EpsilonGreedyPolicy_graph(GraphPolicy):
+    """ Epsilon Greedy Policy compiled into the action selection of the agent """
+
+    def explore(self, q_values, epsilon):
+        batch_size = tf.shape(q_values)[0]
+        greedy_actions = tf.math.argmax(q_values, axis=-1, output_type=tf.int32)
+        random_actions = tf.random.uniform((batch_size,), maxval=self._num_action, dtype=tf.int32)
+        # each state draws a random action independently
+        return tf.where(tf.random.uniform((batch_size,)) < epsilon, random_actions, greedy_actions)
+
+
+class BoltzmannQPolicy_graph(GraphPolicy):
+    """
+    Boltzmann Q Policy compiled into the action selection of the agent
+
+    Original implementation: https://github.com/keras-rl/keras-rl/blob/master/rl/policy.py
+    epsilon is not used, but we keep the schedule for the summary
+    """
+
+    def __init__(self, num_action, epsilon_fn, tau=1., clip=(-500., 500.)):
+        super(BoltzmannQPolicy_graph, self).__init__(num_action=num_action, epsilon_fn=epsilon_fn)
+        self._tau = tau
+        self._clip = clip
+
+    def explore(self, q_values, epsilon):
+        # exp(x) / sum(exp(x)) of the original is the softmax so that we can sample from the logits directly
+        logits = tf.clip_by_value(q_values / self._tau, self._clip[0], self._clip[1])
+        return tf.cast(tf.squeeze(tf.random.categorical(logits, num_samples=1), axis=-1), dtype=tf.int32)
+
+
+class EpsilonGreedyPolicy_actor:
+    """
+    Epsilon Greedy Policy of an actor process of tf_rl.common.actor_learner.ActorLearner
+
+    An actor doesn't see the global time-step of the learner, so that epsilon is annealed linearly
+    over the env-steps of the actor itself.
+    """
+
+    def __init__(self, model, num_action, obs_prc_fn, eps_start, eps_end, decay_steps):
+        self._model = model
+        self._num_action = num_action
+        self._obs_prc_fn = obs_prc_fn
+        self._eps_start = eps_start
+        self._eps_end = eps_end
+        self._decay_steps = decay_steps
+        self._timestep = 0
+
+    def __call__(self, state):
+        _epsilon = self.current_epsilon()
+        self._timestep += 1
+        if np.random.random() < _epsilon:
+            return np.random.randint(self._num_action)
+        state = np.expand_dims(self._obs_prc_fn(state), axis=0).astype(np.float32)
+        return np.argmax(self._model(state).numpy()[0])
+
+    def current_epsilon(self):
+        frac = min(self._timestep / self._decay_steps, 1.0)
+        return self._eps_start + frac * (self._eps_end - self._eps_start)
@@ -4,7 +4,10 @@ import itertools
 import tensorflow as tf
 import numpy as np
 from tf_rl.common.to_markdown import params_to_markdown
-from tf_rl.common.utils import logger
+from tf_rl.common.utils import logger, num_crossed
+from tf_rl.common.vec_env import VectorEnv
+from tf_rl.common.actor_learner import ActorLearner, train_actor_learner
+from tf_rl.common.evaluator import final_eval
 from tf_rl.examples.DQN.utils.eval_agent import eval_Agent
 
 
@@ -23,13 +26,22 @@ def train(global_timestep,
           sync_freq,
           interval_MAR,
           log_dir,
-          google_colab):
+          google_colab,
+          eval_env=None,
+          eval_vec_env=None):
+    if isinstance(env, VectorEnv):
+        return train_vec(global_timestep, agent, env, replay_buffer, reward_buffer, summary_writer, num_eval_episodes,
+                         num_frames, eval_interval, hot_start, train_freq, batch_size, sync_freq, interval_MAR,
+                         log_dir, google_colab, eval_env, eval_vec_env)
+
     time_buffer = list()
     log = logger(num_frames=num_frames, interval_MAR=interval_MAR)
     with summary_writer.as_default():
         tf.compat.v2.summary.text(name="Hyper-params",
                                   data=params_to_markdown(gin.operative_config_str()),
                                   step=0)
+        # trace the tf.functions in the context of the summary writer before the first env-step
+        agent.warmup()
         for epoch in itertools.count():
             state = env.reset()
             total_reward = 0
@@ -80,6 +92,9 @@ def train(global_timestep,
                             epsilon=agent.policy.current_epsilon())
                 time_buffer = list()
 
+            # the number of traces should stay the same after warmup, otherwise the inputs cause the retracing
+            tf.compat.v2.summary.scalar("agent/num_traces", sum(agent.num_traces.values()), step=ts)
+
             if agent.eval_flg:
                 # replay_buffer.save()
                 score = eval_Agent(agent, env, log_dir=log_dir, google_colab=google_colab)
@@ -89,7 +104,205 @@ def train(global_timestep,
             # check the stopping condition
             if ts >= num_frames:
                 print("=== Training is Done ===")
-                score = eval_Agent(agent, env, n_trial=num_eval_episodes, log_dir=log_dir, google_colab=google_colab)
+                # epsilon-greedy for evaluation using a fixed epsilon of 0.05(Nature does this!)
+                score = final_eval(eval_Agent, agent, lambda states: agent.select_actions_eval(states, epsilon=0.05),
+                                   env, eval_vec_env, num_eval_episodes, log_dir, google_colab)
                 tf.compat.v2.summary.scalar("eval/Score", score, step=ts)
                 env.close()
                 break
+
+
+def train_vec(global_timestep,
+              agent,
+              env,
+              replay_buffer,
+              reward_buffer,
+              summary_writer,
+              num_eval_episodes,
+              num_frames,
+              eval_interval,
+              hot_start,
+              train_freq,
+              batch_size,
+              sync_freq,
+              interval_MAR,
+              log_dir,
+              google_colab,
+              eval_env,
+              eval_vec_env=None):
+    """
+    Training loop on VectorEnv
+
+    the actions of all the envs are selected by one forward pass and a step pushes `num_envs` transitions.
+    global_timestep counts the env-steps of all the envs, so that the ratio of the updates to the env-steps
+    (train_freq) and the other intervals are the same as `train`.
+    """
+    assert eval_env is not None, "VectorEnv can't be used for evaluation, please give a single env as eval_env"
+    num_episodes = 0
+    log = logger(num_frames=num_frames, interval_MAR=interval_MAR)
+    with summary_writer.as_default():
+        tf.compat.v2.summary.text(name="Hyper-params",
+                                  data=params_to_markdown(gin.operative_config_str()),
+                                  step=0)
+        # trace the tf.functions in the context of the summary writer before the first env-step
+        agent.warmup()
+        states = env.reset()
+        total_rewards = np.zeros(env.num_envs)
+        start = np.full(env.num_envs, time.time())
+        cnt_actions = [list() for _ in range(env.num_envs)]
+        log_start = time.time()
+        while True:
+            actions = agent.select_actions(states)
+            next_states, rewards, dones, infos = env.step(actions)
+            for i in range(env.num_envs):
+                # the env has already been reset so that we store the last state of the finished episode
+                next_state = infos[i]["terminal_observation"] if dones[i] else next_states[i]
+                replay_buffer.add(states[i], actions[i], rewards[i], next_state, dones[i])
+                cnt_actions[i].append(actions[i])
+
+            prev_ts = global_timestep.numpy()
+            global_timestep.assign_add(env.num_envs)
+            ts = global_timestep.numpy()
+            total_rewards += rewards
+            states = next_states
+
+            # for evaluation purpose
+            if num_crossed(prev_ts, ts, eval_interval) > 0:
+                agent.eval_flg = True
+
+            if ts > hot_start:
+                for _ in range(num_crossed(max(prev_ts, hot_start), ts, train_freq)):
+                    states_b, actions_b, rewards_b, next_states_b, dones_b = replay_buffer.sample(batch_size)
+                    agent.update(states_b, actions_b, rewards_b, next_states_b, dones_b)
+
+                # synchronise the target and main models by hard
+                if num_crossed(prev_ts, ts, sync_freq) > 0:
+                    agent.manager.save()
+                    agent.target_model.set_weights(agent.main_model.get_weights())
+
+            """
+            ===== After an Episode of an env is Done =====
+            """
+            for i in np.where(dones)[0]:
+                tf.compat.v2.summary.scalar("train/reward", total_rewards[i], step=ts)
+                tf.compat.v2.summary.scalar("train/exec_time", time.time() - start[i], step=ts)
+                if ts > hot_start:
+                    tf.compat.v2.summary.scalar("train/MAR", np.mean(reward_buffer), step=ts)
+                tf.compat.v2.summary.histogram("train/taken actions", cnt_actions[i], step=ts)
+
+                # store the episode reward
+                reward_buffer.append(total_rewards[i])
+                total_rewards[i] = 0
+                start[i] = time.time()
+                cnt_actions[i] = list()
+
+            prev_num_episodes = num_episodes
+            num_episodes += np.sum(dones)
+            if ts > hot_start and num_crossed(prev_num_episodes, num_episodes, interval_MAR) > 0:
+                log.logging(time_step=ts,
+                            exec_time=time.time() - log_start,
+                            reward_buffer=reward_buffer,
+                            epsilon=agent.policy.current_epsilon())
+                log_start = time.time()
+
+            if np.any(dones):
+                tf.compat.v2.summary.scalar("agent/num_traces", sum(agent.num_traces.values()), step=ts)
+
+            if agent.eval_flg:
+                score = eval_Agent(agent, eval_env, log_dir=log_dir, google_colab=google_colab)
+                tf.compat.v2.summary.scalar("eval/Score", score, step=ts)
+                agent.eval_flg = False
+
+            # check the stopping condition
+            if ts >= num_frames:
+                print("=== Training is Done ===")
+                # epsilon-greedy for evaluation using a fixed epsilon of 0.05(Nature does this!)
+                score = final_eval(eval_Agent, agent, lambda states: agent.select_actions_eval(states, epsilon=0.05),
+                                   eval_env, eval_vec_env, num_eval_episodes, log_dir, google_colab)
+                tf.compat.v2.summary.scalar("eval/Score", score, step=ts)
+                env.close()
+                eval_env.close()
+                break
+
+
+def train_actors(global_timestep,
+                 agent,
+                 env_fn,
+                 actor_fn,
+                 replay_buffer,
+                 reward_buffer,
+                 summary_writer,
+                 num_eval_episodes,
+                 num_frames,
+                 eval_interval,
+                 hot_start,
+                 train_freq,
+                 batch_size,
+                 sync_freq,
+                 num_actors,
+                 broadcast_interval,
+                 max_staleness,
+                 seed,
+                 log_dir,
+                 google_colab,
+                 eval_env,
+                 eval_vec_env=None):
+    """
+    Training loop on the actor-learner architecture, see tf_rl.common.actor_learner
+
+    the actor processes step their own envs and this process only updates the agent and broadcasts its weights.
+    global_timestep counts the transitions consumed by the updates, so that the ratio of the updates to the env-steps
+    (train_freq) and the other intervals are the same as `train`.
+    """
+    with summary_writer.as_default():
+        tf.compat.v2.summary.text(name="Hyper-params",
+                                  data=params_to_markdown(gin.operative_config_str()),
+                                  step=0)
+        # trace the tf.functions and build the model before its weights are shared with the actors
+        agent.warmup()
+        actor_learner = ActorLearner(env_fn=env_fn,
+                                     actor_fn=actor_fn,
+                                     weights=agent.main_model.get_weights(),
+                                     num_actors=num_actors,
+                                     max_staleness=max_staleness,
+                                     seed=seed)
+        # the first update comes after hot_start transitions
+        global_timestep.assign(hot_start)
+
+        def update_fn(states, actions, rewards, next_states, dones):
+            prev_ts = global_timestep.numpy()
+            global_timestep.assign_add(train_freq)
+            ts = global_timestep.numpy()
+            agent.update(states, actions, rewards, next_states, dones)
+
+            # synchronise the target and main models by hard
+            if num_crossed(prev_ts, ts, sync_freq) > 0:
+                agent.manager.save()
+                agent.target_model.set_weights(agent.main_model.get_weights())
+
+            # the actors keep collecting the transitions while the learner evaluates the agent
+            if num_crossed(prev_ts, ts, eval_interval) > 0:
+                if len(reward_buffer) > 0:
+                    tf.compat.v2.summary.scalar("train/MAR", np.mean(reward_buffer), step=ts)
+                tf.compat.v2.summary.scalar("train/staleness", actor_learner.staleness, step=ts)
+                score = eval_Agent(agent, eval_env, log_dir=log_dir, google_colab=google_colab)
+                tf.compat.v2.summary.scalar("eval/Score", score, step=ts)
+
+        num_updates = train_actor_learner(actor_learner,
+                                          replay_buffer,
+                                          update_fn=update_fn,
+                                          get_weights=agent.main_model.get_weights,
+                                          num_frames=num_frames,
+                                          batch_size=batch_size,
+                                          learning_start=hot_start,
+                                          train_freq=train_freq,
+                                          broadcast_interval=broadcast_interval,
+                                          reward_buffer=reward_buffer)
+
+        print("=== Training is Done ===")
+        print("Updates: {} | Dropped transitions: {}".format(num_updates, actor_learner.num_dropped))
+        # epsilon-greedy for evaluation using a fixed epsilon of 0.05(Nature does this!)
+        score = final_eval(eval_Agent, agent, lambda states: agent.select_actions_eval(states, epsilon=0.05),
+                           eval_env, eval_vec_env, num_eval_episodes, log_dir, google_colab)
+        tf.compat.v2.summary.scalar("eval/Score", score, step=global_timestep.numpy())
+        eval_env.close()
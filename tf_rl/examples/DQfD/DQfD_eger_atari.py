@@ -5,7 +5,7 @@ import tensorflow as tf
 from collections import deque
 from tf_rl.common.wrappers import wrap_deepmind, make_atari, MyWrapper
 from tf_rl.common.params import ENV_LIST_NATURE, Parameters
-from tf_rl.common.memory import PrioritizedReplayBuffer
+from tf_rl.common.memory import ColumnarPrioritizedReplayBuffer
 from tf_rl.common.utils import AnnealingSchedule, eager_setup, gradient_clip_fn, setup_on_colab
 from tf_rl.common.policy import EpsilonGreedyPolicy_eager
 from tf_rl.common.train import train_DQN_PER, pretrain_DQfD
@@ -43,7 +43,7 @@ parser.add_argument("--epsilon_start", default=1.0, type=float, help="initial va
 parser.add_argument("--epsilon_end", default=0.02, type=float, help="final value of epsilon")
 parser.add_argument("--decay_steps", default=3000, type=int, help="a period for annealing a value(epsilon or beta)")
 parser.add_argument("--decay_type", default="linear", help="types of annealing method => linear or curved")
-parser.add_argument("--n_step", default=10, help="number for n-step")
+parser.add_argument("--n_step", default=10, type=int, help="number for n-step")
 parser.add_argument("--L2_reg", default=0.005, type=float, help="magnitude of L2 regularisation")
 parser.add_argument("--log_dir", default="../../logs/logs/DQfD/", help="directory for log")
 parser.add_argument("--model_dir", default="../../logs/models/DQfD/", help="directory for trained model")
@@ -80,7 +80,7 @@ else:
 
 Epsilon = AnnealingSchedule(start=params.epsilon_start, end=params.epsilon_end, decay_steps=params.decay_steps)
 policy = EpsilonGreedyPolicy_eager(Epsilon_fn=Epsilon)
-replay_buffer = PrioritizedReplayBuffer(params.memory_size, alpha=params.alpha, n_step=params.n_step)
+replay_buffer = ColumnarPrioritizedReplayBuffer(params.memory_size, alpha=params.alpha, n_step=params.n_step)
 reward_buffer = deque(maxlen=params.reward_buffer_ep)
 anneal_lr = AnnealingSchedule(start=0.0025, end=0.00025, decay_steps=params.decay_steps, decay_type="linear")
 optimizer = tf.train.RMSPropOptimizer(anneal_lr.get_value(), 0.99, 0.0, 1e-6)
@@ -10,6 +10,8 @@ import numpy as np
 import tensorflow as tf
 import agent.init_path as init_path
 from util import utils
+from tf_rl.common.advantage import compute_gae, pad_paths, unpad, \
+    last_step_dones
 from network.baseline_network import tf_baseline_network
 from network.gated_graph_baseline_network import tf_ggnn_baseline_network
 from util import logger
@@ -598,46 +600,40 @@ class optimization_agent(base_agent):
                 # the predicted value function (baseline function)
                 path["baseline"] = self.baseline_network.predict(path)
 
-        # esitmate the advantages
+        # esitmate the advantages on the padded paths in one pass, each path
+        # ends with the terminal state
+        rewards, mask = pad_paths([path["rewards"] for path in data_dict])
+        baseline, _ = pad_paths([np.reshape(path["baseline"], [-1])
+                                 for path in data_dict])
         if self.args.advantage_method == 'raw':
-            for path in data_dict:
-                # the gamma discounted rollout value function
-                path["returns"] = utils.discount(path["rewards"],
-                                                 self.args.gamma)
-                path["advantage"] = path["returns"] - path["baseline"]
-                path['target_return'] = path['returns']
+            # the gamma discounted rollout value function
+            _, returns = compute_gae(rewards, baseline, last_step_dones(mask),
+                                     gamma=self.args.gamma, lam=1.0)
+            advantages = returns - baseline
+            target_returns = returns
         else:
             assert self.args.advantage_method == 'gae', logger.error(
                 'invalid advantage estimation method: {}'.format(
                     self.args.advantage_method
                 )
             )
-
-            for path in data_dict:
-                # the gamma discounted rollout value function
-                path["returns"] = utils.discount(path["rewards"],
-                                                 self.args.gamma)
-
-                # init the advantage
-                path["advantage"] = np.zeros(path['returns'].shape)
-
-                num_steps = len(path['returns'])
-
-                # generate the GAE advantage
-                for i_step in reversed(range(num_steps)):
-                    if i_step < num_steps - 1:
-                        delta = path['rewards'][i_step] \
-                            + self.args.gamma * path['baseline'][i_step + 1] \
-                            - path['baseline'][i_step]
-                        path['advantage'][i_step] = \
-                            delta + self.args.gamma * self.args.gae_lam \
-                            * path['advantage'][i_step + 1]
-                    else:
-                        delta = path['rewards'][i_step] \
-                            - path['baseline'][i_step]
-                        path['advantage'][i_step] = delta
-
-                path['target_return'] = path['advantage'] + path['baseline']
+            # generate the GAE advantage
+            advantages, returns = compute_gae(rewards, baseline,
+                                              last_step_dones(mask),
+                                              gamma=self.args.gamma,
+                                              lam=self.args.gae_lam)
+            target_returns = advantages + baseline
+
+        # split the valid steps back into the paths
+        split_ids = np.cumsum(mask.sum(axis=1))[:-1]
+        for path, path_returns, path_advantage, path_target_return in zip(
+                data_dict,
+                np.split(unpad(returns, mask), split_ids),
+                np.split(unpad(advantages, mask), split_ids),
+                np.split(unpad(target_returns, mask), split_ids)):
+            path["returns"] = path_returns
+            path["advantage"] = path_advantage
+            path['target_return'] = path_target_return
 
         # standardized advantage function
         advant_n = np.concatenate([path["advantage"] for path in data_dict])
@@ -6,11 +6,11 @@ import os
 from time import localtime, strftime
 
 from dotmap import DotMap
-from scipy.io import savemat
 from tqdm import trange
 
 from Agent import Agent
 from DotmapUtils import get_required_argument
+from TrajectoryLog import TrajectoryLogWriter
 
 
 class MBExperiment:
@@ -37,6 +37,7 @@ class MBExperiment:
                 .log_cfg:
                     .logdir (str): Parent of directory path where experiment data will be saved.
                         Experiment will be saved in logdir/<date+time of experiment start>
+                        and the rollouts in its subdirectory trajs, see TrajectoryLog.load_logs to read them.
                     .nrecord (int): (optional) Number of rollouts to record for every iteration.
                         Defaults to 0.
                     .neval (int): (optional) Number of rollouts for performance evaluation.
@@ -69,7 +70,8 @@ class MBExperiment:
         """
         os.makedirs(self.logdir, exist_ok=True)
 
-        traj_obs, traj_acs, traj_rets, traj_rews = [], [], [], []
+        # the rollouts are streamed into shards instead of rewriting logs.mat at every iteration
+        traj_log = TrajectoryLogWriter(os.path.join(self.logdir, "trajs"))
 
         # Perform initial rollouts
         samples = []
@@ -79,9 +81,7 @@ class MBExperiment:
                     self.task_hor, self.policy
                 )
             )
-            traj_obs.append(samples[-1]["obs"])
-            traj_acs.append(samples[-1]["ac"])
-            traj_rews.append(samples[-1]["rewards"])
+        traj_log.append(samples)
 
         if self.ninit_rollouts > 0:
             self.policy.train(
@@ -107,22 +107,11 @@ class MBExperiment:
                     )
                 )
             print("Rewards obtained:", [sample["reward_sum"] for sample in samples[:self.neval]])
-            traj_obs.extend([sample["obs"] for sample in samples[:self.nrollouts_per_iter]])
-            traj_acs.extend([sample["ac"] for sample in samples[:self.nrollouts_per_iter]])
-            traj_rets.extend([sample["reward_sum"] for sample in samples[:self.neval]])
-            traj_rews.extend([sample["rewards"] for sample in samples[:self.nrollouts_per_iter]])
+            returns = [sample["reward_sum"] for sample in samples[:self.neval]]
             samples = samples[:self.nrollouts_per_iter]
 
             self.policy.dump_logs(self.logdir, iter_dir)
-            savemat(
-                os.path.join(self.logdir, "logs.mat"),
-                {
-                    "observations": traj_obs,
-                    "actions": traj_acs,
-                    "returns": traj_rets,
-                    "rewards": traj_rews
-                }
-            )
+            traj_log.append(samples, returns=returns)
             # Delete iteration directory if not used
             if len(os.listdir(iter_dir)) == 0:
                 os.rmdir(iter_dir)
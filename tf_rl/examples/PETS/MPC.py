@@ -5,16 +5,16 @@ from __future__ import print_function
 import os
 
 import numpy as np
+import tensorflow as tf
 from scipy.io import savemat
 
 from DotmapUtils import get_required_argument
-from optimizers import CEMOptimizer
+from eager.optimizers_eager import CEMOptimizer, RandomOptimizer
+from eager.memory_eager import ModelDataset
 
 from tqdm import trange
 
-import torch
-
-TORCH_DEVICE = torch.device('cuda') if torch.cuda.is_available() else torch.device('cpu')
+PROP_MODES = ["E", "DS", "TSinf", "TS1", "MM"]
 
 
 class Controller:
@@ -50,7 +50,7 @@ def shuffle_rows(arr):
 
 
 class MPC(Controller):
-    optimizers = {"CEM": CEMOptimizer}
+    optimizers = {"CEM": CEMOptimizer, "Random": RandomOptimizer}
 
     def __init__(self, params):
         """Creates class instance.
@@ -64,12 +64,16 @@ class MPC(Controller):
                     Defaults to environment action lower bounds.
                 .per (int): (optional) Determines how often the action sequence will be optimized.
                     Defaults to 1 (reoptimizes at every call to act()).
+                .update_fns (list): (optional) Functions called at every reset, e.g., to update the goal
+                    read by the cost function.
                 .prop_cfg
                     .model_init_cfg (DotMap): A DotMap of initialization parameters for the model.
                         .model_constructor (func): A function which constructs an instance of this
                             model, given model_init_cfg.
                     .model_train_cfg (dict): (optional) A DotMap of training parameters that will be passed
                         into the model every time is is trained. Defaults to an empty dict.
+                        .epochs (int): (optional) Defaults to 5.
+                        .batch_size (int): (optional) Defaults to 32.
                     .model_pretrained (bool): (optional) If True, assumes that the model
                         has been trained upon construction.
                     .mode (str): Propagation method. Choose between [E, DS, TSinf, TS1, MM].
@@ -83,22 +87,22 @@ class MPC(Controller):
                     .obs_postproc (func): (optional) A function which returns vectors calculated from
                         the previous observations and model predictions, which will then be passed into
                         the provided cost function on observations. Defaults to lambda obs, model_out: model_out.
-                        Note: Must be able to process both NumPy and Tensorflow arrays.
+                        Note: Must be able to process Tensorflow arrays.
                     .obs_postproc2 (func): (optional) A function which takes the vectors returned by
                         obs_postproc and (possibly) modifies it into the predicted observations for the
                         next time step. Defaults to lambda obs: obs.
-                        Note: Must be able to process both NumPy and Tensorflow arrays.
+                        Note: Must be able to process Tensorflow arrays.
                     .targ_proc (func): (optional) A function which takes current observations and next
                         observations and returns the array of targets (so that the model learns the mapping
                         obs -> targ_proc(obs, next_obs)). Defaults to lambda obs, next_obs: next_obs.
                         Note: Only needs to process NumPy arrays.
                 .opt_cfg
-                    .mode (str): Internal optimizer that will be used. Choose between [CEM].
+                    .mode (str): Internal optimizer that will be used. Choose between [CEM, Random].
                     .cfg (DotMap): A map of optimizer initializer parameters.
                     .plan_hor (int): The planning horizon that will be used in optimization.
                     .obs_cost_fn (func): A function which computes the cost of every observation
                         in a 2D matrix.
-                        Note: Must be able to process both NumPy and Tensorflow arrays.
+                        Note: Must be able to process Tensorflow arrays.
                     .ac_cost_fn (func): A function which computes the cost of every action
                         in a 2D matrix.
                 .log_cfg
@@ -119,7 +123,7 @@ class MPC(Controller):
         self.update_fns = params.get("update_fns", [])
         self.per = params.get("per", 1)
 
-        self.model_init_cig = params.prop_cfg.get("model_init_cfg", {})
+        self.model_init_cfg = params.prop_cfg.get("model_init_cfg", {})
         self.model_train_cfg = params.prop_cfg.get("model_train_cfg", {})
         self.prop_mode = get_required_argument(params.prop_cfg, "mode", "Must provide propagation method.")
         self.npart = get_required_argument(params.prop_cfg, "npart", "Must provide number of particles.")
@@ -140,29 +144,29 @@ class MPC(Controller):
         self.log_particles = params.log_cfg.get("log_particles", False)
 
         # Perform argument checks
-        assert self.opt_mode == 'CEM'
-        assert self.prop_mode == 'TSinf', 'only TSinf propagation mode is supported'
-        assert self.npart % self.model_init_cig.num_nets == 0, "Number of particles must be a multiple of the ensemble size."
+        assert self.opt_mode in self.optimizers, "Unknown optimization method: %s" % self.opt_mode
+        assert self.prop_mode in PROP_MODES, "Unknown propagation method: %s" % self.prop_mode
+        assert self.prop_mode != "E" or self.npart == 1, "Expectation propagation uses a single particle."
+        assert self.prop_mode not in ["TS1", "TSinf"] or self.npart % self.model_init_cfg.num_nets == 0, \
+            "Number of particles must be a multiple of the ensemble size."
 
-        # Create action sequence optimizer
+        # Create action sequence optimizer, it keeps the warm-start of the next plan
         opt_cfg = params.opt_cfg.get("cfg", {})
-        self.optimizer = CEMOptimizer(
+        self.optimizer = self.optimizers[self.opt_mode](
             sol_dim=self.plan_hor * self.dU,
             lower_bound=np.tile(self.ac_lb, [self.plan_hor]),
             upper_bound=np.tile(self.ac_ub, [self.plan_hor]),
             cost_function=self._compile_cost,
+            action_dim=self.dU,
+            per=self.per,
             **opt_cfg
         )
 
         # Controller state variables
         self.has_been_trained = params.prop_cfg.get("model_pretrained", False)
         self.ac_buf = np.array([]).reshape(0, self.dU)
-        self.prev_sol = np.tile((self.ac_lb + self.ac_ub) / 2, [self.plan_hor])
-        self.init_var = np.tile(np.square(self.ac_ub - self.ac_lb) / 16, [self.plan_hor])
-        self.train_in = np.array([]).reshape(0, self.dU + self.obs_preproc(np.zeros([1, self.dO])).shape[-1])
-        self.train_targs = np.array([]).reshape(
-            0, self.targ_proc(np.zeros([1, self.dO]), np.zeros([1, self.dO])).shape[-1]
-        )
+        self.in_dim = self.dU + self.obs_preproc(np.zeros([1, self.dO])).shape[-1]
+        self.targ_dim = self.targ_proc(np.zeros([1, self.dO]), np.zeros([1, self.dO])).shape[-1]
 
         print("Created an MPC controller, prop mode %s, %d particles. " % (self.prop_mode, self.npart) +
               ("Ignoring variance." if self.ign_var else ""))
@@ -178,11 +182,24 @@ class MPC(Controller):
         else:
             print("Trajectory prediction logging is disabled.")
 
-        # Set up pytorch model
+        # Set up the dynamics model
         self.model = get_required_argument(
             params.prop_cfg.model_init_cfg, "model_constructor", "Must provide a model constructor."
         )(params.prop_cfg.model_init_cfg)
 
+        self.epochs = self.model_train_cfg.get("epochs", 5)
+        self.batch_size = self.model_train_cfg.get("batch_size", 32)
+        self.dataset = ModelDataset(in_features=self.in_dim,
+                                    out_features=self.targ_dim,
+                                    ensemble_size=self.model.ensemble_size)
+
+        # the batches are [ensemble_size, batch_size, features], the last batch of an epoch is smaller
+        self._train_step = tf.function(self._train_step_fn, input_signature=[
+            tf.TensorSpec(shape=(None, None, self.in_dim), dtype=tf.float32),
+            tf.TensorSpec(shape=(None, None, self.targ_dim), dtype=tf.float32)
+        ])
+        self._predict_trajs = tf.function(self._predict_trajs_fn)
+
     def train(self, obs_trajs, acs_trajs, rews_trajs):
         """Trains the internal model of this controller. Once trained,
         this controller switches from applying random actions to using MPC.
@@ -192,77 +209,62 @@ class MPC(Controller):
             acs_trajs: A list of action matrices, actions in rows.
             rews_trajs: A list of reward arrays.
 
-        Returns: None.
+        Returns: the loss of the last batch
         """
 
         # Construct new training points and add to training set
-        new_train_in, new_train_targs = [], []
         for obs, acs in zip(obs_trajs, acs_trajs):
-            new_train_in.append(np.concatenate([self.obs_preproc(obs[:-1]), acs], axis=-1))
-            new_train_targs.append(self.targ_proc(obs[:-1], obs[1:]))
-        self.train_in = np.concatenate([self.train_in] + new_train_in, axis=0)
-        self.train_targs = np.concatenate([self.train_targs] + new_train_targs, axis=0)
+            self.dataset.add(np.concatenate([self.obs_preproc(obs[:-1]), acs], axis=-1),
+                             self.targ_proc(obs[:-1], obs[1:]))
+        # an epoch over a non-empty dataset gives at least a batch, hence the loss to return
+        assert len(self.dataset) > 0 and self.epochs > 0, "Nothing to train the model on"
 
         # Train the model
         self.has_been_trained = True
+        self.model.fit_input_stats(self.dataset.inputs)
 
-        # Train the pytorch model
-        self.model.fit_input_stats(self.train_in)
-
-        idxs = np.random.randint(self.train_in.shape[0], size=[self.model.num_nets, self.train_in.shape[0]])
-
-        epochs = self.model_train_cfg['epochs']
+        # each member of the ensemble is trained on its own bootstrap of the data
+        idxs = self.dataset.bootstrap_idxs()
+        dataset = self.dataset.make_dataset(idxs, batch_size=self.batch_size)
 
-        # TODO: double-check the batch_size for all env is the same
-        batch_size = 32
-
-        epoch_range = trange(epochs, unit="epoch(s)", desc="Network training")
-        num_batch = int(np.ceil(idxs.shape[-1] / batch_size))
+        epoch_range = trange(self.epochs, unit="epoch(s)", desc="Network training")
 
         for _ in epoch_range:
+            for train_in, train_targ in dataset:
+                loss = self._train_step(train_in, train_targ)
 
-            for batch_num in range(num_batch):
-                batch_idxs = idxs[:, batch_num * batch_size : (batch_num + 1) * batch_size]
-
-                loss = 0.01 * (self.model.max_logvar.sum() - self.model.min_logvar.sum())
-                loss += self.model.compute_decays()
+            val_idxs = shuffle_rows(idxs)[:, :5000]
+            mean, _ = self.model(self.dataset.inputs[val_idxs])
+            mse_losses = tf.math.reduce_mean((mean - self.dataset.targets[val_idxs]) ** 2, axis=[1, 2])
 
-                # TODO: move all training data to GPU before hand
-                train_in = torch.from_numpy(self.train_in[batch_idxs]).to(TORCH_DEVICE).float()
-                train_targ = torch.from_numpy(self.train_targs[batch_idxs]).to(TORCH_DEVICE).float()
-
-                mean, logvar = self.model(train_in, ret_logvar=True)
-                inv_var = torch.exp(-logvar)
-
-                train_losses = ((mean - train_targ) ** 2) * inv_var + logvar
-                train_losses = train_losses.mean(-1).mean(-1).sum()
-                # Only taking mean over the last 2 dimensions
-                # The first dimension corresponds to each model in the ensemble
-
-                loss += train_losses
+            epoch_range.set_postfix({
+                "Training loss(es)": mse_losses.numpy()
+            })
+        return loss.numpy()
 
-                self.model.optim.zero_grad()
-                loss.backward()
-                self.model.optim.step()
+    def _train_step_fn(self, train_in, train_targ):
+        with tf.GradientTape() as tape:
+            loss = 0.01 * (tf.math.reduce_sum(self.model.max_logvar) - tf.math.reduce_sum(self.model.min_logvar))
+            loss += self.model.compute_decays()
 
-            idxs = shuffle_rows(idxs)
+            mean, logvar = self.model(train_in, ret_logvar=True)
+            inv_var = tf.math.exp(-logvar)
 
-            val_in = torch.from_numpy(self.train_in[idxs[:5000]]).to(TORCH_DEVICE).float()
-            val_targ = torch.from_numpy(self.train_targs[idxs[:5000]]).to(TORCH_DEVICE).float()
+            train_losses = ((mean - train_targ) ** 2) * inv_var + logvar
+            # Only taking mean over the last 2 dimensions
+            # The first dimension corresponds to each model in the ensemble
+            loss += tf.math.reduce_sum(tf.math.reduce_mean(train_losses, axis=[1, 2]))
 
-            mean, _ = self.model(val_in)
-            mse_losses = ((mean - val_targ) ** 2).mean(-1).mean(-1)
-
-            epoch_range.set_postfix({
-                "Training loss(es)": mse_losses.detach().cpu().numpy()
-            })
+        grads = tape.gradient(loss, self.model.trainable_variables)
+        self.model.optimizer.apply_gradients(zip(grads, self.model.trainable_variables))
+        return loss
 
     def reset(self):
         """Resets this controller (clears previous solution, calls all update functions).
 
         Returns: None
         """
-        self.prev_sol = np.tile((self.ac_lb + self.ac_ub) / 2, [self.plan_hor])
+        self.ac_buf = np.array([]).reshape(0, self.dU)
         self.optimizer.reset()
 
         for update_fn in self.update_fns:
@@ -285,11 +287,21 @@ class MPC(Controller):
             action, self.ac_buf = self.ac_buf[0], self.ac_buf[1:]
             return action
 
-        self.sy_cur_obs = obs
-
-        soln = self.optimizer.obtain_solution(self.prev_sol, self.init_var)
-        self.prev_sol = np.concatenate([np.copy(soln)[self.per * self.dU:], np.zeros(self.per * self.dU)])
-        self.ac_buf = soln[:self.per * self.dU].reshape(-1, self.dU)
+        # the whole optimization runs in one compiled call, the observation is an argument of the cost
+        cur_obs = tf.constant(obs, dtype=tf.float32)
+        soln = self.optimizer.plan(cur_obs)
+        self.ac_buf = soln.numpy()[:self.per * self.dU].reshape(-1, self.dU)
+
+        if get_pred_cost or self.log_particles or self.log_traj_preds:
+            pred_cost, pred_traj = self._predict_trajs(soln[None], cur_obs)
+            pred_traj = pred_traj.numpy()[:, 0]
+            if self.log_particles:
+                self.pred_particles.append(pred_traj)
+            elif self.log_traj_preds:
+                self.pred_means.append(np.mean(pred_traj, axis=1))
+                self.pred_vars.append(np.var(pred_traj, axis=1))
+            if get_pred_cost:
+                return self.act(obs, t), pred_cost.numpy()[0]
 
         return self.act(obs, t)
 
@@ -305,8 +317,9 @@ class MPC(Controller):
 
         Returns: None
         """
-        # TODO: implement saving model for pytorch
-        # self.model.save(iter_logdir if self.save_all_models else primary_logdir)
+        tf.train.Checkpoint(model=self.model).write(
+            os.path.join(iter_logdir if self.save_all_models else primary_logdir, "model")
+        )
         if self.log_particles:
             savemat(os.path.join(iter_logdir, "predictions.mat"), {"predictions": self.pred_particles})
             self.pred_particles = []
@@ -316,96 +329,118 @@ class MPC(Controller):
                 {"means": self.pred_means, "vars": self.pred_vars}
             )
             self.pred_means, self.pred_vars = [], []
-    
-    @torch.no_grad()
-    def _compile_cost(self, ac_seqs):
 
-        nopt = ac_seqs.shape[0]
+    def _predict_trajs_fn(self, ac_seqs, cur_obs):
+        return self._compile_cost(ac_seqs, cur_obs, get_pred_trajs=True)
 
-        ac_seqs = torch.from_numpy(ac_seqs).float().to(TORCH_DEVICE)
+    def _compile_cost(self, ac_seqs, cur_obs, get_pred_trajs=False):
+        nopt = tf.shape(ac_seqs)[0]
 
         # Reshape ac_seqs so that it's amenable to parallel compute
-        # Before, ac seqs has dimension (400, 25) which are pop size and sol dim coming from CEM
-        ac_seqs = ac_seqs.view(-1, self.plan_hor, self.dU)
-        #  After, ac seqs has dimension (400, 25, 1)
-
-        transposed = ac_seqs.transpose(0, 1)
-        # Then, (25, 400, 1)
-
-        expanded = transposed[:, :, None]
-        # Then, (25, 400, 1, 1)
-
-        tiled = expanded.expand(-1, -1, self.npart, -1)
-        # Then, (25, 400, 20, 1)
-
-        ac_seqs = tiled.contiguous().view(self.plan_hor, -1, self.dU)
-        # Then, (25, 8000, 1)
+        # [nopt, plan_hor * dU] -> [plan_hor, nopt * npart, dU], the particles of a candidate share its actions
+        ac_seqs = tf.reshape(ac_seqs, [-1, self.plan_hor, self.dU])
+        ac_seqs = tf.reshape(tf.tile(
+            tf.transpose(ac_seqs, [1, 0, 2])[:, :, None],
+            [1, 1, self.npart, 1]
+        ), [self.plan_hor, -1, self.dU])
 
         # Expand current observation
-        cur_obs = torch.from_numpy(self.sy_cur_obs).float().to(TORCH_DEVICE)
-        cur_obs = cur_obs[None]
-        cur_obs = cur_obs.expand(nopt * self.npart, -1)
+        init_obs = tf.tile(cur_obs[None], [nopt * self.npart, 1])
+        init_costs = tf.zeros([nopt, self.npart])
+        # the predicted trajectories are recorded only on demand
+        pred_trajs = tf.TensorArray(tf.float32, size=self.plan_hor + 1).write(0, init_obs) if get_pred_trajs else 0
 
-        costs = torch.zeros(nopt, self.npart, device=TORCH_DEVICE)
+        def _cond(t, *args):
+            return tf.less(t, self.plan_hor)
 
-        for t in range(self.plan_hor):
+        def _body(t, total_cost, cur_obs, pred_trajs):
             cur_acs = ac_seqs[t]
-
             next_obs = self._predict_next_obs(cur_obs, cur_acs)
+            delta_cost = tf.reshape(
+                self.obs_cost_fn(next_obs) + self.ac_cost_fn(cur_acs), [-1, self.npart]
+            )
+            next_obs = self.obs_postproc2(next_obs)
+            if get_pred_trajs:
+                pred_trajs = pred_trajs.write(t + 1, next_obs)
+            return t + 1, total_cost + delta_cost, next_obs, pred_trajs
 
-            cost = self.obs_cost_fn(next_obs) + self.ac_cost_fn(cur_acs)
-
-            cost = cost.view(-1, self.npart)
-
-            costs += cost
-            cur_obs = self.obs_postproc2(next_obs)
-
-        # Replace nan with high cost
-        costs[costs != costs] = 1e6
+        _, costs, _, pred_trajs = tf.while_loop(cond=_cond, body=_body,
+                                                loop_vars=[tf.constant(0), init_costs, init_obs, pred_trajs])
 
-        return costs.mean(dim=1).detach().cpu().numpy()
+        # Replace nan costs with very high cost
+        costs = tf.math.reduce_mean(tf.where(tf.math.is_nan(costs), 1e6 * tf.ones_like(costs), costs), axis=1)
+        if get_pred_trajs:
+            return costs, tf.reshape(pred_trajs.stack(), [self.plan_hor + 1, -1, self.npart, self.dO])
+        return costs
 
     def _predict_next_obs(self, obs, acs):
         proc_obs = self.obs_preproc(obs)
 
-        assert self.prop_mode == 'TSinf'
-
-        proc_obs = self._expand_to_ts_format(proc_obs)
-        acs = self._expand_to_ts_format(acs)
-
-        inputs = torch.cat((proc_obs, acs), dim=-1)
-
+        # TS Optimization: Expand so that particles are only passed through one of the networks.
+        if self.prop_mode == "TS1":
+            # TS1 reassigns the particles to the networks at every step
+            proc_obs = tf.reshape(proc_obs, [-1, self.npart, proc_obs.shape[-1]])
+            sort_idxs = tf.argsort(tf.random.uniform(tf.shape(proc_obs)[:2]), axis=-1)
+            proc_obs = tf.reshape(tf.gather(proc_obs, sort_idxs, batch_dims=1), [-1, proc_obs.shape[-1]])
+        if self.prop_mode == "TS1" or self.prop_mode == "TSinf":
+            proc_obs, acs = self._expand_to_ts_format(proc_obs), self._expand_to_ts_format(acs)
+
+        # Obtain model predictions
+        inputs = tf.concat([proc_obs, acs], axis=-1)
         mean, var = self.model(inputs)
 
-        predictions = mean + torch.randn_like(mean, device=TORCH_DEVICE) * var.sqrt()
+        if not (self.prop_mode == "TS1" or self.prop_mode == "TSinf"):
+            # every particle went through all networks, take the moments of the mixture of them
+            ensemble_mean = tf.math.reduce_mean(mean, axis=0)
+            var = tf.math.reduce_mean(var, axis=0) + tf.math.reduce_mean(tf.math.square(mean - ensemble_mean), axis=0)
+            mean = ensemble_mean
+
+        if self.ign_var:
+            predictions = mean
+        else:
+            predictions = mean + tf.random.normal(shape=tf.shape(mean)) * tf.math.sqrt(var)
+            if self.prop_mode == "MM":
+                # Moment matching: resample the particles of a candidate from the gaussian fitted to them
+                model_out_dim = predictions.shape[-1]
+
+                predictions = tf.reshape(predictions, [-1, self.npart, model_out_dim])
+                prediction_mean = tf.math.reduce_mean(predictions, axis=1, keepdims=True)
+                prediction_var = tf.math.reduce_mean(tf.math.square(predictions - prediction_mean), axis=1,
+                                                     keepdims=True)
+                z = tf.random.normal(shape=tf.shape(predictions))
+                samples = prediction_mean + z * tf.math.sqrt(prediction_var)
+                predictions = tf.reshape(samples, [-1, model_out_dim])
 
         # TS Optimization: Remove additional dimension
-        predictions = self._flatten_to_matrix(predictions)
+        if self.prop_mode == "TS1" or self.prop_mode == "TSinf":
+            predictions = self._flatten_to_matrix(predictions)
+        if self.prop_mode == "TS1":
+            # put the particles back in their original order
+            predictions = tf.reshape(predictions, [-1, self.npart, predictions.shape[-1]])
+            predictions = tf.gather(predictions, tf.argsort(sort_idxs, axis=-1), batch_dims=1)
+            predictions = tf.reshape(predictions, [-1, predictions.shape[-1]])
 
         return self.obs_postproc(obs, predictions)
 
     def _expand_to_ts_format(self, mat):
         dim = mat.shape[-1]
 
-        # Before, [10, 5] in case of proc_obs
-        reshaped = mat.view(-1, self.model.num_nets, self.npart // self.model.num_nets, dim)
-        # After, [2, 5, 1, 5]
-
-        transposed = reshaped.transpose(0, 1)
-        # After, [5, 2, 1, 5]
-
-        reshaped = transposed.contiguous().view(self.model.num_nets, -1, dim)
-        # After. [5, 2, 5]
-
-        return reshaped
+        # [nopt * npart, dim] -> [ensemble_size, nopt * npart / ensemble_size, dim]
+        return tf.reshape(
+            tf.transpose(
+                tf.reshape(mat, [-1, self.model.ensemble_size, self.npart // self.model.ensemble_size, dim]),
+                [1, 0, 2, 3]
+            ),
+            [self.model.ensemble_size, -1, dim]
+        )
 
     def _flatten_to_matrix(self, ts_fmt_arr):
         dim = ts_fmt_arr.shape[-1]
 
-        reshaped = ts_fmt_arr.view(self.model.num_nets, -1, self.npart // self.model.num_nets, dim)
-
-        transposed = reshaped.transpose(0, 1)
-
-        reshaped = transposed.contiguous().view(-1, dim)
-
-        return reshaped
+        return tf.reshape(
+            tf.transpose(
+                tf.reshape(ts_fmt_arr, [self.model.ensemble_size, -1, self.npart // self.model.ensemble_size, dim]),
+                [1, 0, 2, 3]
+            ),
+            [-1, dim]
+        )
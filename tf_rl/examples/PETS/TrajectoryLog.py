@@ -0,0 +1,136 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import json
+import os
+
+import numpy as np
+
+KEYS = {"obs": "observations", "ac": "actions", "rewards": "rewards"}
+INDEX_FNAME = "index.jsonl"
+
+
+class TrajectoryLogWriter:
+    def __init__(self, logdir):
+        """Append-only, sharded log of the rollouts of an experiment.
+
+        Every call of `append` writes one shard, i.e., the concatenated observations, actions and rewards of
+        the given rollouts as .npy files, and appends one line describing it to the index. So a write costs
+        only the new rollouts, and nothing has to be kept in memory between the iterations.
+
+        Arguments:
+            logdir (str): Directory of the log, it's created if it doesn't exist.
+        """
+        self.logdir = logdir
+        os.makedirs(logdir, exist_ok=True)
+        self.num_shards = len(_read_index(logdir))
+
+    def append(self, samples, returns=()):
+        """Writes a shard.
+
+        Arguments:
+            samples (list): Rollouts as returned by Agent.sample, the keys 'obs', 'ac' and 'rewards' are logged.
+            returns (list): Returns of the evaluation rollouts of this iteration.
+
+        Returns: None
+        """
+        shard = self.num_shards
+        if len(samples) > 0:
+            for key, name in KEYS.items():
+                path = _shard_path(self.logdir, name, shard)
+                # write then rename, so that a crash never leaves a partial shard behind the index
+                with open(path + ".tmp", "wb") as f:
+                    np.save(f, np.concatenate([sample[key] for sample in samples], axis=0))
+                os.replace(path + ".tmp", path)
+
+        entry = {
+            "shard": shard,
+            "lengths": [int(len(sample["ac"])) for sample in samples],
+            "returns": [float(ret) for ret in returns]
+        }
+        with open(os.path.join(self.logdir, INDEX_FNAME), "a") as f:
+            f.write(json.dumps(entry) + "\n")
+        self.num_shards += 1
+
+
+class TrajectoryLogReader:
+    def __init__(self, logdir, mmap=True):
+        """Reads the log written by TrajectoryLogWriter lazily.
+
+        Arguments:
+            logdir (str): Directory of the log.
+            mmap (bool): If True, the shards are memory-mapped, otherwise they are loaded on the first access.
+        """
+        self.logdir = logdir
+        self.mmap = mmap
+        self._index = _read_index(logdir)
+        self._shards = {}
+
+        # (shard, offset of the actions, length) of every rollout, the observations have one more row
+        self._rollouts = []
+        for entry in self._index:
+            offset = 0
+            for num_rollout, length in enumerate(entry["lengths"]):
+                self._rollouts.append((entry["shard"], offset, num_rollout, length))
+                offset += length
+
+    def __len__(self):
+        return len(self._rollouts)
+
+    def _load(self, name, shard):
+        if (name, shard) not in self._shards:
+            self._shards[(name, shard)] = np.load(_shard_path(self.logdir, name, shard),
+                                                  mmap_mode="r" if self.mmap else None)
+        return self._shards[(name, shard)]
+
+    def rollout(self, idx):
+        """Returns: (dict) The rollout of the keys 'obs', 'ac' and 'rewards', the arrays are views of the shard.
+        """
+        shard, offset, num_rollout, length = self._rollouts[idx]
+        # the observations of each preceding rollout in the shard have an extra row
+        obs_offset = offset + num_rollout
+        return {
+            "obs": self._load(KEYS["obs"], shard)[obs_offset: obs_offset + length + 1],
+            "ac": self._load(KEYS["ac"], shard)[offset: offset + length],
+            "rewards": self._load(KEYS["rewards"], shard)[offset: offset + length]
+        }
+
+    @property
+    def returns(self):
+        return np.array([ret for entry in self._index for ret in entry["returns"]])
+
+    def to_mat_dict(self):
+        """Returns: (dict) The same view as the logs.mat which MBExperiment used to write.
+        """
+        rollouts = [self.rollout(idx) for idx in range(len(self))]
+        return {
+            "observations": [rollout["obs"] for rollout in rollouts],
+            "actions": [rollout["ac"] for rollout in rollouts],
+            "returns": self.returns,
+            "rewards": [rollout["rewards"] for rollout in rollouts]
+        }
+
+    def export_mat(self, path):
+        """Writes the whole log into a .mat file as MBExperiment used to do.
+        """
+        from scipy.io import savemat
+        savemat(path, self.to_mat_dict())
+
+
+def load_logs(logdir, mmap=True):
+    """Returns: (dict) The logs.mat view of the log in logdir
+    """
+    return TrajectoryLogReader(logdir, mmap=mmap).to_mat_dict()
+
+
+def _shard_path(logdir, name, shard):
+    return os.path.join(logdir, "%s_%05d.npy" % (name, shard))
+
+
+def _read_index(logdir):
+    path = os.path.join(logdir, INDEX_FNAME)
+    if not os.path.exists(path):
+        return []
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
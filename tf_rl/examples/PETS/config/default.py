@@ -115,12 +115,15 @@ def _create_ctrl_config(ctrl_cfg, cfg_module, ctrl_type, ctrl_args, type_map):
         holdout_ratio=float, max_logging=int
     )
 
-    ctrl_cfg.prop_cfg.mode = "TSinf"
-    ctrl_cfg.prop_cfg.npart = 20
+    # propagation method, e.g., -ca prop-type TS1
+    ctrl_cfg.prop_cfg.mode = ctrl_args.get("prop-type", "TSinf")
+    assert ctrl_cfg.prop_cfg.mode in ["E", "DS", "TSinf", "TS1", "MM"], "Unknown propagation method."
+    ctrl_cfg.prop_cfg.npart = 1 if ctrl_cfg.prop_cfg.mode == "E" else 20
     # Finish setting model class
 
-    # Setting MPC cfg
-    ctrl_cfg.opt_cfg.mode = "CEM"
+    # Setting MPC cfg, e.g., -ca opt-type Random
+    ctrl_cfg.opt_cfg.mode = ctrl_args.get("opt-type", "CEM")
+    assert ctrl_cfg.opt_cfg.mode in ["CEM", "Random"], "Unknown optimization method."
     type_map.ctrl_cfg.opt_cfg.cfg = DotMap(
         max_iters=int,
         popsize=int,
@@ -4,86 +4,10 @@ from __future__ import absolute_import
 
 import numpy as np
 import gym
+import tensorflow as tf
 
-import torch
-from torch import nn as nn
-from torch.nn import functional as F
-
-from config.utils import swish, get_affine_params
 from DotmapUtils import get_required_argument
-
-
-TORCH_DEVICE = torch.device('cuda') if torch.cuda.is_available() else torch.device('cpu')
-
-
-class PtModel(nn.Module):
-
-    def __init__(self, ensemble_size, in_features, out_features):
-        super().__init__()
-
-        self.num_nets = ensemble_size
-
-        self.in_features = in_features
-        self.out_features = out_features
-
-        self.lin0_w, self.lin0_b = get_affine_params(ensemble_size, in_features, 200)
-
-        self.lin1_w, self.lin1_b = get_affine_params(ensemble_size, 200, 200)
-
-        self.lin2_w, self.lin2_b = get_affine_params(ensemble_size, 200, 200)
-
-        self.lin3_w, self.lin3_b = get_affine_params(ensemble_size, 200, out_features)
-
-        self.inputs_mu = nn.Parameter(torch.zeros(in_features), requires_grad=False)
-        self.inputs_sigma = nn.Parameter(torch.zeros(in_features), requires_grad=False)
-
-        self.max_logvar = nn.Parameter(torch.ones(1, out_features // 2, dtype=torch.float32) / 2.0)
-        self.min_logvar = nn.Parameter(- torch.ones(1, out_features // 2, dtype=torch.float32) * 10.0)
-
-    def compute_decays(self):
-
-        lin0_decays = 0.00025 * (self.lin0_w ** 2).sum() / 2.0
-        lin1_decays = 0.0005 * (self.lin1_w ** 2).sum() / 2.0
-        lin2_decays = 0.0005 * (self.lin2_w ** 2).sum() / 2.0
-        lin3_decays = 0.00075 * (self.lin3_w ** 2).sum() / 2.0
-
-        return lin0_decays + lin1_decays + lin2_decays + lin3_decays
-
-    def fit_input_stats(self, data):
-
-        mu = np.mean(data, axis=0, keepdims=True)
-        sigma = np.std(data, axis=0, keepdims=True)
-        sigma[sigma < 1e-12] = 1.0
-
-        self.inputs_mu.data = torch.from_numpy(mu).to(TORCH_DEVICE).float()
-        self.inputs_sigma.data = torch.from_numpy(sigma).to(TORCH_DEVICE).float()
-
-    def forward(self, inputs, ret_logvar=False):
-
-        # Transform inputs
-        inputs = (inputs - self.inputs_mu) / self.inputs_sigma
-
-        inputs = inputs.matmul(self.lin0_w) + self.lin0_b
-        inputs = swish(inputs)
-
-        inputs = inputs.matmul(self.lin1_w) + self.lin1_b
-        inputs = swish(inputs)
-
-        inputs = inputs.matmul(self.lin2_w) + self.lin2_b
-        inputs = swish(inputs)
-
-        inputs = inputs.matmul(self.lin3_w) + self.lin3_b
-
-        mean = inputs[:, :, :self.out_features // 2]
-
-        logvar = inputs[:, :, self.out_features // 2:]
-        logvar = self.max_logvar - F.softplus(self.max_logvar - logvar)
-        logvar = self.min_logvar + F.softplus(logvar - self.min_logvar)
-
-        if ret_logvar:
-            return mean, logvar
-
-        return mean, torch.exp(logvar)
+from eager.dynamics_models_eager import EnsembleModel
 
 
 class ReacherConfigModule:
@@ -112,7 +36,8 @@ class ReacherConfigModule:
         }
         self.UPDATE_FNS = [self.update_goal]
 
-        self.goal = None
+        # the compiled cost reads the goal of the current episode from this variable
+        self.goal = tf.Variable(tf.zeros(3), trainable=False, name="goal")
 
     @staticmethod
     def obs_postproc(obs, pred):
@@ -123,25 +48,17 @@ class ReacherConfigModule:
         return next_obs - obs
 
     def update_goal(self):
-        self.goal = self.ENV.goal
+        self.goal.assign(np.asarray(self.ENV.goal, dtype=np.float32))
 
     def obs_cost_fn(self, obs):
-
-        assert isinstance(obs, torch.Tensor)
-        assert self.goal is not None
-
-        obs = obs.detach().cpu().numpy()
-
         ee_pos = ReacherConfigModule.get_ee_pos(obs)
         dis = ee_pos - self.goal
 
-        cost = np.sum(np.square(dis), axis=1)
-
-        return torch.from_numpy(cost).float().to(TORCH_DEVICE)
+        return tf.math.reduce_sum(tf.math.square(dis), axis=1)
 
     @staticmethod
     def ac_cost_fn(acs):
-        return 0.01 * (acs ** 2).sum(dim=1)
+        return 0.01 * tf.math.reduce_sum(acs ** 2, axis=1)
 
     def nn_constructor(self, model_init_cfg):
         ensemble_size = get_required_argument(model_init_cfg, "num_nets", "Must provide ensemble size")
@@ -150,13 +67,10 @@ class ReacherConfigModule:
 
         assert load_model is False, 'Has yet to support loading model'
 
-        model = PtModel(ensemble_size,
-                        self.MODEL_IN, self.MODEL_OUT * 2).to(TORCH_DEVICE)
-        # * 2 because we output both the mean and the variance
-
-        model.optim = torch.optim.Adam(model.parameters(), lr=0.001)
-
-        return model
+        return EnsembleModel(ensemble_size,
+                             self.MODEL_IN, self.MODEL_OUT,
+                             hidden_units=[200, 200, 200],
+                             decay_params=[0.00025, 0.0005, 0.0005, 0.00075])
 
     @staticmethod
     def get_ee_pos(states):
@@ -164,26 +78,27 @@ class ReacherConfigModule:
         theta1, theta2, theta3, theta4, theta5, theta6, theta7 = \
             states[:, :1], states[:, 1:2], states[:, 2:3], states[:, 3:4], states[:, 4:5], states[:, 5:6], states[:, 6:]
 
-        rot_axis = np.concatenate([np.cos(theta2) * np.cos(theta1), np.cos(theta2) * np.sin(theta1), -np.sin(theta2)],
-                                  axis=1)
+        rot_axis = tf.concat([tf.math.cos(theta2) * tf.math.cos(theta1),
+                              tf.math.cos(theta2) * tf.math.sin(theta1),
+                              -tf.math.sin(theta2)], axis=1)
 
-        rot_perp_axis = np.concatenate([-np.sin(theta1), np.cos(theta1), np.zeros(theta1.shape)], axis=1)
-        cur_end = np.concatenate([
-            0.1 * np.cos(theta1) + 0.4 * np.cos(theta1) * np.cos(theta2),
-            0.1 * np.sin(theta1) + 0.4 * np.sin(theta1) * np.cos(theta2) - 0.188,
-            -0.4 * np.sin(theta2)
+        rot_perp_axis = tf.concat([-tf.math.sin(theta1), tf.math.cos(theta1), tf.zeros_like(theta1)], axis=1)
+        cur_end = tf.concat([
+            0.1 * tf.math.cos(theta1) + 0.4 * tf.math.cos(theta1) * tf.math.cos(theta2),
+            0.1 * tf.math.sin(theta1) + 0.4 * tf.math.sin(theta1) * tf.math.cos(theta2) - 0.188,
+            -0.4 * tf.math.sin(theta2)
         ], axis=1)
 
         for length, hinge, roll in [(0.321, theta4, theta3), (0.16828, theta6, theta5)]:
-            perp_all_axis = np.cross(rot_axis, rot_perp_axis)
-            x = np.cos(hinge) * rot_axis
-            y = np.sin(hinge) * np.sin(roll) * rot_perp_axis
-            z = -np.sin(hinge) * np.cos(roll) * perp_all_axis
+            perp_all_axis = tf.linalg.cross(rot_axis, rot_perp_axis)
+            x = tf.math.cos(hinge) * rot_axis
+            y = tf.math.sin(hinge) * tf.math.sin(roll) * rot_perp_axis
+            z = -tf.math.sin(hinge) * tf.math.cos(roll) * perp_all_axis
             new_rot_axis = x + y + z
-            new_rot_perp_axis = np.cross(new_rot_axis, rot_axis)
-            new_rot_perp_axis[np.linalg.norm(new_rot_perp_axis, axis=1) < 1e-30] = \
-                rot_perp_axis[np.linalg.norm(new_rot_perp_axis, axis=1) < 1e-30]
-            new_rot_perp_axis /= np.linalg.norm(new_rot_perp_axis, axis=1, keepdims=True)
+            new_rot_perp_axis = tf.linalg.cross(new_rot_axis, rot_axis)
+            new_rot_perp_axis = tf.where(tf.norm(new_rot_perp_axis, axis=1, keepdims=True) < 1e-30,
+                                         rot_perp_axis, new_rot_perp_axis)
+            new_rot_perp_axis /= tf.norm(new_rot_perp_axis, axis=1, keepdims=True)
             rot_axis, rot_perp_axis, cur_end = new_rot_axis, new_rot_perp_axis, cur_end + length * new_rot_axis
 
         return cur_end
@@ -1,121 +1,110 @@
+import numpy as np
 import tensorflow as tf
 
-KERNEL_INIT = tf.random_uniform_initializer(minval=-3e-3, maxval=3e-3)
-XAVIER_INIT = tf.contrib.layers.xavier_initializer()
 DECAY_PARAMS = [0.000025, 0.00005, 0.000075, 0.000075, 0.0001]  # default param in halfcheetah
-ENSEMBLE_PREFIX = "ensemble_"
+HIDDEN_UNITS = [200, 200, 200, 200]
 SWISH = lambda x: x * tf.sigmoid(x)
 
-class Model(tf.Module):
-    def __init__(self, in_features, out_features, id):
-        super(Model, self).__init__()
 
-        self.in_features = in_features
-        self.out_features = out_features
+class EnsembleDense(tf.Module):
+    """
+    Dense layer of all members of the ensemble at once
 
-        with tf.name_scope(str(ENSEMBLE_PREFIX + "{}".format(id))):
-            self.max_logvar = tf.Variable(tf.ones(shape=(1, out_features), dtype=tf.float32) / 2.0, name="max_logvar")
-            self.min_logvar = tf.Variable(- tf.ones(shape=(1, out_features), dtype=tf.float32) * 10.0,
-                                          name="min_logvar")
+    The kernels of the members are stacked into a tensor of [ensemble_size, in_features, out_features],
+    so that the ensemble is evaluated by one batched matmul instead of one Dense per member.
 
-            self.dense1 = tf.keras.layers.Dense(in_features, kernel_initializer=KERNEL_INIT)
-            self.dense2 = tf.keras.layers.Dense(200, kernel_initializer=KERNEL_INIT)
-            self.dense3 = tf.keras.layers.Dense(200, kernel_initializer=KERNEL_INIT)
-            self.dense4 = tf.keras.layers.Dense(200, kernel_initializer=KERNEL_INIT)
-            self.dense5 = tf.keras.layers.Dense(out_features * 2, kernel_initializer=KERNEL_INIT)
+    Inputs:
+        [ensemble_size, batch, in_features]: each member gets its own batch, e.g., TS-format particles
+        [batch, in_features]: the same batch is fed to every member
+    Outputs:
+        [ensemble_size, batch, out_features]
+    """
 
-    def __call__(self, inputs, ret_logvar=False):
-        x = self.dense1(inputs)
-        x = SWISH(x)
-        x = self.dense2(x)
-        x = SWISH(x)
-        x = self.dense3(x)
-        x = SWISH(x)
-        x = self.dense4(x)
-        x = SWISH(x)
-        outputs = self.dense5(x)
-        mean, logvar = tf.split(outputs, 2, axis=-1)
+    def __init__(self, ensemble_size, in_features, out_features, name=None):
+        super(EnsembleDense, self).__init__(name=name)
+        self.ensemble_size = ensemble_size
+        self.in_features = in_features
+        self.out_features = out_features
 
-        logvar = self.max_logvar - tf.nn.softplus(self.max_logvar - logvar)
-        logvar = self.min_logvar + tf.nn.softplus(logvar - self.min_logvar)
+        # initialisation of the original PETS, it matters for the rapid progress early in training in cartpole
+        init = tf.random.truncated_normal(shape=(ensemble_size, in_features, out_features),
+                                          stddev=1.0 / (2.0 * np.sqrt(in_features)))
+        self.kernel = tf.Variable(init, name="kernel")
+        self.bias = tf.Variable(tf.zeros(shape=(ensemble_size, 1, out_features)), name="bias")
 
-        if ret_logvar:
-            return mean, logvar
+    def __call__(self, inputs):
+        if inputs.shape.ndims == 2:
+            # avoid tiling the shared batch for every member
+            return tf.einsum("bi,eio->ebo", inputs, self.kernel) + self.bias
+        return tf.linalg.matmul(inputs, self.kernel) + self.bias
 
-        return mean, tf.math.exp(logvar)
 
+class EnsembleModel(tf.Module):
+    """
+    Probabilistic ensemble of the dynamics models
+
+    Every layer holds the weights of all members(see EnsembleDense), so that the forward pass of the whole ensemble
+    is one kernel per layer regardless of `ensemble_size`.
+    The outputs are per member, i.e., [ensemble_size, batch, out_features], and the propagation of the particles
+    decides how to combine them. The default architecture is the one of halfcheetah, the configs in PETS/config
+    pass their own `hidden_units` and `decay_params`.
+    """
 
-class HalfCheetahModel(tf.Module):
-    def __init__(self, ensemble_size, in_features, out_features, decay_params=DECAY_PARAMS):
-        super(HalfCheetahModel, self).__init__()
+    def __init__(self, ensemble_size, in_features, out_features, hidden_units=HIDDEN_UNITS,
+                 decay_params=DECAY_PARAMS):
+        super(EnsembleModel, self).__init__()
+        assert len(decay_params) == len(hidden_units) + 1, "decay_params needs one coefficient per layer"
 
-        self.inputs_mu = tf.constant(tf.zeros(in_features))
-        self.inputs_sigma = tf.constant(tf.zeros(in_features))
         self.ensemble_size = ensemble_size
+        self.in_features = in_features
+        self.out_features = out_features
         self.decay_params = decay_params
 
-        self.optimizer = tf.compat.v1.train.AdamOptimizer(learning_rate=0.001)
+        # Variables, so that the compiled functions see the statistics updated by `fit_input_stats`
+        self.inputs_mu = tf.Variable(tf.zeros(shape=(1, in_features)), trainable=False, name="inputs_mu")
+        self.inputs_sigma = tf.Variable(tf.ones(shape=(1, in_features)), trainable=False, name="inputs_sigma")
 
-        # instantiate the ensembling dynamics models
-        for idx in range(ensemble_size):
-            setattr(self, "model_{}".format(idx), Model(in_features=in_features, out_features=out_features, id=idx))
+        # bounds of the log-variance, shared by the members
+        self.max_logvar = tf.Variable(tf.ones(shape=(1, out_features)) / 2.0, name="max_logvar")
+        self.min_logvar = tf.Variable(- tf.ones(shape=(1, out_features)) * 10.0, name="min_logvar")
 
-        self.reduce_params_among_models()
+        units = [in_features] + list(hidden_units) + [out_features * 2]
+        self.layers = [EnsembleDense(ensemble_size, _in, _out, name="ensemble_dense{}".format(idx))
+                       for idx, (_in, _out) in enumerate(zip(units[:-1], units[1:]))]
 
-    def __call__(self, inputs, ret_logvar=False):
-        means, logvars = [], []
+        self.optimizer = tf.keras.optimizers.Adam(learning_rate=0.001)
 
+    def __call__(self, inputs, ret_logvar=False):
         # Scaling inputs
-        inputs = (inputs - self.inputs_mu) / self.inputs_sigma
+        x = (inputs - self.inputs_mu) / self.inputs_sigma
+
+        for layer in self.layers[:-1]:
+            x = SWISH(layer(x))
+        outputs = self.layers[-1](x)
+        mean, logvar = tf.split(outputs, 2, axis=-1)
+
+        logvar = self.max_logvar - tf.nn.softplus(self.max_logvar - logvar)
+        logvar = self.min_logvar + tf.nn.softplus(logvar - self.min_logvar)
 
-        for idx in range(self.ensemble_size):
-            mean, logvar = getattr(self, "model_{}".format(idx))(inputs)
-            means.append(mean)
-            logvars.append(logvar)
+        if ret_logvar:
+            return mean, logvar
 
-        # average the result across the ensembling models to get an outcome among them
-        return tf.math.reduce_mean(means, axis=0), tf.math.reduce_mean(logvars, axis=0)
+        return mean, tf.math.exp(logvar)
 
     def fit_input_stats(self, data):
         """ update the scaling factors of inputs """
-        self.inputs_mu = tf.math.reduce_mean(data, axis=0, keepdims=True)
-        sigma = tf.math.reduce_std(data, axis=0, keepdims=True)
-        sigma = tf.cast(sigma, dtype=tf.float32)
-        self.inputs_sigma = tf.where(sigma < 1e-12, tf.ones_like(sigma, dtype=tf.float32), sigma)
-
-    def reduce_params_among_models(self):
-        """ collect necessary information from each model and summarise them as properties of this class """
-        max_logvars, min_logvars = [], []
-        for idx in range(self.ensemble_size):
-            max_logvars.append(getattr(self, "model_{}".format(idx)).max_logvar)
-            min_logvars.append(getattr(self, "model_{}".format(idx)).min_logvar)
-
-        self.max_logvar = tf.math.reduce_mean(max_logvars, axis=0)
-        self.min_logvar = tf.math.reduce_mean(min_logvars, axis=0)
-
-    def reduce_L2_losses_among_models(self):
-        """ calculate the averaged magnitude of weight decay among all ensembling models
-            Note:
-                this has to be called after you fit the data. otherwise, the weights in the layers aren't initialised.
-                And you would get an error.
-        """
-        l2_losses = []
-        for idx in range(self.ensemble_size):
-            weights = getattr(self, "model_{}".format(idx)).trainable_variables
-            decay = self._compute_decays(weights=weights)
-            l2_losses.append(decay)
-
-        self.decay_losses = tf.math.reduce_mean(l2_losses, axis=0)
-
-    def _compute_decays(self, weights):
-        """ Manually compute the magnitude of weight decay """
-        decay = 0.0
-        for idx, weight in enumerate(weights):
-            try:
-                var_name = weight.name.split("/")[1]
-                if var_name == "kernel:0":
-                    _coef = self.decay_params[idx]
-                    decay += _coef * tf.math.reduce_sum(weight ** 2) / 2.0
-            except:
-                pass
-        return decay
+        mu = np.mean(data, axis=0, keepdims=True)
+        sigma = np.std(data, axis=0, keepdims=True)
+        sigma[sigma < 1e-12] = 1.0
+        self.inputs_mu.assign(mu.astype(np.float32))
+        self.inputs_sigma.assign(sigma.astype(np.float32))
+
+    def compute_decays(self):
+        """ Weight decay of the kernels, each layer has its own coefficient in `decay_params` """
+        decays = [coef * tf.math.reduce_sum(layer.kernel ** 2) / 2.0
+                  for coef, layer in zip(self.decay_params, self.layers)]
+        return tf.math.add_n(decays)
+
+
+# the defaults of EnsembleModel are the ones of halfcheetah
+HalfCheetahModel = EnsembleModel
@@ -13,7 +13,6 @@ from MPC import MPC
 from config import create_config
 import env # We run this so that the env is registered
 
-import tensorflow as np
 import numpy as np
 import random
 import tensorflow as tf
@@ -22,7 +21,7 @@ import tensorflow as tf
 def set_global_seeds(seed):
     np.random.seed(seed)
     random.seed(seed)
-    tf.set_random_seed(seed)
+    tf.random.set_seed(seed)
 
 
 def main(env, ctrl_type, ctrl_args, overrides, logdir):
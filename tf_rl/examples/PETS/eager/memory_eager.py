@@ -4,6 +4,7 @@ https://github.com/openai/baselines/blob/master/baselines/deepq/replay_buffer.py
 """
 
 import numpy as np
+import tensorflow as tf
 import random
 import json
 
@@ -180,4 +181,88 @@ class ReplayBuffer(object):
 
     def refresh(self):
         self._storage = []
-        self._next_idx = 0
\ No newline at end of file
+        self._next_idx = 0
+
+
+class ModelDataset(object):
+    def __init__(self, in_features, out_features, ensemble_size, capacity=1000):
+        """Append-only training set of the dynamics model of PETS.
+
+        The transitions are stored in preallocated arrays whose capacity doubles when they are full,
+        so that adding the rollouts of an iteration costs only the copy of them on average
+        while the size of the training set keeps growing over the iterations.
+
+        Parameters
+        ----------
+        in_features: int
+            dimension of the inputs of the model, i.e., the preprocessed observation and the action
+        out_features: int
+            dimension of the targets of the model
+        ensemble_size: int
+            number of the members of the ensemble, each member is trained on its own bootstrap
+        capacity: int
+            initial number of the transitions
+        """
+        self._inputs = np.empty((capacity, in_features), dtype=np.float32)
+        self._targets = np.empty((capacity, out_features), dtype=np.float32)
+        self._size = 0
+        self.ensemble_size = ensemble_size
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def inputs(self):
+        """ view of the stored inputs, it's invalidated by the next `add` """
+        return self._inputs[:self._size]
+
+    @property
+    def targets(self):
+        """ view of the stored targets, it's invalidated by the next `add` """
+        return self._targets[:self._size]
+
+    def add(self, inputs, targets):
+        size = self._size + len(inputs)
+        if size > len(self._inputs):
+            self._grow(size)
+        self._inputs[self._size: size] = inputs
+        self._targets[self._size: size] = targets
+        self._size = size
+
+    def _grow(self, size):
+        capacity = max(size, 2 * len(self._inputs))
+        for name in ["_inputs", "_targets"]:
+            storage = np.empty((capacity,) + getattr(self, name).shape[1:], dtype=np.float32)
+            storage[:self._size] = getattr(self, name)[:self._size]
+            setattr(self, name, storage)
+
+    def bootstrap_idxs(self):
+        """ indices of [ensemble_size, size], each row is the bootstrap of a member over the shared storage """
+        return np.random.randint(self._size, size=[self.ensemble_size, self._size])
+
+    def make_dataset(self, idxs, batch_size):
+        """ tf.data pipeline of an epoch over the bootstrap `idxs`
+
+        The storage is copied into tensors once, then the batches of [ensemble_size, batch_size, features]
+        are gathered and prefetched in the background while the model is trained on the previous one.
+        The order of each member's bootstrap is reshuffled at every iteration over the dataset.
+        """
+        inputs, targets = tf.constant(self.inputs), tf.constant(self.targets)
+        num_batches = -(-idxs.shape[-1] // batch_size)
+
+        def _shuffle(idxs):
+            return tf.gather(idxs, tf.argsort(tf.random.uniform(tf.shape(idxs)), axis=-1), batch_dims=1)
+
+        def _split(idxs):
+            # a batch is a slice of the columns of the shuffled indices, the last one may be smaller
+            return tf.data.Dataset.range(num_batches) \
+                .map(lambda i: idxs[:, i * batch_size: (i + 1) * batch_size])
+
+        def _gather(batch_idxs):
+            return tf.gather(inputs, batch_idxs), tf.gather(targets, batch_idxs)
+
+        return tf.data.Dataset.from_tensors(tf.constant(idxs)) \
+            .map(_shuffle) \
+            .flat_map(_split) \
+            .map(_gather, num_parallel_calls=tf.data.experimental.AUTOTUNE) \
+            .prefetch(tf.data.experimental.AUTOTUNE)
@@ -26,26 +26,44 @@ class Optimizer:
 class CEMOptimizer(Optimizer):
 
     def __init__(self, sol_dim, max_iters, popsize, num_elites, cost_function,
-                 upper_bound=None, lower_bound=None, epsilon=0.001, alpha=0.25):
+                 upper_bound=None, lower_bound=None, epsilon=0.001, alpha=0.25,
+                 action_dim=None, per=1, noise_beta=0.0, keep_elites_frac=0.0):
         """Creates an instance of this class.
 
+        The whole optimization, i.e., the sampling, the evaluation of `cost_function`, the selection of the elites
+        and the update of the distribution, runs in one tf.function, so that a call doesn't go back to the host
+        until the solution is found.
+
         Arguments:
             sol_dim (int): The dimensionality of the problem space
             max_iters (int): The maximum number of iterations to perform during optimization
             popsize (int): The number of candidate solutions to be sampled at every iteration
             num_elites (int): The number of top solutions that will be used to obtain the distribution
                 at the next iteration.
+            cost_function (func): A function which takes the candidate solutions of [popsize, sol_dim] and the
+                extra arguments of `obtain_solution`/`plan` and returns the costs of [popsize].
+                Note: Must be traceable by tf.function.
             upper_bound (np.array): An array of upper bounds
             lower_bound (np.array): An array of lower bounds
             epsilon (float): A minimum variance. If the maximum variance drops below epsilon, optimization is
                 stopped.
             alpha (float): Controls how much of the previous mean and variance is used for the next iteration.
                 next_mean = alpha * old_mean + (1 - alpha) * elite_mean, and similarly for variance.
+            action_dim (int): The dimensionality of an action, a solution is a sequence of sol_dim // action_dim
+                actions. Defaults to sol_dim.
+            per (int): The number of the actions consumed between the calls of `plan`, the warm-start of the next
+                call is the previous solution shifted by them.
+            noise_beta (float): iCEM, the exponent of the power spectrum of the noise along the time axis of the
+                sequence. 0 is the white noise of CEM, larger values give smoother action sequences.
+            keep_elites_frac (float): iCEM, the fraction of the elites carried over to the population of the next
+                iteration.
         """
         super().__init__()
+        assert upper_bound is not None and lower_bound is not None, "Must provide the bounds of the solution."
         self.sol_dim, self.max_iters, self.popsize, self.num_elites = sol_dim, max_iters, popsize, num_elites
 
-        self.ub, self.lb = upper_bound, lower_bound
+        self.ub = tf.constant(upper_bound, dtype=tf.float32)
+        self.lb = tf.constant(lower_bound, dtype=tf.float32)
         self.epsilon, self.alpha = epsilon, alpha
 
         self.cost_function = cost_function
@@ -53,47 +71,140 @@ class CEMOptimizer(Optimizer):
         if num_elites > popsize:
             raise ValueError("Number of elites must be at most the population size.")
 
+        self.action_dim = sol_dim if action_dim is None else action_dim
+        self.horizon = sol_dim // self.action_dim
+        self.shift = per * self.action_dim
+        self.noise_beta = noise_beta
+        self.num_kept_elites = int(keep_elites_frac * num_elites)
+
+        self.init_mean = (self.lb + self.ub) / 2
+        self.init_var = tf.math.square(self.ub - self.lb) / 16
+        self.prev_sol = tf.Variable(self.init_mean, trainable=False, name="prev_sol")
+
+        self._dist = tfd.TruncatedNormal(low=-2., high=2., loc=tf.zeros(sol_dim), scale=tf.ones(sol_dim))
+        # scale of the frequencies of the coloured noise, the constant term is scaled as the lowest frequency
+        freqs = np.fft.rfftfreq(self.horizon)
+        freqs[0] = freqs[1] if self.horizon > 1 else 1.0  # unused, the noise is white for a horizon of 1
+        self._noise_scale = tf.constant(freqs ** (-noise_beta / 2.0), dtype=tf.complex64)
+
+        self._solve = tf.function(self._solve_fn)
+        self._plan = tf.function(self._plan_fn)
+
     def reset(self):
-        pass
+        """ Clears the warm-start of `plan` """
+        self.prev_sol.assign(self.init_mean)
 
-    def obtain_solution(self, init_mean, init_var):
+    def obtain_solution(self, init_mean, init_var, *cost_args):
         """[Tensorflow Eager compatible]
         Optimizes the cost function using the provided initial candidate distribution
 
         Arguments:
             init_mean (np.ndarray): The mean of the initial candidate distribution.
             init_var (np.ndarray): The variance of the initial candidate distribution.
+            cost_args: extra arguments of the cost function, e.g., the current observation
         """
-        mean, var, t = tf.cast(init_mean, dtype=tf.float32), tf.cast(init_var, dtype=tf.float32), 0
-        tf_dist = tfd.TruncatedNormal(low=-2, high=2, loc=tf.zeros_like(mean), scale=tf.ones_like(var))
+        return self._solve(tf.cast(init_mean, dtype=tf.float32), tf.cast(init_var, dtype=tf.float32), *cost_args)
+
+    def plan(self, *cost_args):
+        """ Optimizes the cost function starting from the shifted previous solution
 
-        def _cond(mean, var, t):
-            bool1 = tf.less(t, self.max_iters)
-            bool2 = tf.less(self.epsilon, tf.reduce_max(var))
-            return tf.math.logical_and(x=bool1, y=bool2)
+        Arguments:
+            cost_args: extra arguments of the cost function, e.g., the current observation
 
-        def _body(mean, var, t):
+        Returns: the solution of [sol_dim], the first `per` actions are meant to be executed
+        """
+        return self._plan(*cost_args)
+
+    def _plan_fn(self, *cost_args):
+        soln = self._solve_fn(self.prev_sol.read_value(), self.init_var, *cost_args)
+        # warm-start of the next call, the consumed actions are replaced by the middle of the bounds
+        self.prev_sol.assign(tf.concat([soln[self.shift:], self.init_mean[self.sol_dim - self.shift:]], axis=0))
+        return soln
+
+    def _sample_noise(self):
+        """ Standard noise truncated at 2 stddev, coloured along the time axis for iCEM """
+        # a sequence of one action has no time axis to colour, and its std along the axis is 0
+        if self.noise_beta == 0.0 or self.horizon < 2:
+            return self._dist.sample(sample_shape=self.popsize)
+
+        white = tf.random.normal(shape=(self.popsize, self.action_dim, self.horizon))
+        spectrum = tf.signal.rfft(white) * self._noise_scale
+        noise = tf.signal.irfft(spectrum, fft_length=[self.horizon])
+        noise /= tf.math.reduce_std(noise, axis=-1, keepdims=True) + 1e-8
+        noise = tf.reshape(tf.transpose(noise, [0, 2, 1]), (self.popsize, self.sol_dim))
+        return tf.clip_by_value(noise, -2., 2.)
+
+    def _solve_fn(self, init_mean, init_var, *cost_args):
+        elites = tf.tile(init_mean[None], [self.num_elites, 1])
+
+        def _cond(t, mean, var, elites):
+            return tf.math.logical_and(tf.less(t, self.max_iters), tf.less(self.epsilon, tf.reduce_max(var)))
+
+        def _body(t, mean, var, elites):
             lb_dist, ub_dist = mean - self.lb, self.ub - mean
             constrained_var = tf.math.minimum(
                 tf.math.minimum(tf.math.square(lb_dist / 2), tf.math.square(ub_dist / 2)),
                 var)
-            constrained_var = tf.cast(constrained_var, dtype=tf.float32)
 
-            samples = tf_dist.sample(sample_shape=self.popsize)
-            samples = tf.cast(samples, tf.float32) * tf.math.sqrt(constrained_var) + mean
+            samples = self._sample_noise() * tf.math.sqrt(constrained_var) + mean
+            if self.num_kept_elites > 0:
+                # the elites of the previous iteration compete again, there are none at the first iteration
+                samples = tf.cond(t > 0,
+                                  lambda: tf.concat([elites[:self.num_kept_elites],
+                                                     samples[self.num_kept_elites:]], axis=0),
+                                  lambda: samples)
 
-            costs = self.cost_function(samples)
+            costs = self.cost_function(samples, *cost_args)
+            costs = tf.where(tf.math.is_nan(costs), 1e6 * tf.ones_like(costs), costs)
 
-            elites = tf.gather(samples, tf.argsort(costs))[:self.num_elites]
+            # partial sort, only the elites need to be ordered
+            elites = tf.gather(samples, tf.math.top_k(-costs, k=self.num_elites).indices)
 
             new_mean = tf.math.reduce_mean(elites, axis=0)
             new_var = tf.math.reduce_variance(elites, axis=0)
 
             mean = self.alpha * mean + (1 - self.alpha) * new_mean
             var = self.alpha * var + (1 - self.alpha) * new_var
-            t += 1
-            return mean, var, t
+            return t + 1, mean, var, elites
+
+        _, mean, var, _ = tf.while_loop(cond=_cond, body=_body,
+                                        loop_vars=[tf.constant(0), init_mean, init_var, elites])
+        return mean
+
+
+class RandomOptimizer(Optimizer):
+
+    def __init__(self, sol_dim, popsize, cost_function, upper_bound=None, lower_bound=None, action_dim=None, per=1):
+        """Creates an instance of this class.
+
+        Arguments:
+            sol_dim (int): The dimensionality of the problem space
+            popsize (int): The number of candidate solutions to be sampled
+            cost_function (func): See CEMOptimizer
+            upper_bound (np.array): An array of upper bounds
+            lower_bound (np.array): An array of lower bounds
+            action_dim (int), per (int): Unused, the random search doesn't warm-start
+        """
+        super().__init__()
+        assert upper_bound is not None and lower_bound is not None, "Must provide the bounds of the solution."
+        self.sol_dim, self.popsize = sol_dim, popsize
+        self.ub = tf.constant(upper_bound, dtype=tf.float32)
+        self.lb = tf.constant(lower_bound, dtype=tf.float32)
+        self.cost_function = cost_function
+
+        self._plan = tf.function(self._plan_fn)
+
+    def reset(self):
+        pass
+
+    def obtain_solution(self, *cost_args):
+        """ Returns the best one of the uniformly sampled candidates """
+        return self._plan(*cost_args)
 
-        mean, var, t = tf.while_loop(cond=_cond, body=_body, loop_vars=[mean, var, t])
+    def plan(self, *cost_args):
+        return self._plan(*cost_args)
 
-        return mean
\ No newline at end of file
+    def _plan_fn(self, *cost_args):
+        samples = self.lb + tf.random.uniform(shape=(self.popsize, self.sol_dim)) * (self.ub - self.lb)
+        costs = self.cost_function(samples, *cost_args)
+        return samples[tf.math.argmin(costs)]
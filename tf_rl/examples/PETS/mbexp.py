@@ -13,21 +13,16 @@ from MPC import MPC
 from config import create_config
 import env # We run this so that the env is registered
 
-import torch
 import numpy as np
 import random
 import tensorflow as tf
 
 
 def set_global_seeds(seed):
-    torch.manual_seed(seed)
-    if torch.cuda.is_available():
-        torch.cuda.manual_seed_all(seed)
-
     np.random.seed(seed)
     random.seed(seed)
 
-    tf.set_random_seed(seed)
+    tf.random.set_seed(seed)
 
 
 def main(env, ctrl_type, ctrl_args, overrides, logdir):
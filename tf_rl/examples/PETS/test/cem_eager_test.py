@@ -0,0 +1,47 @@
+import numpy as np
+import tensorflow as tf
+from eager.optimizers_eager import CEMOptimizer
+
+plan_hor, dU = 10, 2
+ac_lb, ac_ub = -np.ones(dU, dtype=np.float32), np.ones(dU, dtype=np.float32)
+target = np.random.uniform(-0.5, 0.5, size=plan_hor * dU).astype(np.float32)
+
+
+def _compile_cost(ac_seqs, target):
+    """ quadratic cost whose minimum is at `target`, given as an argument as the observation of MPC """
+    return tf.math.reduce_sum(tf.math.square(ac_seqs - target), axis=-1)
+
+
+for noise_beta, keep_elites_frac in [(0.0, 0.0), (2.0, 0.3)]:
+    optimizer = CEMOptimizer(
+        sol_dim=plan_hor * dU,
+        lower_bound=np.tile(ac_lb, [plan_hor]),
+        upper_bound=np.tile(ac_ub, [plan_hor]),
+        cost_function=_compile_cost,
+        max_iters=20,
+        popsize=400,
+        num_elites=40,
+        alpha=0.1,
+        action_dim=dU,
+        noise_beta=noise_beta,
+        keep_elites_frac=keep_elites_frac
+    )
+
+    mean = optimizer.obtain_solution(optimizer.init_mean, optimizer.init_var, tf.constant(target))
+    assert mean.shape == (plan_hor * dU,), mean.shape
+    np.testing.assert_allclose(mean.numpy(), target, atol=0.1)
+
+    # warm-start: the next plan starts from the solution shifted by an action
+    soln = optimizer.plan(tf.constant(target))
+    np.testing.assert_allclose(optimizer.prev_sol.numpy()[:-dU], soln.numpy()[dU:])
+    np.testing.assert_allclose(optimizer.prev_sol.numpy()[-dU:], np.zeros(dU))
+    optimizer.reset()
+    np.testing.assert_allclose(optimizer.prev_sol.numpy(), np.zeros(plan_hor * dU))
+    print(noise_beta, keep_elites_frac, np.abs(mean.numpy() - target).max())
+
+# a horizon of one action falls back to the white noise
+optimizer = CEMOptimizer(sol_dim=dU, lower_bound=ac_lb, upper_bound=ac_ub, cost_function=_compile_cost,
+                         max_iters=5, popsize=100, num_elites=10, action_dim=dU, noise_beta=2.0)
+assert np.all(np.isfinite(optimizer._sample_noise().numpy()))
+mean = optimizer.obtain_solution(optimizer.init_mean, optimizer.init_var, tf.constant(target[:dU]))
+assert np.all(np.isfinite(mean.numpy())), mean
@@ -0,0 +1,50 @@
+import numpy as np
+import tensorflow as tf
+from eager.dynamics_models_eager import HalfCheetahModel, SWISH
+
+MODEL_IN, MODEL_OUT, ENSEMBLE_SIZE = 23, 17, 5
+BATCH_SIZE = 32
+
+model = HalfCheetahModel(in_features=MODEL_IN,
+                         out_features=MODEL_OUT,
+                         ensemble_size=ENSEMBLE_SIZE)
+model.fit_input_stats(np.random.randn(100, MODEL_IN).astype(np.float32))
+
+
+def member_forward(inputs, idx):
+    """ forward pass of a single member with its slice of the stacked weights """
+    x = (inputs - model.inputs_mu) / model.inputs_sigma
+    for layer in model.layers[:-1]:
+        x = SWISH(tf.linalg.matmul(x, layer.kernel[idx]) + layer.bias[idx])
+    outputs = tf.linalg.matmul(x, model.layers[-1].kernel[idx]) + model.layers[-1].bias[idx]
+    mean, logvar = tf.split(outputs, 2, axis=-1)
+    logvar = model.max_logvar - tf.nn.softplus(model.max_logvar - logvar)
+    logvar = model.min_logvar + tf.nn.softplus(logvar - model.min_logvar)
+    return mean, logvar
+
+
+# TS-format: each member gets its own batch
+inputs = tf.constant(np.random.randn(ENSEMBLE_SIZE, BATCH_SIZE, MODEL_IN).astype(np.float32))
+mean, logvar = model(inputs, ret_logvar=True)
+assert mean.shape == (ENSEMBLE_SIZE, BATCH_SIZE, MODEL_OUT), mean.shape
+for idx in range(ENSEMBLE_SIZE):
+    _mean, _logvar = member_forward(inputs[idx], idx)
+    np.testing.assert_allclose(mean[idx].numpy(), _mean.numpy(), rtol=1e-4, atol=1e-5)
+    np.testing.assert_allclose(logvar[idx].numpy(), _logvar.numpy(), rtol=1e-4, atol=1e-5)
+
+# shared batch is broadcast to every member
+shared = inputs[0]
+mean, var = model(shared)
+assert mean.shape == (ENSEMBLE_SIZE, BATCH_SIZE, MODEL_OUT), mean.shape
+for idx in range(ENSEMBLE_SIZE):
+    _mean, _logvar = member_forward(shared, idx)
+    np.testing.assert_allclose(mean[idx].numpy(), _mean.numpy(), rtol=1e-4, atol=1e-5)
+    np.testing.assert_allclose(var[idx].numpy(), np.exp(_logvar.numpy()), rtol=1e-4, atol=1e-5)
+
+# gradients reach every member through the stacked weights
+with tf.GradientTape() as tape:
+    mean, logvar = model(inputs, ret_logvar=True)
+    loss = tf.math.reduce_sum(mean) + tf.math.reduce_sum(logvar) + model.compute_decays()
+grads = tape.gradient(loss, model.trainable_variables)
+assert all(grad is not None for grad in grads)
+print(mean.shape, logvar.shape, len(model.trainable_variables))
@@ -0,0 +1,40 @@
+import numpy as np
+from eager.memory_eager import ModelDataset
+
+IN_DIM, OUT_DIM, ENSEMBLE_SIZE = 6, 4, 3
+BATCH_SIZE = 32
+
+dataset = ModelDataset(in_features=IN_DIM, out_features=OUT_DIM, ensemble_size=ENSEMBLE_SIZE, capacity=10)
+
+# the capacity doubles while the stored transitions stay in order
+all_inputs, all_targets = [], []
+for size in [7, 5, 30, 1]:
+    inputs = np.random.randn(size, IN_DIM).astype(np.float32)
+    targets = np.random.randn(size, OUT_DIM).astype(np.float32)
+    dataset.add(inputs, targets)
+    all_inputs.append(inputs)
+    all_targets.append(targets)
+    np.testing.assert_array_equal(dataset.inputs, np.concatenate(all_inputs))
+    np.testing.assert_array_equal(dataset.targets, np.concatenate(all_targets))
+assert len(dataset) == 43 and len(dataset._inputs) == 84, (len(dataset), len(dataset._inputs))
+
+idxs = dataset.bootstrap_idxs()
+assert idxs.shape == (ENSEMBLE_SIZE, len(dataset)) and idxs.max() < len(dataset), idxs.shape
+
+# an epoch covers each member's bootstrap once, in a new order at every iteration
+for _ in range(2):
+    member_idxs = [[] for _ in range(ENSEMBLE_SIZE)]
+    num_batch = 0
+    for train_in, train_targ in dataset.make_dataset(idxs, batch_size=BATCH_SIZE):
+        assert train_in.shape[0] == ENSEMBLE_SIZE and train_in.shape[-1] == IN_DIM, train_in.shape
+        assert train_targ.shape[:2] == train_in.shape[:2] and train_targ.shape[-1] == OUT_DIM, train_targ.shape
+        for member in range(ENSEMBLE_SIZE):
+            # recover the row of each input to check it comes from the member's bootstrap
+            rows = [int(np.where((dataset.inputs == row).all(axis=1))[0][0]) for row in train_in[member].numpy()]
+            np.testing.assert_array_equal(dataset.targets[rows], train_targ[member].numpy())
+            member_idxs[member].extend(rows)
+        num_batch += 1
+    assert num_batch == int(np.ceil(len(dataset) / BATCH_SIZE)), num_batch
+    for member in range(ENSEMBLE_SIZE):
+        np.testing.assert_array_equal(np.sort(member_idxs[member]), np.sort(idxs[member]))
+print(len(dataset), len(dataset._inputs))
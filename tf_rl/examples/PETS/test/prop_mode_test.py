@@ -0,0 +1,27 @@
+import numpy as np
+import gym
+from eager.MPC_eager import MPC
+
+OBS_DIM, ACTION_DIM = 4, 2
+HORIZON = 20
+
+
+class DummyEnv:
+    observation_space = gym.spaces.Box(low=-np.inf, high=np.inf, shape=(OBS_DIM,), dtype=np.float32)
+    action_space = gym.spaces.Box(low=-1, high=1, shape=(ACTION_DIM,), dtype=np.float32)
+
+
+env = DummyEnv()
+obs_trajs = [np.random.randn(HORIZON + 1, OBS_DIM).astype(np.float32) for _ in range(2)]
+acs_trajs = [np.random.uniform(-1, 1, size=(HORIZON, ACTION_DIM)).astype(np.float32) for _ in range(2)]
+rews_trajs = [np.random.randn(HORIZON) for _ in range(2)]
+
+for prop_mode, npart in [("E", 1), ("DS", 4), ("MM", 4), ("TS1", 4), ("TSinf", 4)]:
+    policy = MPC(env=env, prop_mode=prop_mode, npart=npart, ensemble_size=2, plan_hor=3, epochs=1)
+    loss = policy.train(obs_trajs, acs_trajs, rews_trajs)
+    policy.reset()
+    action, pred_cost = policy.act(obs_trajs[0][0], 0, get_pred_cost=True)
+    assert action.shape == (ACTION_DIM,), action.shape
+    assert np.all(action >= -1) and np.all(action <= 1), action
+    assert np.isfinite(pred_cost), pred_cost
+    print(prop_mode, loss, action, pred_cost)
@@ -0,0 +1,51 @@
+import shutil
+import tempfile
+import numpy as np
+from TrajectoryLog import TrajectoryLogWriter, TrajectoryLogReader, load_logs
+
+OBS_DIM, ACTION_DIM = 5, 2
+
+
+def sample(horizon):
+    """ a rollout in the format of Agent.sample """
+    return {
+        "obs": np.random.randn(horizon + 1, OBS_DIM),
+        "ac": np.random.randn(horizon, ACTION_DIM),
+        "rewards": np.random.randn(horizon),
+        "reward_sum": np.random.randn()
+    }
+
+
+logdir = tempfile.mkdtemp()
+try:
+    writer = TrajectoryLogWriter(logdir)
+    all_samples, all_returns = [], []
+    for horizon_list in [[10, 7], [], [3], [12, 1, 4]]:
+        samples = [sample(horizon) for horizon in horizon_list]
+        returns = [sample["reward_sum"] for sample in samples[:1]]
+        writer.append(samples, returns=returns)
+        all_samples.extend(samples)
+        all_returns.extend(returns)
+
+    # the writer resumes after the existing shards
+    assert TrajectoryLogWriter(logdir).num_shards == 4
+
+    for mmap in [True, False]:
+        reader = TrajectoryLogReader(logdir, mmap=mmap)
+        assert len(reader) == len(all_samples), len(reader)
+        for idx, _sample in enumerate(all_samples):
+            rollout = reader.rollout(idx)
+            for key in ["obs", "ac", "rewards"]:
+                np.testing.assert_array_equal(rollout[key], _sample[key])
+        np.testing.assert_array_equal(reader.returns, np.array(all_returns))
+
+    # the same view as logs.mat
+    logs = load_logs(logdir)
+    assert sorted(logs.keys()) == ["actions", "observations", "returns", "rewards"]
+    for key, name in [("obs", "observations"), ("ac", "actions"), ("rewards", "rewards")]:
+        assert len(logs[name]) == len(all_samples)
+        for array, _sample in zip(logs[name], all_samples):
+            np.testing.assert_array_equal(array, _sample[key])
+    print(len(logs["observations"]), logs["returns"])
+finally:
+    shutil.rmtree(logdir)
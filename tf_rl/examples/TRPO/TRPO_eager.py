@@ -32,7 +32,8 @@ parser.add_argument("--env_name", default="Hopper-v2", help="Env title")
 parser.add_argument("--seed", default=123, type=int, help="seed for randomness")
 parser.add_argument("--num_frames", default=1_000_000, type=int, help="total frame in a training")
 parser.add_argument("--num_rollout", default=10, type=int, help="total frame in a training")
-parser.add_argument("--num_updates", default=20, type=int, help="total updates in after an episode")
+parser.add_argument("--num_updates", default=20, type=int, help="max number of epochs in a policy update")
+parser.add_argument("--batch_size", default=64, type=int, help="size of a minibatch in an epoch")
 parser.add_argument("--reward_buffer_ep", default=10, type=int, help="reward_buffer size")
 parser.add_argument("--gamma", default=0.995, type=float, help="discount factor")
 parser.add_argument("--L2_reg", default=0.001, type=float, help="magnitude of L2 regularisation")
@@ -0,0 +1,21 @@
+import gym
+import numpy as np
+from tf_rl.agents.A3C import A2C, A3C
+from tf_rl.common.advantage import compute_gae
+
+# the n-step returns of the workers are the returns of GAE with lam=1,
+# they are not bootstrapped across the end of an episode
+rewards = np.array([[1., 1., 1.], [1., 1., 1.]])
+dones = np.array([[0., 1., 0.], [0., 0., 0.]])
+_, returns = compute_gae(rewards, np.zeros_like(rewards), dones, last_values=np.array([10., 10.]), gamma=0.5, lam=1.0)
+assert np.allclose(returns[0], [1.5, 1., 6.])
+assert np.allclose(returns[1], [3.0, 4., 6.])
+
+if __name__ == '__main__':
+    # A3C spawns the workers, so that this part should not run in them
+    env = gym.make("CartPole-v0")
+    for algo in [A2C, A3C]:
+        agent = algo(state_size=env.observation_space.shape[0], action_size=env.action_space.n)
+        agent.train(env_fn=lambda: gym.make("CartPole-v0"), num_workers=4, num_frames=2000, n_steps=5)
+        print(algo.__name__, "steps/sec/core: {:.1f}".format(agent.steps_per_sec_per_core))
+        assert agent.steps_per_sec_per_core > 0
@@ -0,0 +1,56 @@
+import time
+import numpy as np
+import tensorflow as tf
+from tf_rl.common.eager_util import eager_setup, set_execution_mode
+from tf_rl.common.networks import Nature_DQN
+from tf_rl.common.random_process import OrnsteinUhlenbeckProcess
+from tf_rl.examples.DDPG.utils.network import Actor, Critic
+from tf_rl.examples.DDPG.utils.agent import DDPG
+from tf_rl.benchmark import network_benchmark
+
+eager_setup()
+batch_size, obs_dim, num_action = 32, 17, 6
+global_timestep = tf.compat.v1.train.create_global_step()
+
+# the conv trunk computes in bfloat16, but the outputs stay in float32
+set_execution_mode(mixed_precision=True)
+model = Nature_DQN(num_action)
+outputs = model(tf.zeros((1, 84, 84, 4)))
+assert model.conv1.compute_dtype == "bfloat16" and model.conv1.variables[0].dtype == tf.float32
+assert model.fc1.compute_dtype == "float32" and outputs.dtype == tf.float32
+set_execution_mode()
+assert Nature_DQN(num_action).conv1.compute_dtype == "float32"
+
+
+def make_agent():
+    return DDPG(actor=Actor,
+                critic=Critic,
+                num_action=num_action,
+                random_process=OrnsteinUhlenbeckProcess(size=num_action, theta=0.15, mu=0.0, sigma=0.2),
+                gamma=0.99,
+                L2_reg=0.5,
+                actor_model_dir="./tmp/actor",
+                critic_model_dir="./tmp/critic",
+                obs_shape=(obs_dim,),
+                batch_size=batch_size)
+
+
+batch = (np.random.randn(batch_size, obs_dim), np.random.uniform(-1, 1, (batch_size, num_action)),
+         np.random.randn(batch_size), np.random.randn(batch_size, obs_dim), np.zeros(batch_size))
+
+# the update steps compiled by XLA are traced once as well
+for xla in [False, True]:
+    set_execution_mode(xla=xla)
+    agent = make_agent()
+    agent.warmup()
+    agent.update_fused(*batch, tau=1e-2)
+    begin = time.time()
+    for _ in range(100):
+        agent.update_fused(*batch, tau=1e-2)
+    print("xla: {} took : {:3f}s".format(xla, time.time() - begin))
+    assert all(num == 1 for num in agent.num_traces.values())
+set_execution_mode()
+
+for record in network_benchmark.run(["DDPG_Actor", "Nature_DQN"], [32], num_iter=10, obs_dim=obs_dim,
+                                    num_action=num_action):
+    print(record["name"], record["status"], record.get("speedup"))
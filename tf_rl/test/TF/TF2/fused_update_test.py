@@ -0,0 +1,69 @@
+import gym
+import time
+import numpy as np
+import tensorflow as tf
+from tf_rl.common.eager_util import eager_setup
+from tf_rl.common.random_process import OrnsteinUhlenbeckProcess
+from tf_rl.common.utils import soft_target_model_update_eager
+from tf_rl.examples.DDPG.utils.network import Actor, Critic
+from tf_rl.examples.DDPG.utils.agent import DDPG
+
+eager_setup()
+batch_size = 32
+tau = 1e-2
+env = gym.make("Pendulum-v0")
+obs_dim, num_action = env.observation_space.shape[0], env.action_space.shape[0]
+global_timestep = tf.compat.v1.train.create_global_step()
+
+
+def make_agent():
+    agent = DDPG(actor=Actor,
+                 critic=Critic,
+                 num_action=num_action,
+                 random_process=OrnsteinUhlenbeckProcess(size=num_action, theta=0.15, mu=0.0, sigma=0.2),
+                 gamma=0.99,
+                 L2_reg=0.5,
+                 actor_model_dir="./tmp/actor",
+                 critic_model_dir="./tmp/critic",
+                 obs_shape=env.observation_space.shape,
+                 batch_size=batch_size)
+    # build the models to copy the weights
+    states = tf.zeros((1, obs_dim))
+    for actor, critic in [(agent.actor, agent.critic), (agent.target_actor, agent.target_critic)]:
+        critic(states, actor(states))
+    return agent
+
+
+agent, agent_fused = make_agent(), make_agent()
+for model in ["actor", "critic", "target_actor", "target_critic"]:
+    getattr(agent_fused, model).set_weights(getattr(agent, model).get_weights())
+
+batch = [np.random.randn(batch_size, obs_dim), np.random.randn(batch_size, num_action), np.random.randn(batch_size),
+         np.random.randn(batch_size, obs_dim), np.zeros(batch_size)]
+
+# the fused step gives the same models as the update followed by the separate soft updates
+for _ in range(3):
+    agent.update(*batch)
+    soft_target_model_update_eager(agent.target_actor, agent.actor, tau=tau)
+    soft_target_model_update_eager(agent.target_critic, agent.critic, tau=tau)
+    agent_fused.update_fused(*batch, tau=tau)
+
+for model in ["actor", "critic", "target_actor", "target_critic"]:
+    for w, w_fused in zip(getattr(agent, model).get_weights(), getattr(agent_fused, model).get_weights()):
+        assert np.allclose(w, w_fused, atol=1e-6), model
+
+# neither the update nor the fused step should retrace
+print(agent_fused.num_traces)
+assert all(num <= 1 for num in agent_fused.num_traces.values())
+
+begin = time.time()
+for _ in range(100):
+    agent.update(*batch)
+    soft_target_model_update_eager(agent.target_actor, agent.actor, tau=tau)
+    soft_target_model_update_eager(agent.target_critic, agent.critic, tau=tau)
+print("update + soft updates took : {:3f}s".format(time.time() - begin))
+
+begin = time.time()
+for _ in range(100):
+    agent_fused.update_fused(*batch, tau=tau)
+print("fused update took : {:3f}s".format(time.time() - begin))
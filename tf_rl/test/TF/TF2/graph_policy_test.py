@@ -0,0 +1,61 @@
+import gym
+import time
+import numpy as np
+import tensorflow as tf
+from tf_rl.common.eager_util import eager_setup
+from tf_rl.examples.DQN.utils.policy import EpsilonGreedyPolicy_eager, EpsilonGreedyPolicy_graph, \
+    BoltzmannQPolicy_graph
+from tf_rl.examples.DQN.utils.network import cartpole_net
+from tf_rl.examples.DQN.utils.agent import dqn_agent
+
+eager_setup()
+num_action = 4
+q_values = tf.constant(np.random.randn(10000, num_action), dtype=tf.float32)
+greedy_actions = np.argmax(q_values.numpy(), axis=-1)
+
+# epsilon = 0 is the greedy policy and epsilon = 1 is the uniformly random policy
+policy = EpsilonGreedyPolicy_graph(num_action=num_action, epsilon_fn=lambda: tf.constant(0.1))
+assert np.array_equal(policy.explore(q_values, tf.constant(0.0)).numpy(), greedy_actions)
+actions = policy.explore(q_values, tf.constant(1.0)).numpy()
+print(np.bincount(actions, minlength=num_action) / len(actions))
+assert np.allclose(np.bincount(actions, minlength=num_action) / len(actions), 1 / num_action, atol=0.02)
+actions = policy.explore(q_values, policy.epsilon()).numpy()
+print(np.mean(actions != greedy_actions))
+assert abs(np.mean(actions != greedy_actions) - 0.1 * (num_action - 1) / num_action) < 0.02
+
+# Boltzmann policy samples the actions from the softmax of the q-values
+policy = BoltzmannQPolicy_graph(num_action=num_action, epsilon_fn=lambda: tf.constant(0.1))
+q_value = np.array([[1.0, 2.0, 0.5, -1.0]], dtype=np.float32)
+actions = policy.explore(tf.constant(np.repeat(q_value, 10000, axis=0)), policy.epsilon()).numpy()
+probs = np.exp(q_value[0]) / np.sum(np.exp(q_value[0]))
+print(np.bincount(actions, minlength=num_action) / len(actions), probs)
+assert np.allclose(np.bincount(actions, minlength=num_action) / len(actions), probs, atol=0.02)
+
+# the agent compiles the policy into the action selection, it is traced only once for any batch size
+env = gym.make("CartPole-v0")
+global_timestep = tf.compat.v1.train.create_global_step()
+for policy in [EpsilonGreedyPolicy_eager, EpsilonGreedyPolicy_graph]:
+    agent = dqn_agent(model=cartpole_net,
+                      policy=policy(num_action=env.action_space.n, epsilon_fn=lambda: tf.constant(0.1)),
+                      optimizer=tf.compat.v1.train.RMSPropOptimizer(0.00025),
+                      loss_fn=tf.compat.v1.losses.huber_loss,
+                      grad_clip_fn=lambda grads: grads,
+                      obs_prc_fn=lambda x: x,
+                      num_action=env.action_space.n,
+                      model_dir="./tmp/model",
+                      gamma=0.99,
+                      obs_shape=env.observation_space.shape,
+                      batch_size=32)
+    agent.warmup()
+    states = np.stack([env.reset() for _ in range(8)])
+    agent.select_action(states[0])
+    agent.select_action_eval(states[0], epsilon=0.05)
+    actions = agent.select_actions(states)
+    assert actions.shape == (8,)
+
+    begin = time.time()
+    for _ in range(1000):
+        agent.select_action(states[0])
+    print("{} took : {:3f}s".format(policy.__name__, time.time() - begin))
+    print(agent.num_traces)
+    assert all(num == 1 for num in agent.num_traces.values())
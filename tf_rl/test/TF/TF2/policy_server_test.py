@@ -0,0 +1,61 @@
+import os
+import time
+import tempfile
+import numpy as np
+import tensorflow as tf
+from tf_rl.common.eager_util import eager_setup
+from tf_rl.common.random_process import OrnsteinUhlenbeckProcess
+from tf_rl.common.policy_server import export_policy, PolicyServer
+from tf_rl.examples.DDPG.utils.network import Actor, Critic
+from tf_rl.examples.DDPG.utils.agent import DDPG
+
+eager_setup()
+obs_dim, num_action, num_iter = 17, 6, 1000
+global_timestep = tf.compat.v1.train.create_global_step()
+model_dir = tempfile.mkdtemp()
+agent = DDPG(actor=Actor,
+             critic=Critic,
+             num_action=num_action,
+             random_process=OrnsteinUhlenbeckProcess(size=num_action, theta=0.15, mu=0.0, sigma=0.2),
+             gamma=0.99,
+             L2_reg=0.5,
+             actor_model_dir=model_dir + "/actor",
+             critic_model_dir=model_dir + "/critic",
+             obs_shape=(obs_dim,))
+states = np.random.randn(1000, obs_dim).astype(np.float32)
+expected = agent.actor(states).numpy()
+global_timestep.assign_add(1)
+agent.actor_manager.save()
+
+begin = time.time()
+for i in range(num_iter):
+    agent.select_action_eval(states[i])
+print("eager select_action_eval: {:.1f}us".format((time.time() - begin) / num_iter * 1e6))
+
+for quantize, atol in [(None, 1e-5), ("dynamic", 5e-2), ("int8", 1e-1)]:
+    export_path = os.path.join(model_dir, "policy_{}.tflite".format(quantize))
+    # the weights come from the checkpoint of the manager, not from the agent
+    size = export_policy(model=Actor(num_action),
+                         obs_shape=(obs_dim,),
+                         export_path=export_path,
+                         checkpoint_dir=model_dir + "/actor",
+                         quantize=quantize,
+                         representative_states=states)
+    server = PolicyServer(export_path)
+    actions = server.act(states)
+    assert actions.shape == expected.shape
+    print(quantize, size, np.max(np.abs(actions - expected)))
+    assert np.allclose(actions, expected, atol=atol)
+
+    begin = time.time()
+    for i in range(num_iter):
+        server.act_single(states[i])
+    print("{} bytes, quantize: {}, act: {:.1f}us".format(size, quantize, (time.time() - begin) / num_iter * 1e6))
+
+# the observations out of the calibrated range of the int8 model saturate instead of wrapping around
+signs = np.sign(states[:10])
+assert np.allclose(server.act(signs * 100), server.act(signs * 1000))
+
+# the agents export their own model
+agent.export_lite(os.path.join(model_dir, "actor.tflite"))
+assert np.allclose(PolicyServer(os.path.join(model_dir, "actor.tflite")).act(states), expected, atol=1e-5)
@@ -0,0 +1,44 @@
+import time
+import argparse
+import numpy as np
+import tensorflow as tf
+from tf_rl.common.networks import TRPO_Policy, TRPO_Value
+from tf_rl.agents.TRPO import TRPO
+
+tf.compat.v1.enable_eager_execution()
+obs_dim, num_action = 11, 3
+global_timestep = tf.compat.v1.train.get_or_create_global_step()
+
+
+def rollout(length):
+    dones = np.zeros(length)
+    dones[np.random.choice(length, 5)] = 1
+    dones[-1] = 1
+    return np.random.randn(length, obs_dim), np.random.randn(length, num_action), np.random.randn(length), dones
+
+
+params = argparse.Namespace(num_updates=10, batch_size=64, kl_target=0.003, L2_reg=0.001, gamma=0.99,
+                            gae_discount=0.98)
+agent = TRPO(TRPO_Policy, TRPO_Value, num_action, params)
+
+# a policy-improvement phase is one compiled call, the input signature keeps it from retracing on a new length
+for length in [500, 1000, 4000]:
+    states, actions, rewards, dones = rollout(length)
+    advantages, returns = agent.compute_advantages(states, rewards, dones)
+    assert returns.shape == advantages.shape == (length,)
+    assert abs(np.mean(advantages)) < 1e-3
+
+    begin = time.time()
+    loss, kl_divergence, num_epochs = agent._update(tf.constant(states, dtype=tf.float32),
+                                                    tf.constant(actions, dtype=tf.float32),
+                                                    tf.constant(returns),
+                                                    tf.constant(advantages[:, None]))
+    print("rollout of {} took : {:3f}s | Epochs: {} | KL: {:.5f} | Beta: {}".format(
+        length, time.time() - begin, num_epochs.numpy(), kl_divergence.numpy(), agent.beta.numpy()))
+    assert 1 <= num_epochs.numpy() <= params.num_updates
+    # the epochs stop once the KL divergence exceeds 4 * kl_target
+    assert num_epochs.numpy() == params.num_updates or kl_divergence.numpy() > 4 * params.kl_target
+    assert agent.beta_min <= agent.beta.numpy() <= agent.beta_max
+
+# update takes the rollout collected by train_TRPO
+print(agent.update(*rollout(300)))
@@ -0,0 +1,68 @@
+import time
+import argparse
+import tempfile
+import numpy as np
+import tensorflow as tf
+from tf_rl.common.memory import ReplayBuffer
+from tf_rl.common.random_process import OrnsteinUhlenbeckProcess
+from tf_rl.common.networks import DDPG_Actor, DDPG_Critic
+from tf_rl.common.train import _hard_sync_taus
+from tf_rl.agents.DDPG import DDPG
+
+tf.compat.v1.enable_eager_execution()
+k, batch_size, obs_dim, num_action = 8, 32, 3, 1
+global_timestep = tf.compat.v1.train.get_or_create_global_step()
+
+# the targets are synced after the updates scheduled right before the multiples of sync_freq
+print(_hard_sync_taus(timestep=20, num_updates=5, train_interval=4, sync_freq=10))
+assert np.array_equal(_hard_sync_taus(timestep=20, num_updates=5, train_interval=4, sync_freq=10), [0, 1, 0, 0, 1])
+assert np.array_equal(_hard_sync_taus(timestep=8, num_updates=8, train_interval=1, sync_freq=1), np.ones(8))
+
+# sample_many stacks k batches
+memory = ReplayBuffer(size=1000)
+for _ in range(100):
+    memory.add(np.random.randn(obs_dim), np.random.randn(num_action), 1.0, np.random.randn(obs_dim), False)
+for data in memory.sample_many(k, batch_size):
+    print(data.shape)
+    assert data.shape[:2] == (k, batch_size)
+
+
+def make_agent():
+    model_dir = tempfile.mkdtemp()
+    params = argparse.Namespace(actor_model_dir=model_dir + "/actor", critic_model_dir=model_dir + "/critic",
+                                gamma=0.99, L2_reg=0.5)
+    agent = DDPG(DDPG_Actor, DDPG_Critic, num_action,
+                 OrnsteinUhlenbeckProcess(size=num_action, theta=0.15, mu=0.0, sigma=0.2), params)
+    # build the models to copy the weights
+    states = tf.zeros((1, obs_dim))
+    for actor, critic in [(agent.actor, agent.critic), (agent.target_actor, agent.target_critic)]:
+        critic(states, actor(states))
+    return agent
+
+
+agent, agent_many = make_agent(), make_agent()
+for model in ["actor", "critic", "target_actor", "target_critic"]:
+    getattr(agent_many, model).set_weights(getattr(agent, model).get_weights())
+
+# k updates in a single call give the same models as k calls of update_fused
+batches = [np.random.randn(k, batch_size, obs_dim), np.random.randn(k, batch_size, num_action),
+           np.random.randn(k, batch_size), np.random.randn(k, batch_size, obs_dim), np.zeros((k, batch_size))]
+for i in range(k):
+    loss = agent.update_fused(*[data[i] for data in batches], tau=1e-2)
+loss_many = agent_many.update_many(*batches, taus=np.full(k, 1e-2))
+print(loss.numpy(), loss_many.numpy())
+
+for model in ["actor", "critic", "target_actor", "target_critic"]:
+    for w, w_many in zip(getattr(agent, model).get_weights(), getattr(agent_many, model).get_weights()):
+        assert np.allclose(w, w_many, atol=1e-5), model
+
+begin = time.time()
+for _ in range(10):
+    for i in range(k):
+        agent.update_fused(*[data[i] for data in batches], tau=1e-2)
+print("{} calls of update_fused took : {:3f}s".format(k, time.time() - begin))
+
+begin = time.time()
+for _ in range(10):
+    agent_many.update_many(*batches, taus=np.full(k, 1e-2))
+print("update_many of {} updates took : {:3f}s".format(k, time.time() - begin))
@@ -0,0 +1,47 @@
+import gym
+import time
+import numpy as np
+import tensorflow as tf
+from tf_rl.common.eager_util import eager_setup
+from tf_rl.examples.DQN.utils.policy import EpsilonGreedyPolicy_eager
+from tf_rl.examples.DQN.utils.network import cartpole_net
+from tf_rl.examples.DQN.utils.agent import dqn_agent
+
+eager_setup()
+batch_size = 32
+env = gym.make("CartPole-v0")
+global_timestep = tf.compat.v1.train.create_global_step()
+summary_writer = tf.compat.v2.summary.create_file_writer("./tmp/summary")
+agent = dqn_agent(model=cartpole_net,
+                  policy=EpsilonGreedyPolicy_eager(num_action=env.action_space.n, epsilon_fn=lambda: tf.constant(0.1)),
+                  optimizer=tf.compat.v1.train.RMSPropOptimizer(0.00025),
+                  loss_fn=tf.compat.v1.losses.huber_loss,
+                  grad_clip_fn=lambda grads: grads,
+                  obs_prc_fn=lambda x: x,
+                  num_action=env.action_space.n,
+                  model_dir="./tmp/model",
+                  gamma=0.99,
+                  obs_shape=env.observation_space.shape,
+                  batch_size=batch_size)
+
+with summary_writer.as_default():
+    begin = time.time()
+    agent.warmup()
+    print("warmup took : {:3f}s".format(time.time() - begin))
+    print(agent.num_traces)
+
+    # neither the action selection on the single/batched states nor the update should retrace
+    state = env.reset()
+    agent.select_action(state)
+    agent.select_actions(np.stack([state] * 4))
+    agent.update(np.random.randn(batch_size, 4), np.random.randint(2, size=batch_size), np.ones(batch_size),
+                 np.random.randn(batch_size, 4), np.zeros(batch_size))
+    print(agent.num_traces)
+    assert all(num == 1 for num in agent.num_traces.values())
+
+# the exported action selection gives the same q-values without tracing
+agent.export("./tmp/saved_model")
+states = np.random.randn(8, 4).astype(np.float32)
+q_values = agent._select_action(states).numpy()
+agent.load_select_action("./tmp/saved_model")
+assert np.allclose(q_values, agent._select_action(states).numpy())
@@ -0,0 +1,86 @@
+import gym
+import time
+import numpy as np
+from collections import deque
+from tf_rl.common.memory import ReplayBuffer
+from tf_rl.common.actor_learner import ActorLearner, SharedWeights, train_actor_learner
+import multiprocessing
+
+
+class LinearPolicy(object):
+    """ numpy policy which has the same interface as tf.keras.Model """
+
+    def __init__(self):
+        self.weights = [np.zeros(4, dtype=np.float32)]
+
+    def set_weights(self, weights):
+        self.weights = weights
+
+    def __call__(self, state):
+        return int(state.dot(self.weights[0]) > 0)
+
+
+def actor_fn():
+    model = LinearPolicy()
+    return model, model
+
+
+# the weights go through the shared memory as they are
+weights = [np.random.randn(3, 4).astype(np.float32), np.random.randn(4).astype(np.float32)]
+shared_weights = SharedWeights(weights, multiprocessing.get_context())
+version, weights_read = shared_weights.read()
+assert version == 1
+assert all(np.array_equal(w, w_read) for w, w_read in zip(weights, weights_read))
+shared_weights.write([w * 2 for w in weights])
+assert shared_weights.version == 2
+
+# the learner receives the transitions collected by the actors and broadcasts the new weights
+# fork is fine since this test doesn't use TF, the training scripts should keep the default of spawn
+memory = ReplayBuffer(size=100000)
+reward_buffer = deque(maxlen=100)
+actor_learner = ActorLearner(env_fn=lambda: gym.make("CartPole-v0"),
+                             actor_fn=actor_fn,
+                             weights=LinearPolicy().weights,
+                             num_actors=4,
+                             sync_interval=10,
+                             seed=123,
+                             context="fork")
+num_updates = [0]
+
+
+def update_fn(states, actions, rewards, next_states, dones):
+    assert states.shape == (32, 4)
+    num_updates[0] += 1
+
+
+begin = time.time()
+num = train_actor_learner(actor_learner,
+                          memory,
+                          update_fn=update_fn,
+                          get_weights=lambda: [np.array([0.0, 0.0, 1.0, 1.0], dtype=np.float32)],
+                          num_frames=20000,
+                          batch_size=32,
+                          learning_start=1000,
+                          train_freq=4,
+                          broadcast_interval=100,
+                          reward_buffer=reward_buffer)
+print("actor-learner took : {:3f}s".format(time.time() - begin))
+print(len(memory), num, actor_learner.shared_weights.version, actor_learner.staleness, np.mean(reward_buffer))
+assert num == num_updates[0] and len(memory) >= 20000
+assert num >= (len(memory) - 1000) // 4 - 1
+# the actors switched to the broadcast weights which balance the pole longer than the initial ones
+assert actor_learner.shared_weights.version > 1
+assert all(not process.is_alive() for process in actor_learner.processes)
+
+# the chunks collected by the old weights are dropped
+memory = ReplayBuffer(size=100000)
+with ActorLearner(env_fn=lambda: gym.make("CartPole-v0"), actor_fn=actor_fn, weights=LinearPolicy().weights,
+                  num_actors=2, max_staleness=0, context="fork") as actor_learner:
+    actor_learner.start()
+    actor_learner.drain(memory)
+    for _ in range(3):
+        actor_learner.broadcast(LinearPolicy().weights)
+    time.sleep(1)
+    num_added = actor_learner.drain(memory, block=False)
+    print(num_added, actor_learner.num_dropped)
+    assert actor_learner.num_dropped > 0
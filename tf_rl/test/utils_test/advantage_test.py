@@ -0,0 +1,52 @@
+import time
+import numpy as np
+from tf_rl.common.advantage import compute_gae, compute_gae_tf, pad_paths, unpad, last_step_dones
+
+gamma, lam = 0.99, 0.95
+
+
+def gae_per_path(rewards, values):
+    """ the per-path loop of NerveNet's generate_advantage """
+    returns, advantages = np.zeros(len(rewards)), np.zeros(len(rewards))
+    for t in reversed(range(len(rewards))):
+        returns[t] = rewards[t] + (gamma * returns[t + 1] if t < len(rewards) - 1 else 0)
+        if t < len(rewards) - 1:
+            advantages[t] = rewards[t] + gamma * values[t + 1] - values[t] + gamma * lam * advantages[t + 1]
+        else:
+            advantages[t] = rewards[t] - values[t]
+    return advantages, returns
+
+
+paths = [np.random.randn(np.random.randint(1, 1000)) for _ in range(32)]
+baselines = [np.random.randn(len(path)) for path in paths]
+
+begin = time.time()
+results = [gae_per_path(rewards, values) for rewards, values in zip(paths, baselines)]
+print("per path took : {:3f}s".format(time.time() - begin))
+
+begin = time.time()
+rewards, mask = pad_paths(paths)
+values, _ = pad_paths(baselines)
+advantages, returns = compute_gae(rewards, values, last_step_dones(mask), gamma=gamma, lam=lam)
+assert values.dtype == np.float64  # the padding keeps the dtype of the paths
+print("padded batch took : {:3f}s".format(time.time() - begin))
+assert np.allclose(unpad(advantages, mask), np.concatenate([adv for adv, _ in results]), atol=1e-3)
+assert np.allclose(unpad(returns, mask), np.concatenate([ret for _, ret in results]), atol=1e-3)
+
+# the concatenated paths in a row give the same result since the episodes are split by the dones
+dones = np.concatenate([np.eye(1, len(path), len(path) - 1)[0] for path in paths])
+advantages_row, returns_row = compute_gae(np.concatenate(paths)[None], np.concatenate(baselines)[None], dones[None],
+                                          gamma=gamma, lam=lam)
+assert np.allclose(advantages_row[0], unpad(advantages, mask), atol=1e-3)
+assert np.allclose(returns_row[0], unpad(returns, mask), atol=1e-3)
+
+# bootstrapping from the last values, lambda = 1 gives the n-step returns
+advantages, returns = compute_gae([[1., 1.]], [[0., 0.]], [[0., 0.]], last_values=[10.], gamma=0.5, lam=1.0)
+assert np.allclose(returns, [[4., 6.]]) and np.allclose(advantages, returns)
+
+# tf backend
+advantages_tf, returns_tf = compute_gae_tf(rewards, values, last_step_dones(mask), np.zeros(len(paths), np.float32),
+                                           gamma=gamma, lam=lam)
+advantages, returns = compute_gae(rewards, values, last_step_dones(mask), gamma=gamma, lam=lam)
+assert np.allclose(advantages_tf.numpy(), advantages, atol=1e-3)
+assert np.allclose(returns_tf.numpy(), returns, atol=1e-3)
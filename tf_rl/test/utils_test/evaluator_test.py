@@ -0,0 +1,48 @@
+import gym
+import time
+import numpy as np
+from tf_rl.common.vec_env import SyncVectorEnv, SubprocVectorEnv
+from tf_rl.common.evaluator import run_episodes, eval_summary
+
+n_trial = 20
+
+
+class LinearPolicy(object):
+    """ numpy policy which has the same interface as tf.keras.Model """
+
+    def __init__(self):
+        self.weights = [np.zeros(4)]
+
+    def set_weights(self, weights):
+        self.weights = weights
+
+    def __call__(self, states):
+        return (states.dot(self.weights[0]) > 0).astype(np.int64)
+
+
+# the serial evaluation as in eval_Agent
+policy = LinearPolicy()
+policy.set_weights([np.array([0.0, 0.0, 1.0, 1.0])])
+env = gym.make("CartPole-v0")
+begin = time.time()
+all_rewards = list()
+for _ in range(n_trial):
+    state, done, episode_reward = env.reset(), False, 0
+    while not done:
+        state, reward, done, _ = env.step(policy(state[None])[0])
+        episode_reward += reward
+    all_rewards.append(episode_reward)
+print("serial evaluation took : {:3f}s".format(time.time() - begin))
+eval_summary(all_rewards)
+
+# each env runs its own share of the episodes, so that we get exactly n_trial episodes
+for num_envs in [1, 3, 8]:
+    for vec_env in [SyncVectorEnv, SubprocVectorEnv]:
+        env = vec_env([lambda: gym.make("CartPole-v0") for _ in range(num_envs)])
+        begin = time.time()
+        all_rewards = run_episodes(env, policy, n_trial=n_trial)
+        print("{} of {} envs took : {:3f}s".format(vec_env.__name__, num_envs, time.time() - begin))
+        assert all_rewards.shape == (n_trial,)
+        summary = eval_summary(all_rewards)
+        assert summary["mean"] > 20  # the linear policy balances the pole for a while
+        env.close()
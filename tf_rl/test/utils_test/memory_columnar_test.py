@@ -0,0 +1,64 @@
+import gym
+import time
+import numpy as np
+from tf_rl.common.memory import ReplayBuffer, ColumnarReplayBuffer
+
+size = 100000
+env = gym.make("CartPole-v0")
+memory = ReplayBuffer(size=size)
+memory_col = ColumnarReplayBuffer(size=size)
+
+state = env.reset()
+for t in range(size + 10):  # +10 to check the wrap-around of the ring buffer
+    action = env.action_space.sample()
+    next_state, reward, done, info = env.step(action)
+    memory.add(state, action, reward, next_state, done)
+    memory_col.add(state, action, reward, next_state, done)
+    state = env.reset() if done else next_state
+env.close()
+
+print(len(memory), len(memory_col))
+
+# check the contents of the both buffers
+idxes = np.random.randint(0, size, 32)
+for a, b in zip(memory._encode_sample(idxes), memory_col._encode_sample(idxes)):
+    assert np.allclose(a.astype(np.float32), b.astype(np.float32))
+
+states, actions, rewards, next_states, dones = memory_col.sample(batch_size=32)
+print(states.shape, actions.shape, rewards.shape, next_states.shape, dones.shape)
+
+begin = time.time()
+for _ in range(1000): memory.sample(batch_size=32)
+print("original memory took : {:3f}s".format(time.time() - begin))
+
+begin = time.time()
+for _ in range(1000): memory_col.sample(batch_size=32)
+print("columnar memory took : {:3f}s".format(time.time() - begin))
+
+# n-step sampling
+memory_n_step = ColumnarReplayBuffer(size=size, n_step=5, flg_seq=False)
+env = gym.make("CartPole-v0")  # the previous env is already closed
+state = env.reset()
+for t in range(1000):
+    action = env.action_space.sample()
+    next_state, reward, done, info = env.step(action)
+    memory_n_step.add(state, action, reward, next_state, done)
+    state = env.reset() if done else next_state
+env.close()
+
+states, actions, rewards, next_states, dones = memory_n_step.sample(batch_size=32)
+print(states.shape, actions.shape, rewards.shape, next_states.shape, dones.shape)
+print(rewards[:5])
+
+# the window of the newest transition is cut by the edge of the buffer, so it must not bootstrap
+memory_edge = ColumnarReplayBuffer(size=10, n_step=5, flg_seq=False)
+for t in range(3):
+    memory_edge.add(np.full(4, t), 0, 1.0, np.full(4, t + 1), False)
+states, actions, rewards, next_states, dones = memory_edge._encode_sample_n_step([0, 2])
+assert np.allclose(rewards[:, 1], [1.0 + 0.99 + 0.99 ** 2, 1.0])
+assert np.allclose(next_states[:, 4:], np.full((2, 4), 3))
+assert np.all(dones[:, 1] == 1)
+
+begin = time.time()
+for _ in range(1000): memory_n_step.sample(batch_size=32)
+print("columnar n-step memory took : {:3f}s".format(time.time() - begin))
@@ -0,0 +1,29 @@
+import numpy as np
+from tf_rl.common.memory import ReplayBuffer, FrameReplayBuffer
+from tf_rl.common.wrappers import wrap_deepmind, make_atari
+
+size = 10000
+env = wrap_deepmind(make_atari("PongNoFrameskip-v4"), frame_stack=True)
+memory = ReplayBuffer(size=size)
+memory_frame = FrameReplayBuffer(size=size, frame_stack=4)
+
+state = env.reset()
+for t in range(3000):
+    action = env.action_space.sample()
+    next_state, reward, done, info = env.step(action)
+    memory.add(state, action, reward, next_state, done)
+    memory_frame.add(state, action, reward, next_state, done)
+    state = env.reset() if done else next_state
+env.close()
+
+print(len(memory), len(memory_frame))
+
+# the frame memory lays out the transitions in the same order as the original memory
+o, a, r, no, d = memory._get_all_data()
+o_f, a_f, r_f, no_f, d_f = memory_frame._get_all_data()
+assert np.all(o == o_f) and np.all(no == no_f) and np.all(a == a_f) and np.all(d == d_f)
+
+states, actions, rewards, next_states, dones = memory_frame.sample(batch_size=32)
+print(states.shape, states.dtype, next_states.shape, actions.shape, rewards.shape, dones.shape)
+print("frames: {:.1f}MB, original: {:.1f}MB".format(memory_frame._buffers["frame"].nbytes / 1e6,
+                                                     (o.nbytes + no.nbytes) / 1e6))
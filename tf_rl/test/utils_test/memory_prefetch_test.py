@@ -0,0 +1,92 @@
+import gym
+import time
+import numpy as np
+import tensorflow as tf
+from tf_rl.common.memory import ColumnarReplayBuffer
+from tf_rl.common.prefetcher import BatchPrefetcher, prefetch_replay_buffer
+
+tf.compat.v1.enable_eager_execution()
+
+size = 100000
+batch_size = 32
+dtypes = (np.float32, np.uint8, np.float32, np.float32, np.float32)
+env = gym.make("CartPole-v0")
+memory = ColumnarReplayBuffer(size=size)
+memory_prefetch = BatchPrefetcher(ColumnarReplayBuffer(size=size), batch_size=batch_size, dtypes=dtypes)
+
+state = env.reset()
+for t in range(10000):
+    action = env.action_space.sample()
+    next_state, reward, done, info = env.step(action)
+    memory.add(state, action, reward, next_state, done)
+    memory_prefetch.add(state, action, reward, next_state, done)
+    state = env.reset() if done else next_state
+env.close()
+
+print(len(memory), len(memory_prefetch))
+
+states, actions, rewards, next_states, dones = memory_prefetch.sample(batch_size)
+print(states.dtype, actions.dtype, rewards.dtype, next_states.dtype, dones.dtype)
+assert tf.is_tensor(states) and actions.dtype == tf.uint8
+
+
+# mimic the gradient step of agent.update
+def _update(batch):
+    time.sleep(0.001)
+
+
+begin = time.time()
+for _ in range(1000):
+    batch = [tf.convert_to_tensor(np.asarray(data, dtype=dtype))
+             for data, dtype in zip(memory.sample(batch_size), dtypes)]
+    _update(batch)
+print("synchronous sampling took : {:3f}s".format(time.time() - begin))
+
+begin = time.time()
+for _ in range(1000):
+    _update(memory_prefetch.sample(batch_size))
+print("prefetched sampling took : {:3f}s".format(time.time() - begin))
+memory_prefetch.close()
+
+# deterministic mode reproduces the batches of the plain buffer
+np.random.seed(1)
+expected = memory.sample(batch_size)
+np.random.seed(1)
+with BatchPrefetcher(memory, batch_size=batch_size, flg_tensor=False, flg_deterministic=True) as prefetcher:
+    for a, b in zip(expected, prefetcher.sample(batch_size)):
+        assert np.allclose(a, b)
+
+# the training loops use the prefetcher only when it's enabled by gin
+assert prefetch_replay_buffer(memory, batch_size) is memory
+with prefetch_replay_buffer(memory, batch_size, flg_prefetch=True, queue_size=1) as prefetcher:
+    assert isinstance(prefetcher, BatchPrefetcher)
+
+
+# an error in the sampler thread is raised on the main thread
+class FailingBuffer(ColumnarReplayBuffer):
+    num_calls = 0
+
+    def sample(self, batch_size, *args):
+        self.num_calls += 1
+        if self.num_calls > 2:
+            raise ValueError("sampling failed")
+        return super(FailingBuffer, self).sample(batch_size, *args)
+
+
+failing_memory = FailingBuffer(size=size)
+failing_memory.add(state, action, reward, next_state, done)
+prefetcher = BatchPrefetcher(failing_memory, batch_size=batch_size, flg_tensor=False, queue_size=1)
+prefetcher.sample(batch_size)
+prefetcher.sample(batch_size)
+try:
+    prefetcher.sample(batch_size)
+    raise AssertionError("the error in the sampler thread was swallowed")
+except ValueError:
+    pass
+
+# closing doesn't hang when the sampler fails while the queue is full
+failing_memory.num_calls = 0
+prefetcher = BatchPrefetcher(failing_memory, batch_size=batch_size, flg_tensor=False, queue_size=1)
+prefetcher.sample(batch_size)
+time.sleep(0.5)
+prefetcher.close()
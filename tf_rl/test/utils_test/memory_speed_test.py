@@ -44,3 +44,8 @@ print("w/o tf. function took : {:3f}s".format(time.time() - begin))
 begin = time.time()
 for _ in range(1000): memory.sample(batch_size=10)
 print("original memory took : {:3f}s".format(time.time() - begin))
+
+# the number of ops in the graph doesn't depend on the batch size since a batch is collected by tf.gather
+for batch_size in [32, 256]:
+    graph = memory_tf.sample_tf.get_concrete_function(batch_size).graph
+    print("batch size: {}, number of ops: {}".format(batch_size, len(graph.get_operations())))
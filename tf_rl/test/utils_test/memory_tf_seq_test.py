@@ -51,3 +51,10 @@ import time
 begin = time.time()
 for _ in range(1000): memory.sample(batch_size=10)
 print("took : {:3f}s".format(time.time() - begin))
+
+# the transitions after the end of an episode are padded by 0s
+obs, action, reward, next_obs, done = memory.sample(batch_size=32)
+done = done.numpy()
+for seq in done:
+    if seq.any():
+        assert not seq[seq.argmax() + 1:].any()
@@ -0,0 +1,36 @@
+import time
+import numpy as np
+from tf_rl.common.segment_tree import SumSegmentTree, MinSegmentTree
+
+capacity = 2 ** 16
+batch_size = 256
+
+tree_scalar, tree_batch = SumSegmentTree(capacity), SumSegmentTree(capacity)
+min_scalar, min_batch = MinSegmentTree(capacity), MinSegmentTree(capacity)
+idxes, values = np.random.randint(0, capacity, 10000), np.random.random(10000)
+
+# scalar and batched updates have to build the same tree
+for idx, value in zip(idxes, values):
+    tree_scalar[int(idx)] = value
+    min_scalar[int(idx)] = value
+tree_batch[idxes] = values
+min_batch[idxes] = values
+assert np.allclose(tree_scalar._value, tree_batch._value)
+assert np.allclose(min_scalar._value, min_batch._value)
+print(tree_batch.sum(), tree_batch.sum(10, 1000), min_batch.min(), min_batch.min(10, 1000))
+
+# scalar and batched prefix-sum search have to find the same indices
+prefixsums = np.random.random(batch_size) * tree_batch.sum()
+res = tree_batch.find_prefixsum_idx(prefixsums)
+assert all(tree_scalar.find_prefixsum_idx(float(p)) == r for p, r in zip(prefixsums, res))
+
+# an empty batch has no leaf to find
+assert tree_batch.find_prefixsum_idx(np.zeros(0)).shape == (0,)
+
+begin = time.time()
+for _ in range(100): [tree_scalar.find_prefixsum_idx(float(p)) for p in prefixsums]
+print("scalar search took : {:3f}s".format(time.time() - begin))
+
+begin = time.time()
+for _ in range(100): tree_batch.find_prefixsum_idx(prefixsums)
+print("batched search took : {:3f}s".format(time.time() - begin))
@@ -0,0 +1,59 @@
+import gym
+import time
+import numpy as np
+from tf_rl.common.vec_env import SyncVectorEnv, SubprocVectorEnv
+
+num_envs = 4
+env_fns = [lambda: gym.make("CartPole-v0") for _ in range(num_envs)]
+env_sync = SyncVectorEnv(env_fns)
+env_subproc = SubprocVectorEnv(env_fns)
+env_sync.seed(123)
+env_subproc.seed(123)
+
+# both envs have to generate the same trajectories given the same seeds and actions
+states_sync, states_subproc = env_sync.reset(), env_subproc.reset()
+assert np.allclose(states_sync, states_subproc)
+print(states_sync.shape)
+
+for t in range(1000):
+    actions = np.random.randint(env_sync.action_space.n, size=num_envs)
+    states_sync, rewards_sync, dones_sync, infos_sync = env_sync.step(actions)
+    states_subproc, rewards_subproc, dones_subproc, infos_subproc = env_subproc.step(actions)
+    assert np.allclose(states_sync, states_subproc)
+    assert np.all(dones_sync == dones_subproc)
+    for done, info in zip(dones_sync, infos_sync):
+        assert done == ("terminal_observation" in info)
+
+for env in [env_sync, env_subproc]:
+    env.reset()
+    begin = time.time()
+    for _ in range(1000): env.step(env.sample_actions())
+    print("{} took : {:3f}s".format(env.__class__.__name__, time.time() - begin))
+    env.close()
+
+# observations of Atari are transferred via shared memory
+from tf_rl.common.vec_env import ShmemVectorEnv
+from tf_rl.common.wrappers import wrap_deepmind, make_atari
+
+env_fns = [lambda: wrap_deepmind(make_atari("PongNoFrameskip-v4"), frame_stack=True) for _ in range(num_envs)]
+env_subproc = SubprocVectorEnv(env_fns)
+env_shmem = ShmemVectorEnv(env_fns)
+env_subproc.seed(123)
+env_shmem.seed(123)
+assert np.array_equal(env_subproc.reset(), env_shmem.reset())
+
+for t in range(1000):
+    actions = np.random.randint(env_subproc.action_space.n, size=num_envs)
+    states_subproc, rewards_subproc, dones_subproc, infos_subproc = env_subproc.step(actions)
+    states_shmem, rewards_shmem, dones_shmem, infos_shmem = env_shmem.step(actions)
+    assert np.array_equal(states_subproc, states_shmem)
+    for info_subproc, info_shmem in zip(infos_subproc, infos_shmem):
+        if "terminal_observation" in info_subproc:
+            assert np.array_equal(info_subproc["terminal_observation"], info_shmem["terminal_observation"])
+
+for env in [env_subproc, env_shmem]:
+    env.reset()
+    begin = time.time()
+    for _ in range(1000): env.step(env.sample_actions())
+    print("{} took : {:3f}s".format(env.__class__.__name__, time.time() - begin))
+    env.close()